@@ -0,0 +1,821 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""FN论坛异步签到引擎
+
+与 fnclub_signer.FNSignIn 流程一致的异步实现：所有账号共享同一个到
+club.fnnas.com 的 keep-alive 连接池，重试等待使用 asyncio.sleep，
+单个进程即可用少量连接并发驱动大量账号。
+
+依赖：pip install aiohttp
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from http.cookies import SimpleCookie
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+from fnclub_signer import (
+    Config,
+    logger,
+    AccountLoggerAdapter,
+    BROWSER_HEADERS,
+    CAPTCHA_REDIRECT_TEXT,
+    LOGIN_RESULT_SUCCESS,
+    LOGIN_RESULT_CAPTCHA_WRONG,
+    LOGIN_RESULT_CREDENTIALS_WRONG,
+    LOGIN_VARIANT_INLINE,
+    LOGIN_VARIANT_REDIRECT,
+    LOGIN_VARIANT_NONE,
+    absolute_url,
+    build_captcha_url,
+    build_login_data,
+    resolve_login_post_url,
+    parse_login_status,
+    parse_login_page,
+    parse_captcha_redirect_url,
+    parse_captcha_page,
+    parse_auth_param,
+    classify_login_response,
+    SignPage,
+    build_ocr_payload,
+    prepare_ocr_image,
+    ocr_endpoint_url,
+    accept_ocr_result,
+    get_retry_policy,
+    get_session_store,
+    get_token_cache,
+    get_host_guard,
+    find_ledger_entry,
+    record_ledger_entry,
+    record_history_entry,
+    get_notifier,
+    get_baidu_access_token,
+    should_prefetch_access_token,
+    recognize_captcha_locally,
+    get_local_recognizer,
+    record_captcha_attempt,
+    BaiduRecognizer,
+    log_http_step,
+    save_failure_artifact,
+    log_step_summary,
+    export_metrics,
+    setup_logging,
+    restore_session_bundle,
+    save_session_bundle,
+    load_legacy_cookie_file,
+    is_session_fresh,
+    find_login_shortcut,
+    remember_login_path,
+    forget_login_path,
+    load_accounts,
+    get_account_cookie_file,
+    log_batch_summary,
+    parse_args,
+)
+from fnclub_metrics import traced, start_http_exporter
+from fnclub_retry import Retrier, StepFailed, check_status, BAD_RESPONSE, CAPTCHA_WRONG, CREDENTIALS_WRONG
+
+
+class AsyncHttpPool:
+    """所有账号共享的异步连接池
+
+    论坛请求使用每个账号独立的 ClientSession（独立 Cookie），但底层共用同一个
+    TCPConnector；百度OCR和通知请求使用不保存 Cookie 的公共会话。
+    必须在事件循环中创建，建议通过 ``async with AsyncHttpPool() as pool`` 使用。
+    """
+
+    def __init__(self, limit=None):
+        if aiohttp is None:
+            raise RuntimeError("异步签到需要安装 aiohttp：pip install aiohttp")
+        limit = limit or Config.ASYNC_POOL_SIZE
+        self.timeout = aiohttp.ClientTimeout(total=Config.REQUEST_TIMEOUT)
+        self.connector = aiohttp.TCPConnector(limit=limit, keepalive_timeout=60, ttl_dns_cache=300)
+        # 百度OCR / 通知等第三方接口的公共会话，不保存 Cookie
+        self.api_session = aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=self.timeout
+        )
+        # 同一时间只允许一个协程等待 access_token 刷新
+        self.token_lock = asyncio.Lock()
+
+    def new_session(self):
+        """为单个账号创建独立 Cookie 的会话，复用共享连接池"""
+        return aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            headers=BROWSER_HEADERS,
+            timeout=self.timeout
+        )
+
+    async def close(self):
+        await self.api_session.close()
+        await self.connector.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class AsyncFNSignIn:
+    """FNSignIn 的异步版本，签到流程与同步版本保持一致"""
+
+    def __init__(self, pool, username=None, password=None, cookie_file=None):
+        self.pool = pool
+        self.username = username if username is not None else Config.USERNAME
+        self.password = password if password is not None else Config.PASSWORD
+        self.cookie_file = cookie_file or Config.COOKIE_FILE
+        # 最近一次 run() 的结果描述，供批量模式汇总
+        self.status = ''
+        # 最近一次解析的签到页面快照
+        self.sign_page = None
+        # 最近一次请求签到页面时是否发现未登录
+        self.sign_page_logged_out = False
+        # 最近一次提交的验证码识别记录，登录结果确定后写入验证码语料
+        self.captcha_attempt = None
+        # 会话最近一次被确认有效的时间（来自会话库）
+        self.session_verified_at = None
+
+        if username is not None:
+            self.logger = AccountLoggerAdapter(logger, {'account': self.username})
+        else:
+            self.logger = logger
+
+        # 各步骤的重试和单账号时间预算
+        self.retrier = Retrier(get_retry_policy(), self.logger)
+
+        self.session = pool.new_session()
+
+        # 本地环境默认优先使用 Cookie；Actions/CI 环境下未配置会话包时不加载本地 Cookie，强制走账号密码登录
+        if Config.use_saved_sessions():
+            self.load_cookies()
+        else:
+            self.logger.info("检测到 CI / GitHub Actions 环境且未配置 SESSION_BUNDLE_KEY：跳过本地 Cookie 加载，每次使用环境变量重新登录")
+
+    async def close(self):
+        """关闭账号会话（不会关闭共享连接池）"""
+        await self.session.close()
+
+    async def _send(self, session, method, url, **kwargs):
+        """经过主机限速器和熔断器发送请求并读取响应体，返回 (响应对象, 响应字节)"""
+        guard = get_host_guard(url)
+        if guard is not None:
+            await guard.wait_async(self.retrier.remaining())
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                body = await response.read()
+        except Exception:
+            if guard is not None:
+                guard.record_failure()
+            raise
+        except BaseException:
+            # asyncio.CancelledError 等不是主机故障，只释放半开状态下的探测名额，否则探测名额一直被占用
+            if guard is not None:
+                guard.breaker.release_probe()
+            raise
+        if guard is not None:
+            guard.record_status(response.status)
+        return response, body
+
+    async def _fetch(self, step, method, url, **kwargs):
+        """发送论坛请求，记录步骤、状态码、耗时和响应字节数，返回 (状态码, 重定向后的最终地址, 页面文本)"""
+        start_time = time.perf_counter()
+        response, body = await self._send(self.session, method, url, **kwargs)
+        text = body.decode(response.get_encoding(), errors='replace')
+        log_http_step(self.logger, step, response.status, start_time, len(body))
+        check_status(response.status, f"{step} 请求失败", response.headers.get('Retry-After'))
+        return response.status, str(response.url), text
+
+    async def _get_text(self, step, url):
+        """GET 请求，返回 (状态码, 页面文本)"""
+        status, _, text = await self._fetch(step, 'GET', url)
+        return status, text
+
+    async def _get_page(self, step, url):
+        """GET 请求，返回 (重定向后的最终地址, 页面文本)"""
+        _, final_url, text = await self._fetch(step, 'GET', url)
+        return final_url, text
+
+    async def _post_text(self, step, url, data):
+        """POST 表单，返回 (状态码, 页面文本)"""
+        status, _, text = await self._fetch(step, 'POST', url, data=data, allow_redirects=True)
+        return status, text
+
+    def step_failed(self, step, body, message, kind=BAD_RESPONSE):
+        """保存响应内容到失败现场目录，返回交给重试策略处理的 StepFailed"""
+        try:
+            path = save_failure_artifact(step, body, self.username)
+        except Exception as e:
+            return StepFailed(kind, f"{message}（保存响应内容失败: {e}）")
+        return StepFailed(kind, f"{message}，响应内容已保存: {path}", artifact=path)
+
+    def load_cookies(self):
+        """从会话库加载未过期的Cookie（与同步版本共用会话库）"""
+        try:
+            cookies_list, self.session_verified_at = get_session_store().load(self.username)
+            if cookies_list is None:
+                cookies_list = load_legacy_cookie_file(self.cookie_file)
+                if cookies_list is None:
+                    return False
+                self.logger.info("已导入旧版Cookie文件，下次保存时将写入会话库")
+
+            base_url = URL(Config.BASE_URL)
+            for cookie_dict in cookies_list:
+                cookie = SimpleCookie()
+                cookie[cookie_dict['name']] = cookie_dict['value']
+                if cookie_dict.get('domain'):
+                    cookie[cookie_dict['name']]['domain'] = cookie_dict['domain']
+                if cookie_dict.get('path'):
+                    cookie[cookie_dict['name']]['path'] = cookie_dict['path']
+                self.session.cookie_jar.update_cookies(cookie, base_url)
+
+            self.logger.info("已从会话库加载Cookie")
+            return True
+        except Exception as e:
+            self.logger.error(f"加载Cookie失败: {e}")
+        return False
+
+    def save_cookies(self):
+        """保存Cookie到会话库（登录成功后调用，同时记录会话验证时间）"""
+        try:
+            cookies_list = []
+            for morsel in self.session.cookie_jar:
+                expires = None
+                if morsel['expires']:
+                    try:
+                        expires = int(parsedate_to_datetime(morsel['expires']).timestamp())
+                    except (TypeError, ValueError):
+                        expires = None
+                cookies_list.append({
+                    'name': morsel.key,
+                    'value': morsel.value,
+                    'domain': morsel['domain'],
+                    'path': morsel['path'],
+                    'expires': expires,
+                    'secure': bool(morsel['secure'])
+                })
+
+            get_session_store().save(self.username, cookies_list, verified=True)
+            self.session_verified_at = time.time()
+            self.logger.info("Cookie已保存到会话库")
+            return True
+        except Exception as e:
+            self.logger.error(f"保存Cookie失败: {e}")
+            return False
+
+    def mark_session_verified(self):
+        """记录当前会话已被确认有效（CI 环境未配置会话包时不落盘）"""
+        if not Config.use_saved_sessions():
+            return
+        try:
+            get_session_store().mark_verified(self.username)
+            self.session_verified_at = time.time()
+        except Exception as e:
+            self.logger.warning(f"更新会话验证时间失败: {e}")
+
+    @traced('check_login_status')
+    async def check_login_status(self):
+        """检查登录状态"""
+        try:
+            _, html = await self._get_text('check_login', Config.BASE_URL)
+            if parse_login_status(html, self.username):
+                self.logger.info("Cookie有效，已登录状态")
+                return True
+            else:
+                self.logger.info("Cookie无效或已过期，需要重新登录")
+                return False
+        except asyncio.TimeoutError:
+            self.logger.error(f"检查登录状态失败: 请求超时（超过{Config.REQUEST_TIMEOUT}秒）")
+            return False
+        except aiohttp.ClientConnectionError:
+            self.logger.error("检查登录状态失败: 网络连接错误，请检查网络连接")
+            return False
+        except Exception as e:
+            self.logger.error(f"检查登录状态失败: {type(e).__name__}: {e}")
+            return False
+
+    @traced('get_access_token')
+    async def get_access_token(self, prefetched=None):
+        """获取百度API的access_token，与同步版本共用进程内缓存；并发刷新时只会发出一个请求
+
+        prefetched 为 prefetch_access_token() 返回的任务，提前获取失败时再按重试策略获取。
+        """
+        if prefetched is not None:
+            try:
+                return await prefetched
+            except Exception as e:
+                self.logger.info(f"提前获取access_token失败，重新获取: {type(e).__name__}: {e}")
+        access_token = get_token_cache().peek()
+        if access_token:
+            return access_token
+        return await self.retrier.call_async('get_access_token', '获取access_token', self._fetch_access_token)
+
+    def prefetch_access_token(self):
+        """需要提前获取 access_token 时（见 should_prefetch_access_token），在后台任务中获取（与下载验证码图片同时进行）"""
+        if not should_prefetch_access_token():
+            return None
+        task = asyncio.ensure_future(self._fetch_access_token())
+        # 本地识别成功时不会等待该任务，避免"异常未被获取"的警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch_access_token(self):
+        async with self.pool.token_lock:
+            # 刷新很少发生（约每月一次），放到线程中执行，复用同步版本的文件锁和缓存逻辑
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, get_baidu_access_token, self.logger)
+
+    @traced('recognize_captcha')
+    async def recognize_captcha(self, captcha_url):
+        """识别验证码，失败时按重试策略重试（在登录流程中由登录步骤统一重试）"""
+        return await self.retrier.call_async('recognize_captcha', '验证码识别', self._recognize_captcha_once, captcha_url)
+
+    async def _recognize_captcha_once(self, captcha_url):
+        """下载并识别一次验证码，失败时抛出异常"""
+        # 需要刷新 access_token 且没有本地识别引擎时，与下载验证码图片同时进行
+        token_task = self.prefetch_access_token()
+
+        # 下载验证码图片
+        download_start = time.perf_counter()
+        captcha_response, captcha_content = await self._send(self.session, 'GET', captcha_url)
+        captcha_status = captcha_response.status
+        log_http_step(self.logger, 'captcha_image', captcha_status, download_start, len(captcha_content))
+        check_status(captcha_status, "下载验证码图片失败", captcha_response.headers.get('Retry-After'))
+        if captcha_status != 200:
+            raise StepFailed(BAD_RESPONSE, f"下载验证码图片失败，状态码: {captcha_status}")
+
+        # 优先本地识别（放到线程中执行，不阻塞事件循环），置信度不足时再调用百度OCR
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        captcha_text, confidence = await loop.run_in_executor(None, recognize_captcha_locally, captcha_content, self.logger)
+        if captcha_text:
+            self.captcha_attempt = {
+                'image': captcha_content,
+                'engine': get_local_recognizer().name,
+                'text': captcha_text,
+                'confidence': confidence,
+                'latency_ms': (time.perf_counter() - start_time) * 1000
+            }
+            return captcha_text
+
+        # 获取access_token
+        access_token = await self.get_access_token(token_task)
+        if not access_token:
+            raise StepFailed(BAD_RESPONSE, "获取百度API access_token失败")
+
+        # 按 OCR_ENDPOINTS 分级调用，结果符合验证码规则时不再调用下一级
+        image_bytes = await loop.run_in_executor(None, prepare_ocr_image, captcha_content, self.logger)
+        payload = build_ocr_payload(image_bytes)
+        headers = {'Content-Type': 'application/x-www-form-urlencoded', 'Accept': 'application/json'}
+        for index, endpoint in enumerate(Config.OCR_ENDPOINTS):
+            url = f"{ocr_endpoint_url(endpoint)}?access_token={access_token}"
+            api_response, body = await self._send(self.pool.api_session, 'POST', url, data=payload, headers=headers)
+            api_status = api_response.status
+            check_status(api_status, "验证码识别API请求失败", api_response.headers.get('Retry-After'))
+            if api_status != 200:
+                raise StepFailed(BAD_RESPONSE, f"验证码识别API请求失败，状态码: {api_status}")
+
+            # 解析API响应
+            last = index == len(Config.OCR_ENDPOINTS) - 1
+            captcha_text = accept_ocr_result(endpoint, json.loads(body), access_token, last, self.logger)
+            if captcha_text is not None:
+                break
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        self.logger.info(f"验证码识别成功({endpoint}): {captcha_text}，耗时 {latency_ms:.0f}ms")
+        self.captcha_attempt = {
+            'image': captcha_content,
+            'engine': f"{BaiduRecognizer.name}/{endpoint}",
+            'text': captcha_text,
+            'confidence': None,
+            'latency_ms': latency_ms
+        }
+        return captcha_text
+
+    async def _submit_captcha_page(self, captcha_page_url, remembered=False):
+        """打开验证码页面，识别验证码后提交登录，返回登录响应文本
+
+        remembered 为 True 时打开的是上次记住的验证码页面，页面中没有验证码表单时返回 None（改走完整登录流程），
+        否则抛出异常。
+        """
+        _, captcha_page_html = await self._get_text('captcha_page', captcha_page_url)
+        captcha_page = parse_captcha_page(captcha_page_html)
+        seccode_id = captcha_page['seccode_id']
+        captcha_url = captcha_page['captcha_url']
+        if not (seccode_id and captcha_url and captcha_page['formhash']):
+            if remembered:
+                self.logger.info("记住的验证码页面中没有验证码表单，改走完整登录流程")
+                forget_login_path(self.username, self.logger)
+                return None
+            if not (seccode_id and captcha_url):
+                raise self.step_failed('captcha_page', captcha_page_html, "在验证码页面未找到验证码输入框或Hash")
+            raise self.step_failed('captcha_page', captcha_page_html, "在验证码页面未找到formhash")
+
+        self.logger.info(f"验证码图片URL: {captcha_url}")
+
+        login_data = build_login_data(captcha_page['formhash'], self.username, self.password)
+        login_data['seccodehash'] = seccode_id
+        auth_param = parse_auth_param(captcha_page_url)
+        if auth_param:
+            login_data['auth'] = auth_param
+
+        login_url = resolve_login_post_url(captcha_page['form_action'], captcha_page_url.split('#')[0])
+        self.logger.info(f"使用验证码重新登录，URL: {login_url}")
+        self.set_login_headers()
+        return await self._submit_with_captcha('captcha_submit', login_url, login_data, seccode_id, captcha_url)
+
+    async def _submit_with_captcha(self, step, login_url, login_data, seccode_id, captcha_url):
+        """识别验证码并提交登录表单，验证码错误时刷新验证码重新提交（见 FNSignIn._submit_with_captcha）"""
+        for attempt in range(1, Config.CAPTCHA_SUBMIT_ATTEMPTS + 1):
+            login_data['seccodeverify'] = await self.recognize_captcha(captcha_url)
+            _, login_text = await self._post_text(step, login_url, login_data)
+            if attempt == Config.CAPTCHA_SUBMIT_ATTEMPTS or classify_login_response(login_text) != LOGIN_RESULT_CAPTCHA_WRONG:
+                return login_text
+
+            record_captcha_attempt(self.captcha_attempt, LOGIN_RESULT_CAPTCHA_WRONG, self.username, self.logger)
+            self.captcha_attempt = None
+            self.logger.info(f"验证码错误，刷新验证码后重新提交（第 {attempt}/{Config.CAPTCHA_SUBMIT_ATTEMPTS} 次）")
+            captcha_url = build_captcha_url(seccode_id)
+
+    def set_login_headers(self):
+        """更新登录请求头，模拟真实浏览器"""
+        self.session.headers.update({
+            'Origin': Config.BASE_URL.rstrip('/'),
+            'Referer': Config.LOGIN_URL,
+            'Upgrade-Insecure-Requests': '1'
+        })
+
+    @traced('login')
+    async def login(self):
+        """使用账号密码登录，按重试策略重试（账号或密码错误时不重试）"""
+        return await self.retrier.call_async('login', '登录', self._login_once, default=False)
+
+    async def _login_once(self):
+        """尝试登录一次，成功返回 True，失败时抛出异常"""
+        # 上次登录需要跳转到验证码页面：直接打开记住的验证码页面，页面不匹配时再走完整流程
+        captcha_page_url = find_login_shortcut(self.username, self.logger)
+        if captcha_page_url:
+            self.logger.info("上次登录需要跳转到验证码页面，直接打开记住的验证码页面")
+            login_text = await self._submit_captcha_page(captcha_page_url, remembered=True)
+            if login_text is not None and classify_login_response(login_text) == LOGIN_RESULT_CREDENTIALS_WRONG:
+                # auth 参数中带有上次提交的密码，修改密码后会失效
+                record_captcha_attempt(self.captcha_attempt, LOGIN_RESULT_CREDENTIALS_WRONG, self.username, self.logger)
+                self.captcha_attempt = None
+                self.logger.info("记住的验证码页面已失效（论坛提示账号或密码错误），改走完整登录流程")
+                forget_login_path(self.username, self.logger)
+                login_text = None
+            if login_text is not None:
+                return await self._finish_login(login_text, LOGIN_VARIANT_REDIRECT, captcha_page_url, remembered=True)
+
+        # 获取登录页面
+        _, login_html = await self._get_text('login_page', Config.LOGIN_URL)
+        login_page = parse_login_page(login_html)
+        if not login_page or not login_page['formhash']:
+            raise self.step_failed('login_page', login_html, "未找到登录表单或formhash字段")
+
+        login_data = build_login_data(login_page['formhash'], self.username, self.password)
+        if login_page['username_id']:
+            login_data[login_page['username_id']] = self.username
+        if login_page['password_id']:
+            login_data[login_page['password_id']] = self.password
+
+        # 登录页面直接带有验证码
+        variant = LOGIN_VARIANT_NONE
+        if login_page['need_captcha']:
+            self.logger.info("检测到需要验证码，尝试自动识别验证码")
+            variant = LOGIN_VARIANT_INLINE
+            if not login_page['captcha_src']:
+                raise self.step_failed('login_page', login_html, "未找到验证码图片")
+            login_data['seccodehash'] = login_page['seccode_id']
+
+        self.set_login_headers()
+
+        login_url = resolve_login_post_url(login_page['form_action'], f"{Config.LOGIN_URL}&loginsubmit=yes&inajax=1")
+        if variant == LOGIN_VARIANT_INLINE:
+            login_text = await self._submit_with_captcha('login_submit', login_url, login_data, login_page['seccode_id'],
+                                                         absolute_url(login_page['captcha_src']))
+        else:
+            _, login_text = await self._post_text('login_submit', login_url, login_data)
+        self.logger.info(f"登录请求URL: {login_url}")
+        self.logger.debug(f"登录响应内容: {login_text}")
+
+        # 检查是否需要跳转到验证码页面
+        captcha_page_url = None
+        if CAPTCHA_REDIRECT_TEXT in login_text:
+            self.logger.info("检测到需要跳转到验证码页面，正在提取跳转URL...")
+            variant = LOGIN_VARIANT_REDIRECT
+            captcha_page_url = parse_captcha_redirect_url(login_text)
+            if not captcha_page_url:
+                raise self.step_failed('captcha_redirect', login_text, "无法从响应中提取跳转URL")
+            self.logger.info(f"提取到验证码页面URL: {captcha_page_url}")
+            login_text = await self._submit_captcha_page(captcha_page_url)
+
+        return await self._finish_login(login_text, variant, captcha_page_url)
+
+    async def _finish_login(self, login_text, variant, captcha_page_url=None, remembered=False):
+        """根据登录响应判断登录结果：成功时保存Cookie并记住登录方式，失败时抛出异常"""
+        login_result = classify_login_response(login_text)
+        record_captcha_attempt(self.captcha_attempt, login_result, self.username, self.logger)
+        self.captcha_attempt = None
+        if login_result == LOGIN_RESULT_CAPTCHA_WRONG:
+            raise StepFailed(CAPTCHA_WRONG, "验证码错误，登录失败")
+        # 账号或密码错误：重试只会触发论坛的错误次数限制，直接放弃
+        if login_result == LOGIN_RESULT_CREDENTIALS_WRONG:
+            raise self.step_failed('login_submit', login_text, "论坛提示账号或密码错误", CREDENTIALS_WRONG)
+
+        if login_result == LOGIN_RESULT_SUCCESS:
+            self.logger.info("从登录响应中检测到成功标识")
+        else:
+            # 登录后等待一下，让Cookie生效
+            await asyncio.sleep(1)
+            if not await self.check_login_status():
+                if remembered:
+                    # 下次重试走完整登录流程
+                    forget_login_path(self.username, self.logger)
+                raise self.step_failed('login_submit', login_text, "登录失败，请检查账号密码")
+            self.logger.info("通过状态检查确认登录成功")
+
+        self.logger.info(f"账号 {self.username} 登录成功")
+        # 本地环境保存 Cookie，Actions / CI 环境未配置会话包时只在当前会话中使用，不落盘
+        if Config.use_saved_sessions():
+            self.save_cookies()
+        remember_login_path(self.username, variant, captcha_page_url, self.logger)
+        return True
+
+    @traced('check_sign_status')
+    async def check_sign_status(self):
+        """检查签到状态，按重试策略重试；签到页面显示未登录时直接返回 (None, None)"""
+        self.sign_page_logged_out = False
+        return await self.retrier.call_async('check_sign_status', '检查签到状态', self._check_sign_status_once, default=(None, None))
+
+    async def _check_sign_status_once(self):
+        final_url, html = await self._get_page('sign_page', Config.SIGN_URL)
+        sign_page = SignPage(html, final_url)
+        if sign_page.logged_out:
+            # 会话已失效，重试没有意义，交给调用方重新登录
+            self.logger.info("签到页面显示未登录，会话已失效")
+            self.sign_page_logged_out = True
+            return None, None
+        if not sign_page.has_sign_button:
+            raise self.step_failed('sign_page', html, "未找到签到按钮")
+        self.sign_page = sign_page
+        return sign_page.sign_text, sign_page.sign_param
+
+    @traced('do_sign')
+    async def do_sign(self, sign_param):
+        """执行签到，按重试策略重试"""
+        return await self.retrier.call_async('do_sign', '签到', self._do_sign_once, sign_param, default=False)
+
+    async def _do_sign_once(self, sign_param):
+        status, html = await self._get_text('sign', f"{Config.SIGN_URL}&sign={sign_param}")
+        if status != 200:
+            raise StepFailed(BAD_RESPONSE, f"签到请求失败，状态码: {status}")
+        # 优先从签到响应中确认状态，响应不是签到页面时再次检查签到状态
+        sign_page = SignPage(html)
+        if sign_page.has_sign_button:
+            self.sign_page = sign_page
+            sign_text = sign_page.sign_text
+        else:
+            sign_text, _ = await self.check_sign_status()
+        if sign_text != "今日已打卡":
+            raise StepFailed(BAD_RESPONSE, "签到请求已发送，但状态未更新")
+        self.logger.info("签到成功")
+        return True
+
+    @traced('get_sign_info')
+    async def get_sign_info(self):
+        """获取签到信息，优先使用最近一次签到页面快照，按重试策略重试"""
+        if self.sign_page is not None and self.sign_page.sign_info is not None:
+            return self.sign_page.sign_info
+        return await self.retrier.call_async('get_sign_info', '获取签到信息', self._get_sign_info_once, default={})
+
+    async def _get_sign_info_once(self):
+        _, html = await self._get_text('sign_info', Config.SIGN_URL)
+        sign_page = SignPage(html)
+        if sign_page.sign_info is None:
+            raise self.step_failed('sign_info', html, "未找到签到信息区域")
+        self.sign_page = sign_page
+        return sign_page.sign_info
+
+    def send_notification(self, title, content, success=False):
+        """把通知交给后台分发器发送（批量签到时合并成汇总通知），不等待发送结果"""
+        return get_notifier().submit(title, content, self.username, success)
+
+    def _format_sign_info(self, sign_info):
+        """记录签到信息并生成通知文本"""
+        info_text = ""
+        if sign_info:
+            self.logger.info("===== 签到信息 =====")
+            for key, value in sign_info.items():
+                self.logger.info(f"{key}: {value}")
+                info_text += f"{key}: {value}\n"
+        return info_text.strip() if info_text else '暂无详细信息'
+
+    @traced('run')
+    async def run(self):
+        """运行签到流程，带重试机制；在线运行的结果追加到签到历史"""
+        self.logger.info("===== 开始运行签到脚本 =====")
+        self.retrier.start()
+        # 常驻模式下同一个实例每天运行一次，不复用上一次的签到页面快照
+        self.sign_page = None
+
+        # 台账中已记录今天签到成功：不发任何请求（包括通知），直接返回
+        entry = find_ledger_entry(self.username, self.logger)
+        if entry:
+            self.logger.info(f"签到台账显示今日已签到（{entry['status']}），跳过在线检查；需要在线确认时使用 --verify")
+            self.status = "今日已签到（台账）"
+            return True
+
+        success = await self._run_online()
+        sign_info = self.sign_page.sign_info if self.sign_page is not None else None
+        record_history_entry(self.username, success, self.status, sign_info, self.logger)
+        return success
+
+    async def _run_online(self):
+        """登录、检查签到状态、签到并发送通知，返回是否成功"""
+        # 在 CI / GitHub Actions 环境下未配置会话包时，不使用本地 Cookie，每次强制账号密码登录
+        skipped_login_check = False
+        if not Config.use_saved_sessions():
+            logged_in = await self.login()
+        elif Config.OPTIMISTIC_LOGIN:
+            # 乐观模式：跳过首页登录状态检查，直接从签到页面判断会话是否有效
+            self.logger.info("乐观模式：跳过登录状态检查，直接获取签到状态")
+            skipped_login_check = logged_in = True
+        elif is_session_fresh(self.session_verified_at):
+            # 会话最近被确认有效过，跳过首页登录状态检查
+            self.logger.info("会话最近已验证有效，跳过登录状态检查")
+            skipped_login_check = logged_in = True
+        else:
+            logged_in = await self.check_login_status() or await self.login()
+        if not logged_in:
+            self.logger.error("登录失败，签到流程终止")
+            self.status = "登录失败"
+            self.send_notification("FN论坛签到失败", "登录失败，请检查账号密码或网络连接")
+            return False
+
+        # 检查签到状态
+        sign_text, sign_param = await self.check_sign_status()
+        if (sign_text is None or sign_param is None) and skipped_login_check:
+            # 跳过了登录检查但未能获取签到状态：签到页面已表明未登录时直接登录，否则先确认登录状态
+            if self.sign_page_logged_out:
+                self.logger.info("会话已失效，使用账号密码重新登录")
+                logged_in = await self.login()
+            else:
+                self.logger.info("未能获取签到状态，重新检查登录状态")
+                logged_in = await self.check_login_status() or await self.login()
+            if not logged_in:
+                self.logger.error("登录失败，签到流程终止")
+                self.status = "登录失败"
+                self.send_notification("FN论坛签到失败", "登录失败，请检查账号密码或网络连接")
+                return False
+            sign_text, sign_param = await self.check_sign_status()
+        if sign_text is None or sign_param is None:
+            self.logger.error("获取签到状态失败，签到流程终止")
+            self.status = "获取签到状态失败"
+            self.send_notification("FN论坛签到失败", "获取签到状态失败，请检查网络连接")
+            return False
+
+        # 能看到签到按钮说明会话有效
+        self.mark_session_verified()
+        self.logger.info(f"当前签到状态: {sign_text}")
+
+        if sign_text == "点击打卡":
+            self.logger.info("开始执行签到...")
+            if await self.do_sign(sign_param):
+                sign_info = await self.get_sign_info()
+                info_text = self._format_sign_info(sign_info)
+                self.status = "签到成功"
+                record_ledger_entry(self.username, self.status, sign_info, self.logger)
+                self.send_notification("FN论坛签到成功", f"签到成功！\n\n签到信息：\n{info_text}", success=True)
+                return True
+            self.logger.error("签到失败")
+            self.status = "签到失败"
+            self.send_notification("FN论坛签到失败", "签到操作失败，请检查网络连接或稍后重试")
+            return False
+        elif sign_text == "今日已打卡":
+            self.logger.info("今日已签到，无需重复签到")
+            sign_info = await self.get_sign_info()
+            info_text = self._format_sign_info(sign_info)
+            self.status = "今日已签到"
+            record_ledger_entry(self.username, self.status, sign_info, self.logger)
+            self.send_notification("FN论坛签到提醒", f"今日已签到，无需重复签到。\n\n签到信息：\n{info_text}", success=True)
+            return True
+        else:
+            self.logger.warning(f"未知的签到状态: {sign_text}，签到流程终止")
+            self.status = f"未知状态: {sign_text}"
+            self.send_notification("FN论坛签到异常", f"遇到未知的签到状态: {sign_text}，请手动检查")
+            return False
+
+
+async def run_account_async(pool, account):
+    """在共享连接池上为单个账号执行签到，返回结果字典"""
+    start_time = time.time()
+    username = account['username']
+    sign = None
+    try:
+        sign = AsyncFNSignIn(pool, username, account['password'], get_account_cookie_file(username))
+        success = await sign.run()
+        status = sign.status
+    except Exception as e:
+        logger.error(f"[{username}] 签到过程发生未处理的错误: {type(e).__name__}: {e}")
+        success = False
+        status = f"异常: {type(e).__name__}"
+    finally:
+        if sign is not None:
+            await sign.close()
+    return {
+        'username': username,
+        'success': success,
+        'status': status,
+        'elapsed': time.time() - start_time
+    }
+
+
+async def run_batch_async(accounts, concurrency=None):
+    """在单个事件循环中并发执行多个账号的签到，所有账号共享一个连接池"""
+    concurrency = max(1, concurrency or Config.BATCH_CONCURRENCY)
+    os.makedirs(Config.COOKIE_DIR, exist_ok=True)
+    logger.info(f"===== 异步批量签到开始：共 {len(accounts)} 个账号，并发数 {concurrency}，连接池大小 {Config.ASYNC_POOL_SIZE} =====")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    with get_notifier().batch():
+        async with AsyncHttpPool() as pool:
+            async def worker(account):
+                async with semaphore:
+                    return await run_account_async(pool, account)
+
+            results = await asyncio.gather(*(worker(account) for account in accounts))
+
+    log_batch_summary(results)
+    return results
+
+
+async def run_single_async():
+    """异步模式下运行环境变量中配置的单个账号"""
+    async with AsyncHttpPool() as pool:
+        sign = AsyncFNSignIn(pool)
+        try:
+            return await sign.run()
+        finally:
+            await sign.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        if os.environ.get('DEBUG') == '1':
+            logger.setLevel(logging.DEBUG)
+            logger.debug("调试模式已启用")
+
+        args = parse_args()
+        batch_mode = bool(args.accounts)
+        if args.verify:
+            Config.LEDGER_VERIFY = True
+
+        if Config.METRICS_PORT:
+            start_http_exporter(Config.METRICS_PORT)
+            logger.info(f"指标接口已启动: http://0.0.0.0:{Config.METRICS_PORT}/metrics")
+
+        env_valid, env_msg, missing_vars = Config.check_required_env_vars(require_account=not batch_mode)
+        if not env_valid:
+            logger.error(env_msg)
+            print(f"\n{env_msg}")
+            exit(1)
+
+        restore_session_bundle()
+        if batch_mode:
+            accounts = load_accounts(args.accounts)
+            if not accounts:
+                logger.error(f"账号文件中没有可用的账号: {args.accounts}")
+                exit(1)
+            results = asyncio.run(run_batch_async(accounts, args.concurrency))
+            result = all(r['success'] for r in results)
+        else:
+            result = asyncio.run(run_single_async())
+            log_step_summary()
+        save_session_bundle()
+        export_metrics()
+
+        if result:
+            logger.info("===== 签到脚本执行成功 =====")
+        else:
+            logger.error("===== 签到脚本执行失败 =====")
+    except KeyboardInterrupt:
+        logger.info("脚本被用户中断")
+    except Exception as e:
+        logger.error(f"脚本运行出错: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""FN论坛签到脚本性能基准
+
+子命令：
+- extract：在 fixtures/ 中保存的论坛页面上比较各页面提取后端的解析耗时和峰值内存
+- captcha：统计登录时记录的验证码真实通过率和耗时，并用已标注的语料回放各识别引擎，
+  输出准确率、p50/p95 耗时和每次成功登录的百度OCR费用
+- e2e：在本地模拟论坛（fnclub_fakeforum.py）上用 N 个虚拟账号跑完整的批量签到，
+  输出每秒账号数、单账号耗时 p50/p99、每个账号的请求数、峰值内存和CPU时间，
+  可以写出 JSON 结果并与之前的结果比较
+- importtime：用 python -X importtime 测量导入 fnclub_signer 等模块的耗时，超过预算或在导入时
+  加载了 requests / bs4 / numpy 等重量级依赖时返回非零退出码，可以放进 CI 防止启动变慢
+
+示例：
+    python fnclub_bench.py extract --rounds 200
+    python fnclub_bench.py captcha --engines template,baidu,template+baidu
+    python fnclub_bench.py e2e --accounts 10,100,1000 --engines sync,async --output bench.json
+    python fnclub_bench.py e2e --compare bench.json --max-regression 0.1
+    python fnclub_bench.py importtime --budget-ms 150
+"""
+
+import os
+import sys
+import queue
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+import tracemalloc
+import multiprocessing
+
+from fnclub_extract import EXTRACTORS, get_extractor
+from fnclub_captcha import CaptchaCorpus, create_recognizer, load_labeled_samples
+from fnclub_fakeforum import FakeForum, LOGIN_MODES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captcha_corpus')
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captcha_templates.npz')
+
+# 导入签到模块时不应加载的重量级依赖（只在需要发送请求、解析页面或识别验证码时才导入）
+HEAVY_MODULES = ('requests', 'urllib3', 'bs4', 'lxml', 'aiohttp', 'numpy', 'PIL', 'asyncio', 'smtplib', 'http.server')
+
+# 页面文件名前缀 -> 该页面在签到流程中调用的提取方法
+FIXTURE_METHODS = {
+    'home_': 'link_counts',
+    'login_page': 'login_form',
+    'captcha_page': 'captcha_page',
+    'sign_page': 'sign_page',
+}
+
+
+def _fixture_method(filename):
+    for prefix, method in FIXTURE_METHODS.items():
+        if filename.startswith(prefix):
+            return method
+    return None
+
+
+def _load_extractors(names):
+    extractors = {}
+    for name in names:
+        try:
+            extractors[name] = get_extractor(name)
+        except ImportError as e:
+            print(f"跳过后端 {name}：缺少依赖（{e}）")
+    return extractors
+
+
+def bench_extract(args):
+    """比较各提取后端在保存的页面上的解析耗时和峰值内存"""
+    extractors = _load_extractors(args.backends.split(','))
+    reference = get_extractor('bs4')
+
+    rows = []
+    for filename in sorted(os.listdir(args.fixtures)):
+        method = _fixture_method(filename)
+        if method is None:
+            continue
+        with open(os.path.join(args.fixtures, filename), 'r', encoding='utf-8') as f:
+            html = f.read()
+        expected = getattr(reference, method)(html)
+
+        for name, extractor in extractors.items():
+            func = getattr(extractor, method)
+            result = func(html)
+
+            # 单次解析的峰值内存
+            tracemalloc.start()
+            func(html)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                func(html)
+            elapsed = (time.perf_counter() - start) / args.rounds
+
+            rows.append((filename, len(html), name, elapsed * 1000, peak / 1024, result == expected))
+
+    print(f"{'页面':<28}{'大小(KB)':>10}  {'后端':<10}{'平均耗时(ms)':>14}{'峰值内存(KB)':>14}  与bs4一致")
+    for filename, size, name, elapsed_ms, peak_kb, same in rows:
+        print(f"{filename:<28}{size / 1024:>10.1f}  {name:<10}{elapsed_ms:>14.3f}{peak_kb:>14.1f}  {'是' if same else '否'}")
+
+    # 按后端汇总
+    print()
+    print(f"{'后端':<10}{'总耗时(ms)':>12}{'最大峰值内存(KB)':>18}")
+    for name in extractors:
+        backend_rows = [row for row in rows if row[2] == name]
+        print(f"{name:<10}{sum(r[3] for r in backend_rows):>12.3f}{max(r[4] for r in backend_rows):>18.1f}")
+    return all(row[5] for row in rows)
+
+
+def percentile(values, p):
+    """取第 p 百分位数（最近秩），values 为空时返回 0"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def _load_recognizer(name, templates):
+    if name == 'baidu':
+        # 百度OCR需要 API_KEY / SECRET_KEY，复用签到脚本的 token 缓存和连接池
+        from fnclub_signer import BaiduRecognizer
+        return BaiduRecognizer()
+    recognizer = create_recognizer(name, templates)
+    if recognizer is None:
+        raise ValueError(f"没有可用的识别引擎: {name}")
+    return recognizer
+
+
+def print_live_captcha_stats(corpus):
+    """按引擎统计登录时记录的验证码识别：次数、论坛接受率和耗时"""
+    by_engine = {}
+    for engine, latency_ms, accepted in corpus.attempts():
+        by_engine.setdefault(engine, []).append((latency_ms or 0.0, accepted))
+    if not by_engine:
+        print("验证码语料中还没有识别记录")
+        return
+
+    print("登录时记录的验证码识别：")
+    print(f"{'引擎':<12}{'次数':>8}{'通过率':>10}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for engine, rows in sorted(by_engine.items()):
+        known = [accepted for _, accepted in rows if accepted is not None]
+        rate = f"{sum(known) / len(known) * 100:.1f}%" if known else '-'
+        latencies = [latency for latency, _ in rows]
+        print(f"{engine:<12}{len(rows):>8}{rate:>10}{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}")
+    print()
+
+
+def bench_captcha(args):
+    """回放已标注的验证码语料，比较各识别引擎（或本地+百度的分级组合）的准确率、耗时和费用"""
+    corpus = CaptchaCorpus(args.corpus)
+    if args.samples:
+        samples = load_labeled_samples(args.samples)
+    else:
+        print_live_captcha_stats(corpus)
+        samples = corpus.labeled_samples()
+    if not samples:
+        print("没有已标注的验证码样本可供回放")
+        return False
+
+    rows = []
+    for spec in args.engines.split(','):
+        try:
+            chain = [_load_recognizer(name, args.templates) for name in spec.split('+')]
+        except Exception as e:
+            print(f"跳过引擎 {spec}：{type(e).__name__}: {e}")
+            continue
+
+        latencies = []
+        correct = 0
+        paid_calls = 0
+        for label, image_bytes in samples:
+            start = time.perf_counter()
+            for index, recognizer in enumerate(chain):
+                try:
+                    text, confidence = recognizer.recognize(image_bytes)
+                except Exception:
+                    text, confidence = None, 0.0
+                if recognizer.name == 'baidu':
+                    # 分级调用时一次识别可能调用多个百度OCR接口
+                    paid_calls += recognizer.last_calls
+                # 组合引擎：前面的引擎置信度足够时直接采用，否则交给下一个引擎
+                if text and (index == len(chain) - 1 or confidence >= args.min_confidence):
+                    break
+            latencies.append((time.perf_counter() - start) * 1000)
+            correct += bool(text) and text.upper() == label.upper()
+
+        accuracy = correct / len(samples)
+        calls_per_captcha = paid_calls / len(samples)
+        # 识别错误需要重新登录，每次成功登录平均需要 1/准确率 次识别
+        cost = calls_per_captcha * args.baidu_price / accuracy if accuracy else float('inf')
+        rows.append((spec, accuracy, percentile(latencies, 50), percentile(latencies, 95), calls_per_captcha, cost))
+
+    print(f"回放样本数: {len(samples)}")
+    print(f"{'引擎':<18}{'准确率':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'百度调用/次':>12}{'费用/成功登录(元)':>18}")
+    for spec, accuracy, p50, p95, calls, cost in rows:
+        print(f"{spec:<18}{accuracy * 100:>7.1f}%{p50:>10.1f}{p95:>10.1f}{calls:>12.2f}{cost:>18.4f}")
+    return bool(rows)
+
+
+def _e2e_case(results, engine, count, concurrency, forum_url, api_url, options):
+    """在独立子进程中运行一次批量签到（每次都是全新的会话库和进程状态），结果放入 results 队列
+
+    会话库、日志等都写入临时目录，运行结束后删除，不会在仓库的 logs/ 中留下文件。
+    运行出错时放入 {'error': 错误信息}，父进程据此记为失败，而不是一直等待结果。
+    """
+    import fnclub_signer
+
+    with tempfile.TemporaryDirectory(prefix='fnclub-bench-') as work_dir:
+        try:
+            _run_e2e_in(work_dir, results, engine, count, concurrency, forum_url, api_url, options)
+        except Exception as e:
+            results.put({'error': f"{type(e).__name__}: {e}"})
+            raise
+        finally:
+            fnclub_signer.stop_logging()
+
+
+def _run_e2e_in(work_dir, results, engine, count, concurrency, forum_url, api_url, options):
+    import asyncio
+    import logging
+    import fnclub_signer
+
+    config = fnclub_signer.Config
+    fnclub_signer.setup_logging(os.path.join(work_dir, 'logs'))
+    if not options['verbose']:
+        fnclub_signer.logger.setLevel(logging.WARNING)
+    config.set_hosts(forum_url, api_url, api_url)
+    config.API_KEY = config.SECRET_KEY = 'bench'
+    config.SESSION_DB = os.path.join(work_dir, 'sessions.db')
+    config.HISTORY_DB = os.path.join(work_dir, 'history.db')
+    config.TOKEN_CACHE_FILE = os.path.join(work_dir, 'token_cache.json')
+    config.COOKIE_DIR = os.path.join(work_dir, 'cookies')
+    config.CAPTCHA_CORPUS_DIR = os.path.join(work_dir, 'captcha_corpus')
+    config.FAILURE_ARTIFACT_DIR = os.path.join(work_dir, 'failures')
+    config.CAPTCHA_LOCAL_ENGINE = 'none'
+    config.RUN_LEDGER = False
+    config.METRICS_TEXTFILE = ''
+    config.IYUU_TOKEN = config.NOTIFY_WEBHOOK_URL = config.SMTP_HOST = ''
+    config.FORUM_RATE_LIMIT = options['forum_rate']
+    config.OCR_RATE_LIMIT = options['ocr_rate']
+    # 共享连接池（百度OCR会话、异步连接池）按并发数设置，避免连接池不够用时反复新建连接
+    config.BATCH_CONCURRENCY = concurrency
+    config.ASYNC_POOL_SIZE = concurrency
+
+    accounts = [{'username': f'bench{i:05d}', 'password': 'bench'} for i in range(count)]
+    if engine == 'async':
+        from fnclub_async import run_batch_async
+
+        def run_batch():
+            return asyncio.run(run_batch_async(accounts, concurrency))
+    else:
+        def run_batch():
+            return fnclub_signer.run_batch(accounts, concurrency)
+
+    if options['warm']:
+        # 先跑一轮建立会话，测量的是已有有效Cookie时的签到
+        run_batch()
+        results.put('warm')
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    batch = run_batch()
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    results.put({
+        'wall': wall,
+        'cpu': cpu,
+        'peak_rss_mb': rss_kb / 1024 if rss_kb is not None else None,
+        'latencies': [r['elapsed'] for r in batch],
+        'successes': sum(1 for r in batch if r['success']),
+    })
+
+
+def _wait_e2e_result(results, process):
+    """等待子进程放入的下一个结果；子进程未放入结果就退出时返回 {'error': ...}"""
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+    # 子进程退出前放入的结果可能还在管道中
+    try:
+        return results.get(timeout=1)
+    except queue.Empty:
+        return {'error': f"子进程异常退出（退出码 {process.exitcode}）"}
+
+
+def _run_e2e_case(forum, engine, count, args, options):
+    """启动子进程运行一次批量签到，并从模拟论坛统计请求数"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_e2e_case, args=(results, engine, count, args.concurrency,
+                                                        forum.forum_url, forum.api_url, options))
+    forum.reset()
+    process.start()
+    outcome = _wait_e2e_result(results, process)
+    if options['warm'] and outcome == 'warm':
+        forum.reset()
+        outcome = _wait_e2e_result(results, process)
+    process.join()
+    requests_total = sum(forum.stats().values())
+
+    if 'error' in outcome:
+        # 失败的用例按零吞吐、零成功率记录，与之前的结果比较时也会显示为退化
+        return {
+            'engine': engine,
+            'accounts': count,
+            'concurrency': args.concurrency,
+            'success_rate': 0.0,
+            'accounts_per_second': 0.0,
+            'wall_seconds': 0.0,
+            'p50_seconds': 0.0,
+            'p99_seconds': 0.0,
+            'requests_per_account': requests_total / count,
+            'peak_rss_mb': None,
+            'cpu_seconds': 0.0,
+            'error': outcome['error'],
+        }
+
+    latencies = outcome['latencies']
+    return {
+        'engine': engine,
+        'accounts': count,
+        'concurrency': args.concurrency,
+        'success_rate': outcome['successes'] / count,
+        'accounts_per_second': count / outcome['wall'] if outcome['wall'] else 0.0,
+        'wall_seconds': outcome['wall'],
+        'p50_seconds': percentile(latencies, 50),
+        'p99_seconds': percentile(latencies, 99),
+        'requests_per_account': requests_total / count,
+        'peak_rss_mb': outcome['peak_rss_mb'],
+        'cpu_seconds': outcome['cpu'],
+    }
+
+
+def compare_e2e(rows, baseline_file, max_regression):
+    """与之前保存的结果比较每秒账号数，下降超过 max_regression（比例）时返回 False"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(row['engine'], row['accounts']): row for row in json.load(f)['results']}
+    ok = True
+    print()
+    print(f"与 {baseline_file} 比较：")
+    print(f"{'引擎':<8}{'账号数':>8}{'之前(账号/秒)':>16}{'现在(账号/秒)':>16}{'变化':>10}")
+    for row in rows:
+        old = baseline.get((row['engine'], row['accounts']))
+        if not old or not old['accounts_per_second']:
+            continue
+        change = row['accounts_per_second'] / old['accounts_per_second'] - 1
+        regressed = change < -max_regression
+        ok = ok and not regressed
+        print(f"{row['engine']:<8}{row['accounts']:>8}{old['accounts_per_second']:>16.2f}"
+              f"{row['accounts_per_second']:>16.2f}{change * 100:>9.1f}%{'  退化' if regressed else ''}")
+    return ok
+
+
+def bench_e2e(args):
+    """在本地模拟论坛上测量批量签到的吞吐量、延迟、请求数和资源占用"""
+    options = {
+        'warm': args.warm,
+        'verbose': args.verbose,
+        'forum_rate': args.forum_rate,
+        'ocr_rate': args.ocr_rate,
+    }
+    forum = FakeForum(login_mode=args.login_mode, latency=args.latency, jitter=args.jitter,
+                      ocr_latency=args.ocr_latency, error_rate=args.error_rate, seed=0)
+    rows = []
+    with forum:
+        for engine in args.engines.split(','):
+            for count in (int(n) for n in args.accounts.split(',')):
+                rows.append(_run_e2e_case(forum, engine, count, args, options))
+                row = rows[-1]
+                if 'error' in row:
+                    print(f"{engine} x {count}: 运行失败: {row['error']}", flush=True)
+                    continue
+                print(f"{engine} x {count}: {row['accounts_per_second']:.2f} 账号/秒，成功率 {row['success_rate'] * 100:.1f}%", flush=True)
+
+    print()
+    print(f"{'引擎':<8}{'账号数':>8}{'账号/秒':>10}{'p50(秒)':>10}{'p99(秒)':>10}{'请求/账号':>10}{'峰值内存(MB)':>14}{'CPU(秒)':>10}{'成功率':>8}")
+    for row in rows:
+        rss = f"{row['peak_rss_mb']:.1f}" if row['peak_rss_mb'] is not None else '-'
+        print(f"{row['engine']:<8}{row['accounts']:>8}{row['accounts_per_second']:>10.2f}{row['p50_seconds']:>10.3f}"
+              f"{row['p99_seconds']:>10.3f}{row['requests_per_account']:>10.2f}{rss:>14}{row['cpu_seconds']:>10.2f}"
+              f"{row['success_rate'] * 100:>7.1f}%")
+
+    if args.output:
+        report = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'settings': {key: getattr(args, key) for key in ('login_mode', 'latency', 'jitter', 'ocr_latency', 'error_rate',
+                                                              'concurrency', 'warm', 'forum_rate', 'ocr_rate')},
+            'results': rows,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+    ok = all(row['success_rate'] == 1 for row in rows) if args.error_rate == 0 else True
+    ok = ok and not any('error' in row for row in rows)
+    if args.compare:
+        ok = compare_e2e(rows, args.compare, args.max_regression) and ok
+    return ok
+
+
+def measure_import(module):
+    """在新的解释器中导入 module，返回 (总耗时秒, [(模块名, 自身耗时秒, 累计耗时秒), ...])"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    # site（含 .pth 文件）导入的模块在解释器启动时就已加载，与被测模块无关
+    sites = [index for index, entry in enumerate(entries) if entry[0] == 'site']
+    if sites:
+        entries = entries[sites[-1] + 1:]
+    total = next((cumulative for name, _, cumulative in entries if name == module), 0.0)
+    return total, entries
+
+
+def bench_importtime(args):
+    """测量导入耗时（多次取最小值），检查是否超出预算和是否加载了重量级依赖"""
+    ok = True
+    for module in args.modules.split(','):
+        runs = [measure_import(module) for _ in range(args.rounds)]
+        total, entries = min(runs, key=lambda run: run[0])
+        heavy = sorted({name for name, _, _ in entries
+                        if any(name == heavy or name.startswith(heavy + '.') for heavy in HEAVY_MODULES)})
+        over_budget = total * 1000 > args.budget_ms
+        ok = ok and not over_budget and not heavy
+
+        print(f"import {module}: {total * 1000:.1f}ms（{args.rounds} 次取最小值，预算 {args.budget_ms:.0f}ms）"
+              f"{'  超出预算' if over_budget else ''}")
+        print(f"{'模块':<40}{'自身(ms)':>10}{'累计(ms)':>10}")
+        for name, self_time, cumulative in sorted(entries, key=lambda entry: entry[1], reverse=True)[:args.top]:
+            print(f"{name:<40}{self_time * 1000:>10.1f}{cumulative * 1000:>10.1f}")
+        if heavy:
+            print(f"导入时加载了重量级依赖: {', '.join(heavy)}")
+        print()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FN论坛签到脚本性能基准')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help='比较页面提取后端的解析耗时和内存')
+    extract_parser.add_argument('--fixtures', default=FIXTURE_DIR, help='保存的论坛页面目录')
+    extract_parser.add_argument('--rounds', type=int, default=100, help='每个页面每个后端的解析次数')
+    extract_parser.add_argument('--backends', default=','.join(['auto'] + list(EXTRACTORS)),
+                                help='参与比较的后端，逗号分隔')
+    extract_parser.set_defaults(func=bench_extract)
+
+    captcha_parser = subparsers.add_parser('captcha', help='统计验证码通过率并回放语料比较识别引擎')
+    captcha_parser.add_argument('--corpus', default=CORPUS_DIR, help='登录时记录的验证码语料目录')
+    captcha_parser.add_argument('--samples', help='改用已标注的图片目录回放（文件名以验证码内容开头）')
+    captcha_parser.add_argument('--engines', default='template,tesseract',
+                                help='参与比较的引擎，逗号分隔；用 + 连接表示分级组合，如 template+baidu')
+    captcha_parser.add_argument('--templates', default=TEMPLATE_FILE, help='模板匹配引擎的模板文件')
+    captcha_parser.add_argument('--min-confidence', type=float, default=0.85,
+                                help='分级组合中本地引擎结果被直接采用的最低置信度')
+    captcha_parser.add_argument('--baidu-price', type=float, default=0.01,
+                                help='百度OCR每次调用的费用（元，按实际套餐填写）')
+    captcha_parser.set_defaults(func=bench_captcha)
+
+    e2e_parser = subparsers.add_parser('e2e', help='在本地模拟论坛上测量N个账号批量签到的吞吐量和资源占用')
+    e2e_parser.add_argument('--accounts', default='10,100,1000', help='虚拟账号数，逗号分隔')
+    e2e_parser.add_argument('--engines', default='sync,async', help='批量签到引擎：sync（线程池）/ async，逗号分隔')
+    e2e_parser.add_argument('--concurrency', type=int, default=20, help='批量签到并发数')
+    e2e_parser.add_argument('--login-mode', choices=LOGIN_MODES, default='redirect', help='模拟论坛的验证码方式')
+    e2e_parser.add_argument('--latency', type=float, default=0.02, help='模拟论坛每个请求的延迟（秒）')
+    e2e_parser.add_argument('--jitter', type=float, default=0.0, help='每个请求额外的随机延迟上限（秒）')
+    e2e_parser.add_argument('--ocr-latency', type=float, default=0.05, help='模拟OCR接口每个请求的延迟（秒）')
+    e2e_parser.add_argument('--error-rate', type=float, default=0.0, help='模拟论坛返回 503 的请求比例')
+    e2e_parser.add_argument('--forum-rate', type=float, default=0, help='论坛限速（每秒请求数，默认 0 不限速）')
+    e2e_parser.add_argument('--ocr-rate', type=float, default=0, help='OCR限速（每秒请求数，默认 0 不限速）')
+    e2e_parser.add_argument('--warm', action='store_true', help='先跑一轮建立会话，测量已登录账号的签到')
+    e2e_parser.add_argument('--verbose', action='store_true', help='输出签到日志（默认只输出警告和错误）')
+    e2e_parser.add_argument('--output', help='把结果写成 JSON 文件')
+    e2e_parser.add_argument('--compare', help='与之前保存的 JSON 结果比较每秒账号数')
+    e2e_parser.add_argument('--max-regression', type=float, default=0.1,
+                            help='每秒账号数下降超过该比例时返回非零退出码（默认 0.1）')
+    e2e_parser.set_defaults(func=bench_e2e)
+
+    importtime_parser = subparsers.add_parser('importtime', help='测量导入签到模块的耗时并检查是否加载了重量级依赖')
+    importtime_parser.add_argument('--modules', default='fnclub_signer', help='要测量的模块，逗号分隔')
+    importtime_parser.add_argument('--rounds', type=int, default=5,
+                                   help='测量次数，取最小值（第一次可能包含编译 .pyc 的时间）')
+    importtime_parser.add_argument('--budget-ms', type=float, default=150, help='导入耗时预算（毫秒），超出时返回非零退出码')
+    importtime_parser.add_argument('--top', type=int, default=15, help='输出自身耗时最多的前 N 个模块')
+    importtime_parser.set_defaults(func=bench_importtime)
+
+    args = parser.parse_args()
+    return 0 if args.func(args) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
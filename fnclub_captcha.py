@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""本地验证码识别
+
+登录时论坛返回的 misc.php?mod=seccode 验证码图片默认都要上传到百度OCR识别，
+请求慢、按次计费且有频率限制。这里提供可替换的本地识别引擎，在本机CPU上完成识别，
+置信度不足时再由调用方回退到百度OCR：
+
+- template：NumPy 模板匹配。图片二值化、去噪后按列投影切分出单个字符，
+  与训练得到的字符模板做归一化相关匹配，单张图片识别耗时通常在几毫秒内。
+  需要 pip install numpy pillow，并先用已标注的验证码图片生成模板文件
+- tesseract：调用本机的 Tesseract 可执行文件（限定验证码字符集），无需训练
+
+每个引擎的 recognize(image_bytes) 返回 (识别文本, 置信度0~1)；识别结果长度或字符集
+不符合验证码规则时置信度为 0。preprocess_image() 把验证码图片处理成去掉噪点和干扰线、
+裁剪到文字区域的黑白图片，供 Tesseract 和百度OCR使用。本模块不依赖 fnclub_signer 中的配置。
+
+CaptchaCorpus 记录登录过程中的每次验证码识别（图片、引擎、结果、耗时、论坛是否接受），
+被论坛接受的识别结果即为图片的标注，可用于生成模板和回放基准（fnclub_bench.py captcha）。
+
+示例：
+    # 用已标注的验证码图片（文件名以验证码内容开头，如 B7KM.png、B7KM_2.gif）生成模板
+    python fnclub_captcha.py train --samples captcha_samples --output captcha_templates.npz
+    # 也可以直接使用登录时自动记录的验证码语料
+    python fnclub_captcha.py train --corpus captcha_corpus --output captcha_templates.npz
+    # 识别图片并输出结果、置信度和耗时
+    python fnclub_captcha.py recognize captcha.gif --engine template
+"""
+
+import io
+import os
+import re
+import time
+import shutil
+import sqlite3
+import argparse
+
+# Discuz 验证码默认字符集（去掉了 0/O、1/I 等容易混淆的字符）和长度
+DISCUZ_CHARSET = 'BCEFGHJKMPQRTVWXY2346789'
+DISCUZ_LENGTH = 4
+
+# 模板匹配时单个字符缩放到的边长（像素）
+GLYPH_SIZE = 16
+
+
+def normalize_text(text, charset=DISCUZ_CHARSET, length=DISCUZ_LENGTH):
+    """统一为大写并去掉空白和标点；不符合验证码长度或字符集时返回 None"""
+    text = re.sub(r'[^0-9A-Za-z]', '', text or '').upper()
+    if length and len(text) != length:
+        return None
+    if charset and any(ch not in charset for ch in text):
+        return None
+    return text
+
+
+def _imports():
+    """延迟导入 NumPy / Pillow，未安装时抛出 ImportError"""
+    import numpy as np
+    from PIL import Image
+    return np, Image
+
+
+def load_gray(image_bytes):
+    """解码验证码图片（GIF 动图取第一帧），返回 0~255 的灰度矩阵"""
+    np, Image = _imports()
+    image = Image.open(io.BytesIO(image_bytes))
+    image.seek(0)
+    return np.asarray(image.convert('L'), dtype=np.float32)
+
+
+def binarize(gray):
+    """Otsu 阈值二值化，返回字符像素为 True 的布尔矩阵，并去掉孤立的噪点"""
+    np, _ = _imports()
+    hist = np.bincount(gray.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    levels = np.arange(256)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    mean_bg = np.cumsum(hist * levels)
+    mean_all = mean_bg[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean_all * weight_bg / total - mean_bg) ** 2 / (weight_bg * weight_fg)
+    if np.isnan(between).all():
+        # 单色图片（空白或纯色）只有一个灰度级，没有字符像素
+        return np.zeros(gray.shape, dtype=bool)
+    threshold = int(np.nanargmax(between))
+
+    mask = gray <= threshold
+    # 字符笔画总是少数像素，占比超过一半说明是深色背景上的浅色字符
+    if mask.mean() > 0.5:
+        mask = ~mask
+
+    # 3x3 邻域内少于 2 个字符像素的点视为干扰点
+    padded = np.pad(mask, 1).astype(np.uint8)
+    h, w = mask.shape
+    neighbours = sum(padded[dy:dy + h, dx:dx + w] for dy in range(3) for dx in range(3)) - mask
+    return mask & (neighbours >= 2)
+
+
+def remove_lines(mask):
+    """去掉干扰线：干扰线通常只有 1 像素粗，上下都没有字符像素的点视为干扰线上的点（字符笔画至少 2 像素粗）"""
+    np, _ = _imports()
+    padded = np.pad(mask, ((1, 1), (0, 0)))
+    vertical = padded[:-2] | padded[2:]
+    return mask & vertical
+
+
+def crop_text_band(mask, margin=2):
+    """裁剪到包含字符像素的区域（四周保留 margin 像素），没有字符像素时返回 None"""
+    np, _ = _imports()
+    rows = np.nonzero(mask.any(axis=1))[0]
+    columns = np.nonzero(mask.any(axis=0))[0]
+    if not len(rows):
+        return None
+    top, bottom = max(rows[0] - margin, 0), min(rows[-1] + margin + 1, mask.shape[0])
+    left, right = max(columns[0] - margin, 0), min(columns[-1] + margin + 1, mask.shape[1])
+    return mask[top:bottom, left:right]
+
+
+def preprocess_image(image_bytes, scale=2, border=8):
+    """OCR 前的预处理：灰度、二值化、去噪点和干扰线、裁剪到文字区域，加白边并放大 scale 倍，返回黑字白底的 PNG；
+    处理后没有字符像素时返回 None"""
+    np, Image = _imports()
+    mask = crop_text_band(remove_lines(binarize(load_gray(image_bytes))))
+    if mask is None:
+        return None
+    mask = np.pad(mask, border)
+    image = Image.fromarray(np.where(mask, 0, 255).astype(np.uint8))
+    if scale > 1:
+        image = image.resize((image.width * scale, image.height * scale), Image.NEAREST)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def segment(mask, length=DISCUZ_LENGTH):
+    """按列投影切分字符，返回每个字符的 (起始列, 结束列)
+
+    连通的列段多于字符数时去掉像素最少的段（残留干扰线），少于字符数时把最宽的段对半切开（粘连字符）。
+    """
+    np, _ = _imports()
+    columns = mask.sum(axis=0) > 0
+    runs = []
+    start = None
+    for x, filled in enumerate(columns):
+        if filled and start is None:
+            start = x
+        elif not filled and start is not None:
+            runs.append((start, x))
+            start = None
+    if start is not None:
+        runs.append((start, len(columns)))
+    if not runs:
+        return []
+
+    while len(runs) > length:
+        masses = [mask[:, a:b].sum() for a, b in runs]
+        runs.pop(int(np.argmin(masses)))
+    while len(runs) < length:
+        index = max(range(len(runs)), key=lambda i: runs[i][1] - runs[i][0])
+        a, b = runs[index]
+        if b - a < 2:
+            break
+        middle = (a + b) // 2
+        runs[index:index + 1] = [(a, middle), (middle, b)]
+    return runs
+
+
+def glyph_vectors(image_bytes, length=DISCUZ_LENGTH):
+    """把验证码图片切分为 length 个字符，返回 (length, GLYPH_SIZE*GLYPH_SIZE) 的归一化特征矩阵；切分失败返回 None"""
+    np, Image = _imports()
+    mask = binarize(load_gray(image_bytes))
+    runs = segment(mask, length)
+    if len(runs) != length:
+        return None
+
+    vectors = []
+    for a, b in runs:
+        glyph = mask[:, a:b]
+        rows = np.nonzero(glyph.any(axis=1))[0]
+        glyph = glyph[rows[0]:rows[-1] + 1]
+        resized = Image.fromarray(glyph.astype(np.uint8) * 255).resize((GLYPH_SIZE, GLYPH_SIZE), Image.BILINEAR)
+        vector = np.asarray(resized, dtype=np.float32).ravel()
+        vector -= vector.mean()
+        norm = np.linalg.norm(vector)
+        vectors.append(vector / norm if norm else vector)
+    return np.stack(vectors)
+
+
+class TemplateRecognizer:
+    """NumPy 模板匹配识别：每个字符取相关系数最高的模板，置信度为各字符得分的最小值"""
+
+    name = 'template'
+
+    def __init__(self, template_file, charset=DISCUZ_CHARSET, length=DISCUZ_LENGTH):
+        np, _ = _imports()
+        if not os.path.exists(template_file):
+            raise FileNotFoundError(f"验证码模板文件不存在: {template_file}")
+        data = np.load(template_file)
+        self.templates = data['templates']
+        self.labels = data['labels']
+        self.charset = charset
+        self.length = length
+
+    def recognize(self, image_bytes):
+        vectors = glyph_vectors(image_bytes, self.length)
+        if vectors is None:
+            return None, 0.0
+        scores = vectors @ self.templates.T
+        best = scores.argmax(axis=1)
+        text = normalize_text(''.join(self.labels[best]), self.charset, self.length)
+        if text is None:
+            return None, 0.0
+        confidence = float(scores[range(len(best)), best].min())
+        return text, max(confidence, 0.0)
+
+    @staticmethod
+    def train(samples, template_file, length=DISCUZ_LENGTH):
+        """用 [(验证码内容, 图片bytes), ...] 生成模板文件，返回成功切分的样本数"""
+        np, _ = _imports()
+        templates = []
+        labels = []
+        used = 0
+        for label, image_bytes in samples:
+            vectors = glyph_vectors(image_bytes, length)
+            if vectors is None or len(label) != length:
+                continue
+            templates.extend(vectors)
+            labels.extend(label.upper())
+            used += 1
+        if not templates:
+            raise ValueError("没有可用于生成模板的验证码样本")
+        np.savez_compressed(template_file, templates=np.stack(templates), labels=np.array(labels))
+        return used
+
+
+class TesseractRecognizer:
+    """调用本机 Tesseract 识别（单行模式，限定验证码字符集），置信度取各单词置信度的最小值"""
+
+    name = 'tesseract'
+
+    def __init__(self, binary='tesseract', charset=DISCUZ_CHARSET, length=DISCUZ_LENGTH, timeout=5):
+        self.binary = shutil.which(binary)
+        if not self.binary:
+            raise FileNotFoundError(f"未找到 Tesseract 可执行文件: {binary}")
+        self.charset = charset
+        self.length = length
+        self.timeout = timeout
+
+    def _prepare(self, image_bytes):
+        """去掉背景、噪点和干扰线并裁剪到文字区域；未安装 NumPy / Pillow 时直接使用原图"""
+        try:
+            return preprocess_image(image_bytes) or image_bytes
+        except ImportError:
+            return image_bytes
+
+    def recognize(self, image_bytes):
+        import subprocess
+
+        command = [self.binary, 'stdin', 'stdout', '--psm', '7']
+        if self.charset:
+            command += ['-c', f'tessedit_char_whitelist={self.charset}']
+        command.append('tsv')
+        output = subprocess.run(command, input=self._prepare(image_bytes), capture_output=True,
+                                timeout=self.timeout, check=True).stdout.decode('utf-8', 'replace')
+
+        words = []
+        confidences = []
+        for line in output.splitlines()[1:]:
+            fields = line.split('\t')
+            if len(fields) == 12 and fields[11].strip():
+                words.append(fields[11].strip())
+                confidences.append(float(fields[10]) / 100)
+        text = normalize_text(''.join(words), self.charset, self.length)
+        if text is None:
+            return None, 0.0
+        return text, max(min(confidences), 0.0)
+
+
+RECOGNIZERS = {
+    'template': TemplateRecognizer,
+    'tesseract': TesseractRecognizer,
+}
+
+
+def create_recognizer(name='auto', template_file='captcha_templates.npz', charset=DISCUZ_CHARSET, length=DISCUZ_LENGTH):
+    """按名称创建本地识别引擎（auto / template / tesseract / none）
+
+    auto 优先使用模板匹配（需要模板文件和 NumPy / Pillow），否则使用本机 Tesseract，
+    都不可用时返回 None；指定的引擎不可用时抛出 ImportError 或 FileNotFoundError。
+    """
+    name = (name or 'none').lower()
+    if name in ('none', 'off', '0'):
+        return None
+    if name == 'auto':
+        for candidate in RECOGNIZERS:
+            try:
+                return create_recognizer(candidate, template_file, charset, length)
+            except (ImportError, FileNotFoundError):
+                continue
+        return None
+    if name == 'template':
+        return TemplateRecognizer(template_file, charset, length)
+    if name == 'tesseract':
+        return TesseractRecognizer(charset=charset, length=length)
+    raise ValueError(f"未知的本地验证码识别引擎: {name}，可选值: auto, none, {', '.join(RECOGNIZERS)}")
+
+
+def load_labeled_samples(directory):
+    """读取已标注的验证码图片目录，文件名以验证码内容开头（如 B7KM.png、B7KM_2.gif），返回 [(内容, bytes), ...]"""
+    samples = []
+    for filename in sorted(os.listdir(directory)):
+        label = re.split(r'[_.]', filename, 1)[0]
+        path = os.path.join(directory, filename)
+        if not label or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            samples.append((label.upper(), f.read()))
+    return samples
+
+
+def image_extension(image_bytes):
+    """根据文件头判断验证码图片格式"""
+    if image_bytes.startswith(b'GIF8'):
+        return 'gif'
+    if image_bytes.startswith(b'\x89PNG'):
+        return 'png'
+    if image_bytes.startswith(b'\xff\xd8'):
+        return 'jpg'
+    return 'bin'
+
+
+class CaptchaCorpus:
+    """验证码语料库：图片按内容哈希保存在 images/ 下，每次识别记录一行到 corpus.db
+
+    accepted 为论坛是否接受识别结果（None 表示无法判断）；被接受的识别结果同时写入 label 作为标注。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.image_dir = os.path.join(directory, 'images')
+        self.db_path = os.path.join(directory, 'corpus.db')
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(self.image_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS attempts ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'created_at REAL NOT NULL, '
+                'account TEXT, '
+                'image TEXT NOT NULL, '
+                'engine TEXT NOT NULL, '
+                'text TEXT, '
+                'confidence REAL, '
+                'latency_ms REAL, '
+                'accepted INTEGER, '
+                'label TEXT)'
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def add(self, image_bytes, engine, text, latency_ms, accepted, confidence=None, account=''):
+        """记录一次验证码识别及论坛是否接受"""
+        import hashlib
+
+        conn = self._connect()
+        image_name = f"{hashlib.sha1(image_bytes).hexdigest()}.{image_extension(image_bytes)}"
+        image_path = os.path.join(self.image_dir, image_name)
+        if not os.path.exists(image_path):
+            with open(image_path, 'wb') as f:
+                f.write(image_bytes)
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO attempts (created_at, account, image, engine, text, confidence, latency_ms, accepted, label) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (time.time(), account, image_name, engine, text, confidence, latency_ms,
+                     None if accepted is None else int(accepted), text if accepted else None)
+                )
+        finally:
+            conn.close()
+
+    def attempts(self):
+        """返回所有识别记录 [(engine, latency_ms, accepted), ...]"""
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT engine, latency_ms, accepted FROM attempts ORDER BY id').fetchall()
+        finally:
+            conn.close()
+
+    def labeled_samples(self):
+        """返回已标注的图片 [(标注, 图片bytes), ...]，同一图片只返回一次"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT image, MAX(label) FROM attempts WHERE label IS NOT NULL GROUP BY image ORDER BY MIN(id)').fetchall()
+        finally:
+            conn.close()
+        samples = []
+        for image_name, label in rows:
+            with open(os.path.join(self.image_dir, image_name), 'rb') as f:
+                samples.append((label, f.read()))
+        return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FN论坛本地验证码识别')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='用已标注的验证码图片生成模板文件')
+    source = train_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--samples', help='已标注的验证码图片目录')
+    source.add_argument('--corpus', help='登录时记录的验证码语料目录（使用被论坛接受的识别结果作为标注）')
+    train_parser.add_argument('--output', default='captcha_templates.npz', help='模板文件路径')
+
+    recognize_parser = subparsers.add_parser('recognize', help='识别验证码图片')
+    recognize_parser.add_argument('images', nargs='+', help='验证码图片路径')
+    recognize_parser.add_argument('--engine', default='auto', help='识别引擎：auto / template / tesseract')
+    recognize_parser.add_argument('--templates', default='captcha_templates.npz', help='模板文件路径')
+
+    args = parser.parse_args()
+    if args.command == 'train':
+        samples = load_labeled_samples(args.samples) if args.samples else CaptchaCorpus(args.corpus).labeled_samples()
+        used = TemplateRecognizer.train(samples, args.output)
+        print(f"已生成模板文件 {args.output}：使用 {used}/{len(samples)} 个样本")
+        return 0
+
+    recognizer = create_recognizer(args.engine, args.templates)
+    if recognizer is None:
+        print("没有可用的本地识别引擎")
+        return 1
+    for path in args.images:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        start = time.perf_counter()
+        text, confidence = recognizer.recognize(image_bytes)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"{path}: {text or '(无结果)'}  置信度 {confidence:.2f}  耗时 {elapsed_ms:.1f}ms  引擎 {recognizer.name}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
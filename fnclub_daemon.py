@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""FN论坛签到常驻模式
+
+一次启动后长期运行，每个账号的 FNSignIn 实例（Cookie、keep-alive 连接池）和百度OCR
+access_token 都保留在内存中，不必每天重新启动 Python、导入依赖和建立 TLS 连接：
+
+- 每天在 DAEMON_WINDOW（论坛时区）内为每个账号安排一个签到时间，各账号分散在窗口内并加随机抖动
+- 签到失败的账号按指数退避重新签到，每天最多 DAEMON_MAX_ATTEMPTS 次
+- 签到计划和结果保存在 SQLite 计划库中，进程重启后按原计划继续，已成功的账号不会重复签到
+
+用法：python fnclub_daemon.py --accounts accounts.json [--window 08:00-22:00]
+"""
+
+import os
+import time
+import random
+import signal
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from fnclub_signer import (
+    Config,
+    logger,
+    FNSignIn,
+    forum_now,
+    get_forum_timezone,
+    load_accounts,
+    get_account_cookie_file,
+    log_batch_summary,
+    export_metrics,
+    get_notifier,
+    setup_logging,
+)
+from fnclub_metrics import start_http_exporter
+from fnclub_retry import RetryPolicy
+
+# 计划状态
+PENDING = 'pending'
+RUNNING = 'running'
+RETRY = 'retry'
+DONE = 'done'
+GAVE_UP = 'gave_up'
+
+# 启动时已过当天窗口结束时间的账号，在该时间（秒）内尽快补签
+CATCHUP_SECONDS = 300
+# 空闲时最长睡眠时间（秒），保证能及时发现日期变化和退出信号
+MAX_IDLE_SECONDS = 300
+
+
+class ScheduleStore:
+    """按 (论坛日期, 账号) 保存签到计划的SQLite计划库"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.DAEMON_SCHEDULE_DB
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS schedule ('
+                        'day TEXT NOT NULL, '
+                        'account TEXT NOT NULL, '
+                        'due_at REAL NOT NULL, '
+                        'attempts INTEGER NOT NULL DEFAULT 0, '
+                        'state TEXT NOT NULL, '
+                        'status TEXT, '
+                        'updated_at REAL, '
+                        'PRIMARY KEY (day, account))'
+                    )
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def load_day(self, day):
+        """读取某一天的计划：{账号: {'due_at', 'attempts', 'state', 'status'}}"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT account, due_at, attempts, state, status FROM schedule WHERE day = ?', (day,)).fetchall()
+        finally:
+            conn.close()
+        return {row[0]: {'due_at': row[1], 'attempts': row[2], 'state': row[3], 'status': row[4]} for row in rows}
+
+    def add(self, day, plan):
+        """写入新账号的计划 {账号: 签到时间戳}，已有计划的账号保持不变"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO schedule (day, account, due_at, attempts, state, updated_at) VALUES (?, ?, ?, 0, ?, ?)',
+                    [(day, account, due_at, PENDING, now) for account, due_at in plan.items()]
+                )
+        finally:
+            conn.close()
+
+    def update(self, day, account, state, attempts=None, due_at=None, status=None):
+        """更新账号当天的计划状态，未指定的字段保持不变"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'UPDATE schedule SET state = ?, attempts = COALESCE(?, attempts), due_at = COALESCE(?, due_at), '
+                    'status = COALESCE(?, status), updated_at = ? WHERE day = ? AND account = ?',
+                    (state, attempts, due_at, status, time.time(), day, account)
+                )
+        finally:
+            conn.close()
+
+
+def parse_window(text):
+    """解析 "HH:MM-HH:MM" 格式的每日签到窗口，返回 (开始, 结束) 的 (时, 分)"""
+    try:
+        start_text, end_text = text.split('-')
+        start = tuple(int(part) for part in start_text.strip().split(':'))
+        end = tuple(int(part) for part in end_text.strip().split(':'))
+        if len(start) != 2 or len(end) != 2 or not (0, 0) <= start < end <= (24, 0):
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"签到窗口格式错误（应为 HH:MM-HH:MM，且开始早于结束）: {text}")
+    return start, end
+
+
+def window_bounds(day, window):
+    """某一天签到窗口的开始和结束时间戳"""
+    tz = get_forum_timezone()
+    midnight = datetime(day.year, day.month, day.day, tzinfo=tz)
+    (start_hour, start_minute), (end_hour, end_minute) = window
+    start = midnight + timedelta(hours=start_hour, minutes=start_minute)
+    end = midnight + timedelta(hours=end_hour, minutes=end_minute)
+    return start.timestamp(), end.timestamp()
+
+
+def plan_day(usernames, day, window, now=None, rng=random):
+    """为账号安排当天的签到时间：窗口按账号数均分，每个账号在自己的时间段内随机，账号顺序也随机打乱
+
+    当天窗口已过一部分时只在剩余时间内安排；已经过了窗口结束时间则在几分钟内补签。
+    """
+    now = time.time() if now is None else now
+    start, end = window_bounds(day, window)
+    start = max(start, now)
+    if start >= end:
+        start, end = now, now + CATCHUP_SECONDS
+
+    usernames = list(usernames)
+    rng.shuffle(usernames)
+    slot = (end - start) / max(1, len(usernames))
+    return {username: start + (index + rng.random()) * slot for index, username in enumerate(usernames)}
+
+
+class SignDaemon:
+    """常驻签到调度器"""
+
+    def __init__(self, accounts, window, concurrency=None, store=None):
+        self.accounts = {account['username']: account for account in accounts}
+        self.window = window
+        self.concurrency = max(1, concurrency or Config.BATCH_CONCURRENCY)
+        self.store = store or ScheduleStore()
+        self.retry_policy = RetryPolicy(
+            max_attempts=Config.DAEMON_MAX_ATTEMPTS,
+            base_delay=Config.DAEMON_RETRY_DELAY,
+            max_delay=Config.DAEMON_RETRY_DELAY * 8,
+            budget=0
+        )
+        # 每个账号的签到实例在整个运行期间复用，保留Cookie和连接池
+        self.signers = {}
+        self.stop_event = threading.Event()
+
+    def stop(self, *args):
+        logger.info("收到退出信号，当前签到完成后退出")
+        self.stop_event.set()
+
+    def get_signer(self, username):
+        signer = self.signers.get(username)
+        if signer is None:
+            account = self.accounts[username]
+            signer = self.signers[username] = FNSignIn(username, account['password'], get_account_cookie_file(username))
+        return signer
+
+    def ensure_schedule(self, day):
+        """读取当天计划，为还没有计划的账号安排签到时间"""
+        key = day.isoformat()
+        schedule = self.store.load_day(key)
+        missing = [username for username in self.accounts if username not in schedule]
+        if missing:
+            plan = plan_day(missing, day, self.window)
+            self.store.add(key, plan)
+            tz = get_forum_timezone()
+            first, last = min(plan.values()), max(plan.values())
+            logger.info(f"===== {key} 签到计划：{len(plan)} 个账号，"
+                        f"{datetime.fromtimestamp(first, tz):%H:%M:%S} ~ {datetime.fromtimestamp(last, tz):%H:%M:%S} =====")
+            schedule = self.store.load_day(key)
+        return schedule
+
+    def run_account(self, day, username, attempts):
+        """执行一个账号的签到并更新计划库，返回批量汇总使用的结果字典"""
+        key = day.isoformat()
+        self.store.update(key, username, RUNNING)
+        start_time = time.time()
+        try:
+            signer = self.get_signer(username)
+            success = signer.run()
+            status = signer.status
+        except Exception as e:
+            logger.error(f"[{username}] 签到过程发生未处理的错误: {type(e).__name__}: {e}")
+            success = False
+            status = f"异常: {type(e).__name__}"
+
+        attempts += 1
+        if success:
+            self.store.update(key, username, DONE, attempts=attempts, status=status)
+        elif attempts >= self.retry_policy.max_attempts:
+            logger.error(f"[{username}] 今日已尝试 {attempts} 次仍未成功，不再重试")
+            self.store.update(key, username, GAVE_UP, attempts=attempts, status=status)
+        else:
+            delay = self.retry_policy.backoff(attempts)
+            logger.warning(f"[{username}] 签到失败（{status}），{delay / 60:.1f} 分钟后重新签到({attempts}/{self.retry_policy.max_attempts})")
+            self.store.update(key, username, RETRY, attempts=attempts, due_at=time.time() + delay, status=status)
+        return {
+            'username': username,
+            'success': success,
+            'status': status,
+            'elapsed': time.time() - start_time
+        }
+
+    def run_forever(self):
+        logger.info(f"===== 常驻签到模式启动：{len(self.accounts)} 个账号，签到窗口 {Config.DAEMON_WINDOW}，并发数 {self.concurrency} =====")
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self.stop_event.is_set():
+                day = forum_now().date()
+                schedule = self.ensure_schedule(day)
+                now = time.time()
+                # 上次运行中途退出（状态为 running）的账号也重新执行：论坛已签到时只会读到"今日已打卡"
+                waiting = {username: entry for username, entry in schedule.items()
+                           if username in self.accounts and entry['state'] in (PENDING, RUNNING, RETRY)}
+                due = [username for username, entry in waiting.items() if entry['due_at'] <= now]
+
+                if due:
+                    # 同一轮到期的账号合并成一条汇总通知
+                    with get_notifier().batch():
+                        futures = [executor.submit(self.run_account, day, username, waiting[username]['attempts']) for username in due]
+                        results = [future.result() for future in futures]
+                    log_batch_summary(results)
+                    export_metrics()
+                    continue
+
+                # 睡到下一个账号的签到时间；今天都处理完了则等到日期变化
+                next_due = min((entry['due_at'] for entry in waiting.values()), default=now + MAX_IDLE_SECONDS)
+                self.stop_event.wait(min(MAX_IDLE_SECONDS, max(1.0, next_due - now)))
+        logger.info("===== 常驻签到模式已退出 =====")
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='FN论坛签到常驻模式')
+    parser.add_argument('--accounts', default=Config.ACCOUNTS_FILE,
+                        help='多账号文件路径（JSON/YAML/CSV），不指定时使用环境变量中的单个账号')
+    parser.add_argument('--window', default=Config.DAEMON_WINDOW,
+                        help=f'每天的签到时间窗口，论坛时区（默认 {Config.DAEMON_WINDOW}）')
+    parser.add_argument('--concurrency', type=int, default=Config.BATCH_CONCURRENCY,
+                        help=f'同一时刻最多同时签到的账号数（默认 {Config.BATCH_CONCURRENCY}）')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    if os.environ.get('DEBUG') == '1':
+        logger.setLevel(logging.DEBUG)
+
+    args = parse_args()
+    env_valid, env_msg, _ = Config.check_required_env_vars(require_account=not args.accounts)
+    if not env_valid:
+        logger.error(env_msg)
+        print(f"\n{env_msg}")
+        exit(1)
+
+    try:
+        window = parse_window(args.window)
+    except ValueError as e:
+        logger.error(str(e))
+        exit(1)
+    Config.DAEMON_WINDOW = args.window
+
+    if args.accounts:
+        accounts = load_accounts(args.accounts)
+    else:
+        accounts = [{'username': Config.USERNAME, 'password': Config.PASSWORD}]
+    if not accounts:
+        logger.error(f"账号文件中没有可用的账号: {args.accounts}")
+        exit(1)
+
+    if Config.METRICS_PORT:
+        start_http_exporter(Config.METRICS_PORT)
+        logger.info(f"指标接口已启动: http://0.0.0.0:{Config.METRICS_PORT}/metrics")
+
+    daemon = SignDaemon(accounts, window, args.concurrency)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        logger.info("常驻签到模式被用户中断")
@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+
+"""页面字段提取后端
+
+签到流程只需要从论坛页面中读取少量字段（登录/退出链接、formhash、验证码输入框、
+签到按钮、打卡动态列表），不需要构建完整的DOM树。这里提供三种可替换的提取后端：
+
+- regex：预编译正则表达式直接在HTML源码中定位已知字段，速度最快，无额外依赖
+- lxml：基于 lxml 的C实现解析器，需要 pip install lxml
+- bs4：原有的 BeautifulSoup + html.parser 实现，兼容性最好
+
+默认的 auto 模式优先使用 regex 快速提取，结果不完整时自动回退到 bs4。
+所有后端返回相同结构的纯数据，不依赖 fnclub_signer 中的配置。
+"""
+
+import re
+from html import unescape
+
+# 页面中用到的链接特征
+LOGIN_LINK = 'member.php?mod=logging&action=login'
+LOGOUT_LINK = 'member.php?mod=logging&action=logout'
+USER_CENTER_LINK = 'home.php?mod=space'
+SIGN_INFO_TITLE = '我的打卡动态'
+
+_SECCODE_IMG_RE = re.compile(r'misc\.php\?mod=seccode')
+_SIGN_PARAM_RE = re.compile(r'sign=([^&]+)')
+
+
+def _pick_login_form(forms):
+    """从 (id, name, action) 列表中选出登录表单的下标，返回 (下标, 是否为备选表单)"""
+    for index, (form_id, form_name, form_action) in enumerate(forms):
+        if form_id and ('loginform' in form_id or 'lsform' in form_id):
+            return index, False
+        elif form_name == 'login':
+            return index, False
+        elif form_action and 'logging' in form_action:
+            return index, False
+    if forms:
+        # 尝试使用第一个表单，可能是登录表单
+        return 0, True
+    return None, False
+
+
+def _split_sign_info(items):
+    """将打卡动态列表项 "键：值" 解析为字典"""
+    sign_info = {}
+    for text in items:
+        if '：' in text:
+            key, value = text.split('：', 1)
+            sign_info[key] = value
+    return sign_info
+
+
+def _sign_param(sign_link):
+    if not sign_link:
+        return None
+    match = _SIGN_PARAM_RE.search(sign_link)
+    return match.group(1) if match else None
+
+
+class Bs4Extractor:
+    """BeautifulSoup + html.parser 后端"""
+
+    name = 'bs4'
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._soup_class = BeautifulSoup
+
+    def _soup(self, html):
+        return self._soup_class(html, 'html.parser')
+
+    def link_counts(self, html):
+        """返回 (登录链接数, 个人中心链接数, 退出链接数)"""
+        soup = self._soup(html)
+        return (
+            len(soup.select(f'a[href*="{LOGIN_LINK}"]')),
+            len(soup.select(f'a[href*="{USER_CENTER_LINK}"]')),
+            len(soup.select(f'a[href*="{LOGOUT_LINK}"]'))
+        )
+
+    def _seccode_input(self, soup):
+        seccodeverify = soup.find('input', {'name': 'seccodeverify'})
+        if not seccodeverify:
+            for inp in soup.find_all('input'):
+                if inp.get('id', '').startswith('seccodeverify_'):
+                    return inp
+        return seccodeverify
+
+    def login_form(self, html):
+        soup = self._soup(html)
+        forms = soup.find_all('form')
+        index, fallback = _pick_login_form([(f.get('id', ''), f.get('name'), f.get('action')) for f in forms])
+        if index is None:
+            return None
+        login_form = forms[index]
+
+        formhash_input = soup.find('input', {'name': 'formhash'})
+        username_input = soup.find('input', {'name': 'username'})
+        password_input = soup.find('input', {'name': 'password'})
+        seccodeverify = self._seccode_input(soup)
+        captcha_img = soup.find('img', {'src': _SECCODE_IMG_RE})
+        return {
+            'form_id': login_form.get('id', ''),
+            'form_action': login_form.get('action', ''),
+            'fallback': fallback,
+            'formhash': formhash_input.get('value', '') if formhash_input else None,
+            'username_id': username_input.get('id', '') if username_input else '',
+            'password_id': password_input.get('id', '') if password_input else '',
+            'seccode_input_id': seccodeverify.get('id', '') if seccodeverify else None,
+            'captcha_src': captcha_img['src'] if captcha_img else None
+        }
+
+    def captcha_page(self, html):
+        soup = self._soup(html)
+        seccodeverify = self._seccode_input(soup)
+        span_id = None
+        for span in soup.find_all('span'):
+            if span.get('id', '').startswith('seccode_'):
+                span_id = span['id']
+                break
+        captcha_img = soup.find('img', {'src': _SECCODE_IMG_RE})
+        formhash_input = soup.find('input', {'name': 'formhash'})
+        form = soup.find('form')
+        return {
+            'seccode_input_id': seccodeverify.get('id', '') if seccodeverify else None,
+            'seccode_span_id': span_id,
+            'captcha_src': captcha_img['src'] if captcha_img else None,
+            'formhash': formhash_input.get('value', '') if formhash_input else None,
+            'form_action': form.get('action', '') if form else ''
+        }
+
+    def sign_page(self, html):
+        """返回 (签到按钮文字, sign参数, 打卡动态字典)，未找到的字段为 None"""
+        soup = self._soup(html)
+        sign_text = sign_param = None
+        sign_btn = soup.select_one('.signbtn .btna')
+        if sign_btn:
+            sign_text = sign_btn.text.strip()
+            sign_param = _sign_param(sign_btn.get('href'))
+
+        sign_info = None
+        for div in soup.find_all('div', class_='bm'):
+            header = div.find('div', class_='bm_h')
+            if header and SIGN_INFO_TITLE in header.get_text():
+                info_body = div.find('div', class_='bm_c')
+                if info_body:
+                    sign_info = _split_sign_info(li.get_text(strip=True) for li in info_body.find_all('li'))
+                break
+        return sign_text, sign_param, sign_info
+
+
+class LxmlExtractor:
+    """lxml 后端"""
+
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        self._lxml_html = lxml.html
+        self._parser = lxml.html.HTMLParser(encoding='utf-8')
+
+    def _doc(self, html):
+        # 传入bytes避免带编码声明的页面在lxml中报错
+        return self._lxml_html.document_fromstring(html.encode('utf-8'), parser=self._parser)
+
+    @staticmethod
+    def _has_class(cls):
+        return f'contains(concat(" ", normalize-space(@class), " "), " {cls} ")'
+
+    def link_counts(self, html):
+        doc = self._doc(html)
+        return (
+            len(doc.xpath('//a[contains(@href, $link)]', link=LOGIN_LINK)),
+            len(doc.xpath('//a[contains(@href, $link)]', link=USER_CENTER_LINK)),
+            len(doc.xpath('//a[contains(@href, $link)]', link=LOGOUT_LINK))
+        )
+
+    def _first(self, doc, path):
+        result = doc.xpath(path)
+        return result[0] if result else None
+
+    def _seccode_input(self, doc):
+        seccodeverify = self._first(doc, '//input[@name="seccodeverify"]')
+        if seccodeverify is None:
+            seccodeverify = self._first(doc, '//input[starts-with(@id, "seccodeverify_")]')
+        return seccodeverify
+
+    def _captcha_src(self, doc):
+        for img in doc.xpath('//img[@src]'):
+            if _SECCODE_IMG_RE.search(img.get('src')):
+                return img.get('src')
+        return None
+
+    def login_form(self, html):
+        doc = self._doc(html)
+        forms = doc.xpath('//form')
+        index, fallback = _pick_login_form([(f.get('id', ''), f.get('name'), f.get('action')) for f in forms])
+        if index is None:
+            return None
+        login_form = forms[index]
+
+        formhash_input = self._first(doc, '//input[@name="formhash"]')
+        username_input = self._first(doc, '//input[@name="username"]')
+        password_input = self._first(doc, '//input[@name="password"]')
+        seccodeverify = self._seccode_input(doc)
+        return {
+            'form_id': login_form.get('id', ''),
+            'form_action': login_form.get('action', ''),
+            'fallback': fallback,
+            'formhash': formhash_input.get('value', '') if formhash_input is not None else None,
+            'username_id': username_input.get('id', '') if username_input is not None else '',
+            'password_id': password_input.get('id', '') if password_input is not None else '',
+            'seccode_input_id': seccodeverify.get('id', '') if seccodeverify is not None else None,
+            'captcha_src': self._captcha_src(doc)
+        }
+
+    def captcha_page(self, html):
+        doc = self._doc(html)
+        seccodeverify = self._seccode_input(doc)
+        span = self._first(doc, '//span[starts-with(@id, "seccode_")]')
+        formhash_input = self._first(doc, '//input[@name="formhash"]')
+        form = self._first(doc, '//form')
+        return {
+            'seccode_input_id': seccodeverify.get('id', '') if seccodeverify is not None else None,
+            'seccode_span_id': span.get('id') if span is not None else None,
+            'captcha_src': self._captcha_src(doc),
+            'formhash': formhash_input.get('value', '') if formhash_input is not None else None,
+            'form_action': form.get('action', '') if form is not None else ''
+        }
+
+    def sign_page(self, html):
+        doc = self._doc(html)
+        sign_text = sign_param = None
+        sign_btn = self._first(doc, f'//*[{self._has_class("signbtn")}]//*[{self._has_class("btna")}]')
+        if sign_btn is not None:
+            sign_text = sign_btn.text_content().strip()
+            sign_param = _sign_param(sign_btn.get('href'))
+
+        sign_info = None
+        for div in doc.xpath(f'//div[{self._has_class("bm")}]'):
+            header = self._first(div, f'.//div[{self._has_class("bm_h")}]')
+            if header is not None and SIGN_INFO_TITLE in header.text_content():
+                info_body = self._first(div, f'.//div[{self._has_class("bm_c")}]')
+                if info_body is not None:
+                    sign_info = _split_sign_info(
+                        ''.join(text.strip() for text in li.itertext()) for li in info_body.iter('li')
+                    )
+                break
+        return sign_text, sign_param, sign_info
+
+
+# 正则后端使用的预编译表达式
+_ATTRS = r'((?:\s+[^\s=>/"\']+(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'|[^\s>"\']+))?)*)\s*/?>'
+_ATTR_RE = re.compile(r'([^\s=>/"\']+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+)))?')
+_SCRIPT_RE = re.compile(r'<script\b.*?</script\s*>|<!--.*?-->', re.I | re.S)
+_TAG_SPLIT_RE = re.compile(r'<[^>]*>')
+_START_TAG_RE = {
+    tag: re.compile(r'<%s\b%s' % (tag, _ATTRS), re.I)
+    for tag in ('a', 'form', 'input', 'img', 'span', 'div', 'li')
+}
+_ANY_START_TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)\b' + _ATTRS)
+_CLASS_TAG_RE = {}
+_OPEN_CLOSE_RE = {}
+
+
+def _parse_attrs(attr_text):
+    attrs = {}
+    for match in _ATTR_RE.finditer(attr_text):
+        name = match.group(1).lower()
+        if name in attrs:
+            continue
+        value = match.group(2)
+        if value is None:
+            value = match.group(3)
+        if value is None:
+            value = match.group(4) or ''
+        attrs[name] = unescape(value)
+    return attrs
+
+
+def _class_tags(html, cls, start=0, end=None):
+    """查找 class 中包含指定类名的开始标签，依次返回 (标签名, 属性, 标签结束位置)"""
+    pattern = _CLASS_TAG_RE.get(cls)
+    if pattern is None:
+        pattern = re.compile(
+            r'<([a-zA-Z][a-zA-Z0-9]*)\s[^>]*?class\s*=\s*(["\'])(?:[^"\'>]*\s)?%s(?:\s[^"\'>]*)?\2' % re.escape(cls)
+        )
+        _CLASS_TAG_RE[cls] = pattern
+    end = len(html) if end is None else end
+    for match in pattern.finditer(html, start, end):
+        tag = _ANY_START_TAG_RE.match(html, match.start())
+        if tag:
+            yield tag.group(1).lower(), _parse_attrs(tag.group(2)), tag.end()
+
+
+def _inner_html(html, tag, start):
+    """从开始标签结束位置起按标签嵌套层级找到对应的结束标签，返回元素内部HTML"""
+    pattern = _OPEN_CLOSE_RE.get(tag)
+    if pattern is None:
+        pattern = re.compile(r'<(/?)%s\b[^>]*?(/?)>' % tag, re.I)
+        _OPEN_CLOSE_RE[tag] = pattern
+    depth = 1
+    for match in pattern.finditer(html, start):
+        if match.group(1):
+            depth -= 1
+            if depth == 0:
+                return html[start:match.start()]
+        elif not match.group(2):
+            depth += 1
+    return html[start:]
+
+
+def _text(fragment):
+    return unescape(_TAG_SPLIT_RE.sub('', fragment))
+
+
+def _stripped_text(fragment):
+    """与 BeautifulSoup get_text(strip=True) 一致：去掉每段文本两端空白后拼接"""
+    parts = (unescape(part).strip() for part in _TAG_SPLIT_RE.split(fragment))
+    return ''.join(part for part in parts if part)
+
+
+class RegexExtractor:
+    """预编译正则表达式后端，只定位已知字段，不构建DOM树"""
+
+    name = 'regex'
+
+    def _tags(self, html, tag):
+        for match in _START_TAG_RE[tag].finditer(html):
+            yield _parse_attrs(match.group(1))
+
+    def link_counts(self, html):
+        html = _SCRIPT_RE.sub('', html)
+        login_links = user_center_links = logout_links = 0
+        for attrs in self._tags(html, 'a'):
+            href = attrs.get('href')
+            if href is None:
+                continue
+            login_links += LOGIN_LINK in href
+            user_center_links += USER_CENTER_LINK in href
+            logout_links += LOGOUT_LINK in href
+        return login_links, user_center_links, logout_links
+
+    def _inputs(self, html):
+        """返回 (按name索引的第一个输入框, 验证码输入框)"""
+        by_name = {}
+        seccode_by_id = None
+        for attrs in self._tags(html, 'input'):
+            name = attrs.get('name')
+            if name and name not in by_name:
+                by_name[name] = attrs
+            if seccode_by_id is None and attrs.get('id', '').startswith('seccodeverify_'):
+                seccode_by_id = attrs
+        return by_name, by_name.get('seccodeverify') or seccode_by_id
+
+    def _captcha_src(self, html):
+        for attrs in self._tags(html, 'img'):
+            src = attrs.get('src')
+            if src and _SECCODE_IMG_RE.search(src):
+                return src
+        return None
+
+    def login_form(self, html):
+        html = _SCRIPT_RE.sub('', html)
+        forms = list(self._tags(html, 'form'))
+        index, fallback = _pick_login_form([(f.get('id', ''), f.get('name'), f.get('action')) for f in forms])
+        if index is None:
+            return None
+        login_form = forms[index]
+
+        by_name, seccodeverify = self._inputs(html)
+        formhash_input = by_name.get('formhash')
+        username_input = by_name.get('username')
+        password_input = by_name.get('password')
+        return {
+            'form_id': login_form.get('id', ''),
+            'form_action': login_form.get('action', ''),
+            'fallback': fallback,
+            'formhash': formhash_input.get('value', '') if formhash_input else None,
+            'username_id': username_input.get('id', '') if username_input else '',
+            'password_id': password_input.get('id', '') if password_input else '',
+            'seccode_input_id': seccodeverify.get('id', '') if seccodeverify else None,
+            'captcha_src': self._captcha_src(html)
+        }
+
+    def captcha_page(self, html):
+        html = _SCRIPT_RE.sub('', html)
+        by_name, seccodeverify = self._inputs(html)
+        span_id = None
+        for attrs in self._tags(html, 'span'):
+            if attrs.get('id', '').startswith('seccode_'):
+                span_id = attrs['id']
+                break
+        formhash_input = by_name.get('formhash')
+        form = next(self._tags(html, 'form'), None)
+        return {
+            'seccode_input_id': seccodeverify.get('id', '') if seccodeverify else None,
+            'seccode_span_id': span_id,
+            'captcha_src': self._captcha_src(html),
+            'formhash': formhash_input.get('value', '') if formhash_input else None,
+            'form_action': form.get('action', '') if form else ''
+        }
+
+    def sign_page(self, html):
+        html = _SCRIPT_RE.sub('', html)
+        sign_text = sign_param = None
+        for tag, _, tag_end in _class_tags(html, 'signbtn'):
+            container = _inner_html(html, tag, tag_end)
+            button = next(_class_tags(container, 'btna'), None)
+            if button:
+                btn_tag, btn_attrs, btn_end = button
+                sign_text = _text(_inner_html(container, btn_tag, btn_end)).strip()
+                sign_param = _sign_param(btn_attrs.get('href'))
+                break
+
+        sign_info = None
+        for tag, _, tag_end in _class_tags(html, 'bm'):
+            if tag != 'div':
+                continue
+            block = _inner_html(html, 'div', tag_end)
+            header = next((t for t in _class_tags(block, 'bm_h') if t[0] == 'div'), None)
+            if header and SIGN_INFO_TITLE in _text(_inner_html(block, 'div', header[2])):
+                body = next((t for t in _class_tags(block, 'bm_c') if t[0] == 'div'), None)
+                if body:
+                    info_html = _inner_html(block, 'div', body[2])
+                    items = []
+                    for match in _START_TAG_RE['li'].finditer(info_html):
+                        items.append(_stripped_text(_inner_html(info_html, 'li', match.end())))
+                    sign_info = _split_sign_info(items)
+                break
+        return sign_text, sign_param, sign_info
+
+
+class FallbackExtractor:
+    """优先使用快速后端，结果缺少关键字段时回退到兼容性更好的后端"""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f'{primary.name}+{fallback.name}'
+
+    def link_counts(self, html):
+        counts = self.primary.link_counts(html)
+        # 一个相关链接都没找到时可能是快速提取失败，交给完整解析器再确认一次
+        return counts if any(counts) else self.fallback.link_counts(html)
+
+    def login_form(self, html):
+        result = self.primary.login_form(html)
+        if result is None or result['formhash'] is None:
+            return self.fallback.login_form(html)
+        return result
+
+    def captcha_page(self, html):
+        result = self.primary.captcha_page(html)
+        if result['formhash'] is None:
+            return self.fallback.captcha_page(html)
+        return result
+
+    def sign_page(self, html):
+        result = self.primary.sign_page(html)
+        if result[0] is None or result[2] is None:
+            return self.fallback.sign_page(html)
+        return result
+
+
+EXTRACTORS = {
+    'regex': RegexExtractor,
+    'lxml': LxmlExtractor,
+    'bs4': Bs4Extractor,
+}
+
+_instances = {}
+
+
+def get_extractor(name='auto'):
+    """按名称获取提取后端实例（auto / regex / lxml / bs4），实例在进程内复用"""
+    name = (name or 'auto').lower()
+    extractor = _instances.get(name)
+    if extractor is None:
+        if name == 'auto':
+            extractor = FallbackExtractor(RegexExtractor(), Bs4Extractor())
+        elif name in EXTRACTORS:
+            extractor = EXTRACTORS[name]()
+        else:
+            raise ValueError(f"未知的页面提取后端: {name}，可选值: auto, {', '.join(EXTRACTORS)}")
+        _instances[name] = extractor
+    return extractor
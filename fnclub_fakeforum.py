@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""本地模拟论坛
+
+用 fixtures/ 中保存的 Discuz 页面模拟 FN 论坛，同时模拟百度OCR（access_token 和识别接口）
+和 IYUU 通知接口，不访问网络即可完整运行签到流程，用于复现问题、性能测试和压测：
+
+- 论坛：首页（登录/未登录）、登录页面（普通 / 内嵌验证码）、登录提交（成功、密码错误、
+  验证码错误、"请输入验证码后继续登录"跳转）、三种验证码页面（input、span seccode_、
+  updateseccode(...) 脚本）、验证码图片（用 Pillow 生成带干扰线和噪点的验证码内容）、
+  签到页面（签到前 / 签到后）和签到请求
+- 接口：/oauth/2.0/token、/rest/2.0/ocr/v1/general_basic（按行拆成多条结果，识别错误时少一个字符）、
+  /rest/2.0/ocr/v1/accurate_basic、/<token>.send
+- 可以设置每个请求的延迟和随机抖动、HTTP 503 错误率、OCR 识别错误率，并按接口统计请求数
+
+论坛和接口分别监听一个端口，签到脚本通过 FORUM_BASE_URL / BAIDU_API_BASE_URL / IYUU_BASE_URL
+环境变量（或 Config.set_hosts()）指向它们。本模块不依赖 fnclub_signer 中的配置。
+
+示例：
+    # 启动模拟论坛（验证码跳转 + span 验证码页面，每个请求延迟 50ms，1% 的请求返回 503）
+    python fnclub_fakeforum.py --port 8080 --api-port 8081 --captcha-variant span --latency 0.05 --error-rate 0.01
+    # 另一个终端中按输出的环境变量运行签到脚本
+    FORUM_BASE_URL=http://127.0.0.1:8080 BAIDU_API_BASE_URL=http://127.0.0.1:8081 python fnclub_signer.py
+
+    # 在代码中使用
+    with FakeForum(latency=0.02) as forum:
+        Config.set_hosts(forum.forum_url, forum.api_url, forum.api_url)
+        ...
+        print(forum.stats())
+"""
+
+import io
+import os
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+import urllib.parse
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 登录方式：redirect（提交后跳转到验证码页面）/ inline（登录页面内嵌验证码）/ none（不需要验证码）
+LOGIN_MODES = ('redirect', 'inline', 'none')
+# 验证码页面变体，对应 fixtures/captcha_page_<变体>.html
+CAPTCHA_VARIANTS = ('input', 'span', 'script')
+
+# 1x1 像素的 GIF，未安装 Pillow 时作为验证码图片返回
+CAPTCHA_IMAGE = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+                 b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+def render_captcha(code, seed=0, size=(100, 40), lines=3, dots=60):
+    """生成与 Discuz 验证码相似的 GIF：浅色背景上的深色字符，加干扰线和噪点；未安装 Pillow 时返回 1x1 的 GIF"""
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        return CAPTCHA_IMAGE
+    try:
+        font = ImageFont.load_default(size=24)
+    except TypeError:
+        # Pillow 10.1 之前的默认字体不能指定大小
+        font = ImageFont.load_default()
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new('L', size, 230)
+    draw = ImageDraw.Draw(image)
+    step = (width - 16) // max(len(code), 1)
+    for index, char in enumerate(code):
+        draw.text((8 + index * step, rng.randint(2, 8)), char, fill=rng.randint(20, 80), font=font)
+    for _ in range(lines):
+        draw.line([(0, rng.randint(0, height - 1)), (width - 1, rng.randint(0, height - 1))], fill=rng.randint(40, 120), width=1)
+    for _ in range(dots):
+        draw.point((rng.randint(0, width - 1), rng.randint(0, height - 1)), fill=rng.randint(0, 120))
+    buffer = io.BytesIO()
+    image.save(buffer, format='GIF')
+    return buffer.getvalue()
+
+
+HTML = 'text/html; charset=utf-8'
+XML = 'text/xml; charset=utf-8'
+JSON = 'application/json'
+
+
+class FakeForum:
+    """模拟论坛和百度OCR / IYUU 接口的本地HTTP服务"""
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, login_mode='redirect', captcha_variant='input',
+                 password=None, captcha_code='K7MQ', latency=0.0, jitter=0.0, ocr_latency=0.0,
+                 error_rate=0.0, captcha_error_rate=0.0, seed=None):
+        if login_mode not in LOGIN_MODES:
+            raise ValueError(f"未知的登录方式: {login_mode}，可选: {', '.join(LOGIN_MODES)}")
+        if captcha_variant not in CAPTCHA_VARIANTS:
+            raise ValueError(f"未知的验证码页面: {captcha_variant}，可选: {', '.join(CAPTCHA_VARIANTS)}")
+        self.fixtures = {}
+        for name in os.listdir(fixture_dir):
+            with open(os.path.join(fixture_dir, name), 'rb') as f:
+                self.fixtures[name] = f.read()
+        self.login_mode = login_mode
+        self.captcha_variant = captcha_variant
+        # 为 None 时接受任意密码
+        self.password = password
+        self.captcha_code = captcha_code
+        # 验证码图片内容与 OCR 接口返回的识别结果一致
+        self.captcha_image = render_captcha(captcha_code, seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.ocr_latency = ocr_latency
+        self.error_rate = error_rate
+        self.captcha_error_rate = captcha_error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._signed = set()
+        self._counts = Counter()
+        self._servers = []
+
+    # ---------- 状态 ----------
+
+    def _chance(self, rate):
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _delay(self, base):
+        with self._lock:
+            delay = base + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def count(self, endpoint):
+        with self._lock:
+            self._counts[endpoint] += 1
+
+    def stats(self):
+        """各接口的请求数 {接口: 次数}"""
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self, signed=True, sessions=False):
+        """清空请求统计；可选清空已签到账号（模拟新的一天）和登录会话（模拟会话失效）"""
+        with self._lock:
+            self._counts.clear()
+            if signed:
+                self._signed.clear()
+            if sessions:
+                self._sessions.clear()
+
+    def login_user(self, username):
+        token = secrets.token_hex(8)
+        with self._lock:
+            self._sessions[token] = username
+        return token
+
+    def session_user(self, cookie_header):
+        cookies = {}
+        for part in (cookie_header or '').split(';'):
+            key, _, value = part.strip().partition('=')
+            cookies[key] = value
+        with self._lock:
+            return self._sessions.get(cookies.get('fake_auth'))
+
+    def sign(self, username):
+        with self._lock:
+            self._signed.add(username)
+
+    def is_signed(self, username):
+        with self._lock:
+            return username in self._signed
+
+    # ---------- 服务 ----------
+
+    def start(self, host='127.0.0.1', port=0, api_port=0):
+        """在后台线程中启动论坛和接口服务，端口为 0 时自动分配"""
+        for handler, server_port in ((ForumHandler, port), (ApiHandler, api_port)):
+            server = ThreadingHTTPServer((host, server_port), handler)
+            server.daemon_threads = True
+            server.forum = self
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self):
+        return self.start() if not self._servers else self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def _url(server):
+        host, port = server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def forum_url(self):
+        return self._url(self._servers[0]) + '/'
+
+    @property
+    def api_url(self):
+        return self._url(self._servers[1])
+
+    def environ(self):
+        """让签到脚本使用本模拟服务的环境变量"""
+        return {
+            'FORUM_BASE_URL': self.forum_url,
+            'BAIDU_API_BASE_URL': self.api_url,
+            'IYUU_BASE_URL': self.api_url,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体一次写出，避免 Nagle 算法与延迟确认叠加出约 40ms 的额外延迟
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    @property
+    def forum(self):
+        return self.server.forum
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body, content_type=HTML, status=200, headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def fixture(self, name, content_type=HTML, headers=None):
+        self.reply(self.forum.fixtures[name], content_type, headers=headers)
+
+    def not_found(self):
+        self.forum.count('not_found')
+        self.reply(b'', status=404)
+
+    def read_form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return {key: values[0] for key, values in urllib.parse.parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+
+    def inject(self, latency):
+        """按配置延迟响应；命中错误率时返回 503 并返回 True"""
+        self.forum._delay(latency)
+        if self.forum._chance(self.forum.error_rate):
+            self.forum.count('injected_error')
+            self.reply(b'', status=503, headers={'Retry-After': '0'})
+            return True
+        return False
+
+
+class ForumHandler(_Handler):
+    """模拟 Discuz 论坛页面"""
+
+    def do_GET(self):
+        if self.inject(self.forum.latency):
+            return
+        url = urllib.parse.urlsplit(self.path)
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        user = self.forum.session_user(self.headers.get('Cookie'))
+
+        if url.path in ('/', '/forum.php'):
+            self.forum.count('home')
+            return self.fixture('home_logged_in.html' if user else 'home_logged_out.html')
+        if url.path == '/member.php' and query.get('mod') == 'logging':
+            if 'auth' in query:
+                self.forum.count('captcha_page')
+                return self.fixture(f'captcha_page_{self.forum.captcha_variant}.html')
+            self.forum.count('login_page')
+            return self.fixture('login_page_seccode.html' if self.forum.login_mode == 'inline' else 'login_page.html')
+        if url.path == '/misc.php' and query.get('mod') == 'seccode':
+            self.forum.count('captcha_image')
+            return self.reply(self.forum.captcha_image, 'image/gif')
+        if url.path == '/plugin.php' and query.get('id') == 'zqlj_sign':
+            if not user:
+                self.forum.count('sign_page')
+                return self.fixture('home_logged_out.html')
+            if 'sign' in query:
+                self.forum.count('sign')
+                self.forum.sign(user)
+            else:
+                self.forum.count('sign_page')
+            return self.fixture('sign_page_signed.html' if self.forum.is_signed(user) else 'sign_page_unsigned.html')
+        self.not_found()
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path != '/member.php' or query.get('mod') != 'logging':
+            return self.not_found()
+        form = self.read_form()
+        if self.inject(self.forum.latency):
+            return
+        self.forum.count('login')
+
+        captcha = form.get('seccodeverify')
+        if self.forum.login_mode == 'redirect' and captcha is None:
+            return self.fixture('login_captcha_redirect.xml', XML)
+        if self.forum.login_mode != 'none' and (captcha or '').upper() != self.forum.captcha_code.upper():
+            return self.fixture('login_captcha_wrong.xml', XML)
+        if self.forum.password is not None and form.get('password') != self.forum.password:
+            return self.fixture('login_password_wrong.xml', XML)
+        token = self.forum.login_user(form.get('username', ''))
+        self.fixture('login_success.xml', XML, headers={'Set-Cookie': f'fake_auth={token}; Path=/; HttpOnly'})
+
+
+class ApiHandler(_Handler):
+    """模拟百度OCR和IYUU接口"""
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        self.read_form()
+        if self.inject(self.forum.ocr_latency):
+            return
+        if url.path == '/oauth/2.0/token':
+            self.forum.count('token')
+            return self.reply(json.dumps({'access_token': 'fake-access-token', 'expires_in': 2592000}), JSON)
+        if url.path == '/rest/2.0/ocr/v1/accurate_basic':
+            self.forum.count('ocr')
+            words = self.forum.captcha_code
+            if self.forum._chance(self.forum.captcha_error_rate):
+                words = words[::-1] if words[::-1] != words else words + 'X'
+            # 百度OCR常在字符之间识别出空格
+            return self.reply(json.dumps({'words_result': [{'words': ' '.join(words)}], 'words_result_num': 1}), JSON)
+        if url.path == '/rest/2.0/ocr/v1/general_basic':
+            self.forum.count('ocr_general')
+            words = self.forum.captcha_code
+            if self.forum._chance(self.forum.captcha_error_rate):
+                words = words[:-1]
+            # 通用文字识别常把间距较大的字符拆成多行
+            half = len(words) // 2
+            lines = [{'words': line} for line in (words[:half], words[half:]) if line]
+            return self.reply(json.dumps({'words_result': lines, 'words_result_num': len(lines)}), JSON)
+        if url.path.endswith('.send'):
+            self.forum.count('iyuu')
+            return self.reply(json.dumps({'errcode': 0, 'errmsg': 'ok'}), JSON)
+        self.not_found()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FN论坛本地模拟服务（论坛 + 百度OCR + IYUU）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8080, help='论坛端口')
+    parser.add_argument('--api-port', type=int, default=8081, help='百度OCR / IYUU 接口端口')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help='论坛页面目录')
+    parser.add_argument('--login-mode', choices=LOGIN_MODES, default='redirect', help='登录时的验证码方式')
+    parser.add_argument('--captcha-variant', choices=CAPTCHA_VARIANTS, default='input', help='验证码页面变体')
+    parser.add_argument('--password', help='只接受该密码（默认接受任意密码）')
+    parser.add_argument('--captcha-code', default='K7MQ', help='验证码内容（模拟OCR返回该内容）')
+    parser.add_argument('--latency', type=float, default=0.0, help='论坛每个请求的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='每个请求额外的随机延迟上限（秒）')
+    parser.add_argument('--ocr-latency', type=float, default=0.0, help='OCR / IYUU 接口每个请求的延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 HTTP 503 的请求比例')
+    parser.add_argument('--captcha-error-rate', type=float, default=0.0, help='OCR 返回错误验证码的比例')
+    parser.add_argument('--seed', type=int, help='随机数种子，便于复现')
+    args = parser.parse_args()
+
+    forum = FakeForum(args.fixtures, args.login_mode, args.captcha_variant, args.password, args.captcha_code,
+                      args.latency, args.jitter, args.ocr_latency, args.error_rate, args.captcha_error_rate, args.seed)
+    forum.start(args.host, args.port, args.api_port)
+    print(f"模拟论坛: {forum.forum_url}    模拟接口: {forum.api_url}")
+    print("运行签到脚本前设置以下环境变量：")
+    for key, value in forum.environ().items():
+        print(f"  export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"请求统计: {forum.stats()}")
+        forum.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""签到历史
+
+每次运行签到流程（成功或失败）都在 SQLite 历史库中追加一行，按 (账号, 论坛日期) 建索引，
+并把签到信息中的数字字段（本月打卡、连续打卡、累计打卡、累计奖励等）解析成整数列，
+统计全部在 SQLite 中用 GROUP BY / 窗口函数完成，上千个账号·天的记录也能很快查询。
+本模块不依赖 fnclub_signer 中的配置。
+
+子命令：
+- rates：每个账号的运行次数、成功率、签到天数和最近一次的连续打卡天数
+- monthly：每个账号每月的签到天数、失败天数和获得的奖励
+- breaks：连续打卡中断的位置（论坛报告的连续天数没有按天数增长，或中间有未签到的日期）
+
+示例：
+    python fnclub_history.py rates
+    python fnclub_history.py monthly --account user1 --since 2026-01-01
+    python fnclub_history.py breaks --db history.db
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+DEFAULT_DB = os.environ.get('HISTORY_DB', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.db')
+
+# 签到信息中需要解析成整数的字段 -> 历史库列名
+NUMERIC_FIELDS = {
+    '本月打卡': 'month_days',
+    '连续打卡': 'streak',
+    '累计打卡': 'total_days',
+    '累计奖励': 'total_reward',
+    '最近奖励': 'last_reward',
+}
+
+_NUMBER_RE = re.compile(r'-?\d+')
+
+
+def parse_sign_info(sign_info):
+    """把签到信息字典解析成历史库的列，缺少或无法解析的字段为 None"""
+    sign_info = sign_info or {}
+    columns = {'last_sign_at': sign_info.get('最近打卡'), 'level': sign_info.get('当前打卡等级')}
+    for key, column in NUMERIC_FIELDS.items():
+        match = _NUMBER_RE.search(sign_info.get(key) or '')
+        columns[column] = int(match.group()) if match else None
+    return columns
+
+
+class SignHistory:
+    """签到历史库：每次运行一行，数字字段单独成列以便统计"""
+
+    COLUMNS = ('day', 'account', 'run_at', 'success', 'status', 'last_sign_at', 'month_days', 'streak',
+               'total_days', 'total_reward', 'last_reward', 'level', 'sign_info')
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_DB
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS history ('
+                        'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'day TEXT NOT NULL, '
+                        'account TEXT NOT NULL, '
+                        'run_at REAL NOT NULL, '
+                        'success INTEGER NOT NULL, '
+                        'status TEXT, '
+                        'last_sign_at TEXT, '
+                        'month_days INTEGER, '
+                        'streak INTEGER, '
+                        'total_days INTEGER, '
+                        'total_reward INTEGER, '
+                        'last_reward INTEGER, '
+                        'level TEXT, '
+                        'sign_info TEXT)'
+                    )
+                    conn.execute('CREATE INDEX IF NOT EXISTS history_account_day ON history (account, day)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS history_day ON history (day)')
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def _row(self, day, account, success, status, sign_info, run_at=None):
+        columns = parse_sign_info(sign_info)
+        return (day, account, run_at or time.time(), int(bool(success)), status, columns['last_sign_at'],
+                columns['month_days'], columns['streak'], columns['total_days'], columns['total_reward'],
+                columns['last_reward'], columns['level'], json.dumps(sign_info or {}, ensure_ascii=False))
+
+    def record(self, day, account, success, status, sign_info=None):
+        """追加一次运行结果"""
+        self.record_many([(day, account, success, status, sign_info)])
+
+    def record_many(self, runs):
+        """批量追加运行结果 [(day, account, success, status, sign_info), ...]，在一个事务中写入"""
+        rows = [self._row(*run) for run in runs]
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO history ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    rows
+                )
+        finally:
+            conn.close()
+
+    def _query(self, sql, account=None, since=None, until=None):
+        """执行统计查询，sql 中的 {where} 替换为账号和日期范围过滤条件"""
+        conditions, params = [], []
+        if account:
+            conditions.append('account = ?')
+            params.append(account)
+        if since:
+            conditions.append('day >= ?')
+            params.append(since)
+        if until:
+            conditions.append('day <= ?')
+            params.append(until)
+        where = ' AND '.join(conditions) or '1'
+        conn = self._connect()
+        try:
+            return conn.execute(sql.format(where=where), params).fetchall()
+        finally:
+            conn.close()
+
+    def success_rates(self, account=None, since=None, until=None):
+        """每个账号：(账号, 运行次数, 成功次数, 记录天数, 签到成功天数, 首日, 末日, 最近的连续打卡天数)"""
+        return self._query(
+            'WITH runs AS ('
+            'SELECT account, day, success, streak, ROW_NUMBER() OVER ('
+            'PARTITION BY account ORDER BY streak IS NULL, day DESC, run_at DESC) AS latest '
+            'FROM history WHERE {where}) '
+            'SELECT account, COUNT(*), SUM(success), COUNT(DISTINCT day), '
+            'COUNT(DISTINCT CASE WHEN success THEN day END), MIN(day), MAX(day), '
+            'MAX(CASE WHEN latest = 1 THEN streak END) '
+            'FROM runs GROUP BY account ORDER BY account',
+            account, since, until
+        )
+
+    def monthly_totals(self, account=None, since=None, until=None):
+        """每个账号每月：(账号, 月份, 签到成功天数, 只有失败记录的天数, 论坛报告的本月打卡天数, 期间获得的奖励)
+
+        奖励按当月记录到的累计奖励最大值减最小值估算，当月只有一条记录时为 0。
+        """
+        return self._query(
+            'WITH daily AS ('
+            'SELECT account, day, MAX(success) AS ok, MAX(month_days) AS month_days, '
+            'MIN(total_reward) AS reward_min, MAX(total_reward) AS reward_max '
+            'FROM history WHERE {where} GROUP BY account, day) '
+            'SELECT account, substr(day, 1, 7) AS month, SUM(ok), SUM(1 - ok), MAX(month_days), '
+            'COALESCE(MAX(reward_max) - MIN(reward_min), 0) '
+            'FROM daily GROUP BY account, month ORDER BY account, month',
+            account, since, until
+        )
+
+    def streak_breaks(self, account=None, since=None, until=None):
+        """连续打卡中断：(账号, 上次签到日期, 本次签到日期, 间隔天数, 上次连续天数, 本次连续天数)
+
+        两次签到成功之间论坛报告的连续天数增长少于间隔天数时视为中断；没有连续天数时按日期是否相邻判断。
+        """
+        return self._query(
+            'WITH daily AS ('
+            'SELECT account, day, MAX(streak) AS streak FROM history '
+            'WHERE success = 1 AND {where} GROUP BY account, day), '
+            'seq AS ('
+            'SELECT account, day, streak, '
+            'LAG(day) OVER w AS prev_day, LAG(streak) OVER w AS prev_streak '
+            'FROM daily WINDOW w AS (PARTITION BY account ORDER BY day)), '
+            'gaps AS ('
+            'SELECT account, prev_day, day, CAST(julianday(day) - julianday(prev_day) AS INTEGER) AS gap, '
+            'prev_streak, streak FROM seq WHERE prev_day IS NOT NULL) '
+            'SELECT * FROM gaps WHERE CASE WHEN streak IS NOT NULL AND prev_streak IS NOT NULL '
+            'THEN streak < prev_streak + gap ELSE gap > 1 END '
+            'ORDER BY account, day',
+            account, since, until
+        )
+
+
+def print_rates(history, args):
+    rows = history.success_rates(args.account, args.since, args.until)
+    if not rows:
+        print("签到历史中没有记录")
+        return False
+    print(f"{'账号':<20}{'运行次数':>8}{'成功率':>8}{'签到天数':>10}{'日期范围':>26}{'连续打卡':>8}")
+    for account, runs, successes, days, signed_days, first_day, last_day, streak in rows:
+        print(f"{account:<20}{runs:>10}{successes / runs * 100:>9.1f}%{signed_days:>6}/{days:<5}"
+              f"{first_day:>13} ~ {last_day:<10}{streak if streak is not None else '-':>8}")
+    return True
+
+
+def print_monthly(history, args):
+    rows = history.monthly_totals(args.account, args.since, args.until)
+    if not rows:
+        print("签到历史中没有记录")
+        return False
+    print(f"{'账号':<20}{'月份':>8}{'签到天数':>8}{'失败天数':>8}{'论坛本月打卡':>10}{'获得奖励':>8}")
+    for account, month, signed_days, failed_days, month_days, reward in rows:
+        print(f"{account:<20}{month:>10}{signed_days:>12}{failed_days:>12}"
+              f"{month_days if month_days is not None else '-':>16}{reward:>12}")
+    return True
+
+
+def print_breaks(history, args):
+    rows = history.streak_breaks(args.account, args.since, args.until)
+    if not rows:
+        print("没有发现连续打卡中断")
+        return True
+    print(f"{'账号':<20}{'上次签到':>12}{'本次签到':>12}{'间隔天数':>8}{'连续打卡变化':>12}")
+    for account, prev_day, day, gap, prev_streak, streak in rows:
+        change = f"{prev_streak} -> {streak}" if prev_streak is not None and streak is not None else '-'
+        print(f"{account:<20}{prev_day:>16}{day:>14}{gap:>12}{change:>18}")
+    print(f"共 {len(rows)} 次中断")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FN论坛签到历史统计')
+    parser.add_argument('--db', default=DEFAULT_DB, help='签到历史库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, func, help_text in (
+        ('rates', print_rates, '每个账号的成功率和签到天数'),
+        ('monthly', print_monthly, '每个账号每月的签到天数和奖励'),
+        ('breaks', print_breaks, '连续打卡中断的位置'),
+    ):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--account', help='只统计指定账号')
+        sub.add_argument('--since', help='起始日期（YYYY-MM-DD，含）')
+        sub.add_argument('--until', help='结束日期（YYYY-MM-DD，含）')
+        sub.set_defaults(func=func)
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        print(f"签到历史库不存在: {args.db}")
+        return 1
+    return 0 if args.func(SignHistory(args.db), args) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
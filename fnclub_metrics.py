@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""签到流程耗时统计与 Prometheus 指标导出
+
+签到流程的每个步骤（检查登录、登录、验证码识别、获取 access_token、检查签到状态、
+签到、获取签到信息、发送通知）通过 traced / step_timer 计时，按步骤和结果记录到
+进程内的 REGISTRY 中，可以：
+
+- write_textfile()：写成 Prometheus 文本格式文件，供 node_exporter 的 textfile collector 采集
+- start_http_exporter()：在后台线程提供 /metrics HTTP 接口
+- step_summary()：批量签到结束时输出各步骤的次数、成功率和 p50/p95 耗时
+
+本模块不依赖 fnclub_signer 中的配置。
+"""
+
+import os
+import time
+import inspect
+import functools
+import threading
+import contextlib
+
+# 直方图分桶（秒），覆盖从本地页面解析到慢速OCR请求的范围
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    'fnclub_step_duration_seconds': ('histogram', '签到流程各步骤耗时（按步骤和结果）'),
+    'fnclub_http_request_duration_seconds': ('histogram', '论坛HTTP请求耗时（按步骤和状态码）'),
+    'fnclub_retries_total': ('counter', '各步骤重试次数（按步骤和错误类型）'),
+    'fnclub_circuit_open_total': ('counter', '熔断次数（按主机）'),
+    'fnclub_rate_limit_wait_seconds_total': ('counter', '限速等待总时长（秒，按主机）'),
+    'fnclub_notifications_total': ('counter', '通知发送次数（按渠道和结果）'),
+}
+
+# 保留用于计算分位数的原始耗时样本数上限（每个标签组合）
+MAX_SAMPLES = 10000
+
+
+class MetricsRegistry:
+    """线程安全的直方图和计数器集合"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, labels, value):
+        """记录一次耗时（秒）"""
+        key = self._key(name, labels)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0, 'samples': []}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+            if len(series['samples']) < MAX_SAMPLES:
+                series['samples'].append(value)
+
+    def inc(self, name, labels, amount=1):
+        """计数器加一"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            if metric_type == 'histogram':
+                for (series_name, labels), series in sorted(histograms.items()):
+                    if series_name != name:
+                        continue
+                    for bound, count in zip(self.buckets, series['buckets']):
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_float(bound)),))} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {series["count"]}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {series["sum"]:.6f}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {series["count"]}')
+            else:
+                for (series_name, labels), value in sorted(counters.items()):
+                    if series_name == name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def step_summary(self, name='fnclub_step_duration_seconds'):
+        """按步骤汇总：[(步骤, 次数, 成功次数, p50秒, p95秒, 最大秒), ...]，按总耗时从高到低排列"""
+        with self._lock:
+            by_step = {}
+            for (series_name, labels), series in self._histograms.items():
+                if series_name != name:
+                    continue
+                labels = dict(labels)
+                entry = by_step.setdefault(labels.get('step', ''), {'count': 0, 'ok': 0, 'samples': [], 'sum': 0.0})
+                entry['count'] += series['count']
+                entry['sum'] += series['sum']
+                entry['samples'].extend(series['samples'])
+                if labels.get('outcome') == 'ok':
+                    entry['ok'] += series['count']
+
+        rows = []
+        for step, entry in sorted(by_step.items(), key=lambda item: -item[1]['sum']):
+            samples = sorted(entry['samples'])
+            rows.append((step, entry['count'], entry['ok'], _percentile(samples, 50), _percentile(samples, 95), samples[-1] if samples else 0.0))
+        return rows
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))]
+
+
+def _format_float(value):
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = ','.join(f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in labels)
+    return '{' + escaped + '}'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def outcome_of(result):
+    """根据步骤返回值判断结果：返回值为假或 (None, ...) 视为失败"""
+    if isinstance(result, tuple):
+        return 'ok' if result and result[0] is not None else 'fail'
+    return 'ok' if result else 'fail'
+
+
+class Span:
+    """一次步骤计时，可在步骤内修改 outcome"""
+
+    def __init__(self, step):
+        self.step = step
+        self.outcome = 'ok'
+        self.elapsed = 0.0
+
+
+def _finish(span, log, start_time, labels=None):
+    span.elapsed = time.perf_counter() - start_time
+    REGISTRY.observe('fnclub_step_duration_seconds', dict(labels or {}, step=span.step, outcome=span.outcome), span.elapsed)
+    if log is not None:
+        latency_ms = round(span.elapsed * 1000, 1)
+        log.debug(f"{span.step}: {span.outcome}，{latency_ms:.0f}ms",
+                  extra={'step': span.step, 'outcome': span.outcome, 'latency_ms': latency_ms})
+
+
+@contextlib.contextmanager
+def step_timer(step, log=None, **labels):
+    """步骤计时上下文：正常结束记为 ok，抛出异常记为 error，也可以在步骤内设置 span.outcome；labels 为额外的指标标签"""
+    span = Span(step)
+    start_time = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span.outcome = 'error'
+        raise
+    finally:
+        _finish(span, log, start_time, labels)
+
+
+def traced(step, outcome=outcome_of):
+    """方法计时装饰器（同步方法和协程均可），结果由返回值判断；日志写入实例的 self.logger"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                span = Span(step)
+                start_time = time.perf_counter()
+                try:
+                    result = await func(self, *args, **kwargs)
+                    span.outcome = outcome(result)
+                    return result
+                except BaseException:
+                    span.outcome = 'error'
+                    raise
+                finally:
+                    _finish(span, getattr(self, 'logger', None), start_time)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            span = Span(step)
+            start_time = time.perf_counter()
+            try:
+                result = func(self, *args, **kwargs)
+                span.outcome = outcome(result)
+                return result
+            except BaseException:
+                span.outcome = 'error'
+                raise
+            finally:
+                _finish(span, getattr(self, 'logger', None), start_time)
+        return wrapper
+    return decorator
+
+
+def write_textfile(path, registry=REGISTRY):
+    """原子地写出 Prometheus 文本格式文件（node_exporter textfile collector 要求以 .prom 结尾）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+def start_http_exporter(port, address='', registry=REGISTRY):
+    """在后台线程启动 /metrics HTTP 接口，返回 server 对象"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True).start()
+    return server
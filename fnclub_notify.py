@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""通知分发
+
+签到流程只把通知放入队列，由后台线程发送，通知服务再慢也不会拖慢签到：
+
+- 支持多个通知渠道（IYUU、通用 Webhook、SMTP 邮件），都实现 send(title, content)，
+  失败时抛出异常；每个渠道有自己的队列和发送线程，一个渠道卡住不影响其他渠道
+- 批量签到期间（with dispatcher.batch():）各账号的通知先缓存，批次结束时合并成摘要，
+  每 digest_size 个账号一条，几百个账号不会发出几百条推送
+- 发送失败按 RetryPolicy 在后台重试；进程退出前等待队列发送完成（最多 flush_timeout 秒）
+
+requests、smtplib 等在发送线程第一次发送时才导入。本模块不依赖 fnclub_signer 中的配置。
+"""
+
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+from fnclub_metrics import REGISTRY, step_timer
+from fnclub_retry import Retrier, StepFailed, check_status, BAD_RESPONSE
+
+# 队列结束标记
+_STOP = object()
+
+
+class IyuuChannel:
+    """IYUU 微信通知（url 为 https://iyuu.cn/<token>.send）"""
+
+    name = 'iyuu'
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, content):
+        import requests
+
+        response = requests.post(self.url, data={'text': title, 'desp': content}, timeout=self.timeout,
+                                 headers={'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'})
+        check_status(response.status_code, "IYUU 通知发送失败", response.headers.get('Retry-After'))
+        if response.status_code != 200:
+            raise StepFailed(BAD_RESPONSE, f"IYUU 通知发送失败，状态码: {response.status_code}")
+        result = response.json()
+        if result.get('errcode') != 0:
+            raise StepFailed(BAD_RESPONSE, f"IYUU 通知发送失败: {result.get('errmsg', '未知错误')}")
+        return True
+
+
+class WebhookChannel:
+    """通用 Webhook：POST JSON {"title": ..., "content": ...}，2xx 视为成功"""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, content):
+        import requests
+
+        response = requests.post(self.url, json={'title': title, 'content': content}, timeout=self.timeout)
+        check_status(response.status_code, "Webhook 通知发送失败", response.headers.get('Retry-After'))
+        if not 200 <= response.status_code < 300:
+            raise StepFailed(BAD_RESPONSE, f"Webhook 通知发送失败，状态码: {response.status_code}")
+        return True
+
+
+class SmtpChannel:
+    """SMTP 邮件（通常发往本机的邮件中继，不需要认证）"""
+
+    name = 'smtp'
+
+    def __init__(self, host, port, sender, recipients, username='', password='', starttls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, title, content):
+        import smtplib
+        from email.header import Header
+        from email.mime.text import MIMEText
+
+        message = MIMEText(content, 'plain', 'utf-8')
+        message['Subject'] = Header(title, 'utf-8')
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.sendmail(self.sender, self.recipients, message.as_string())
+        return True
+
+
+def build_digests(messages, digest_size=0):
+    """把批次内各账号的通知 [(账号, 标题, 内容, 是否成功), ...] 合并成摘要 [(标题, 内容), ...]
+
+    digest_size <= 0 时整个批次合并成一条，否则每 digest_size 个账号一条。
+    """
+    if not messages:
+        return []
+    size = digest_size if digest_size > 0 else len(messages)
+    groups = [messages[i:i + size] for i in range(0, len(messages), size)]
+    success_count = sum(1 for message in messages if message[3])
+    digests = []
+    for index, group in enumerate(groups, 1):
+        title = f"FN论坛签到汇总：成功 {success_count}/{len(messages)}"
+        if len(groups) > 1:
+            title += f"（第 {index}/{len(groups)} 条）"
+        sections = [f"[{account or '默认账号'}] {'✓' if success else '✗'} {message_title}\n{content}"
+                    for account, message_title, content, success in group]
+        digests.append((title, '\n\n'.join(sections)))
+    return digests
+
+
+class NotificationDispatcher:
+    """通知分发器：submit() 只入队，后台线程按渠道发送并重试"""
+
+    def __init__(self, channels, policy, log, digest_size=0, flush_timeout=60):
+        self.channels = list(channels)
+        self.policy = policy
+        self.log = log
+        self.digest_size = digest_size
+        self.flush_timeout = flush_timeout
+        self._lock = threading.Lock()
+        self._batch_depth = 0
+        self._pending = []
+        self._queues = {}
+        self._threads = []
+        self._closed = False
+        for channel in self.channels:
+            channel_queue = self._queues[channel.name] = queue.Queue()
+            thread = threading.Thread(target=self._worker, args=(channel, channel_queue),
+                                      name=f'notify-{channel.name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def enabled(self):
+        return bool(self.channels)
+
+    def _enqueue(self, title, content):
+        if self._closed:
+            self.log.warning(f"通知分发器已关闭，丢弃通知: {title}")
+            return
+        for channel_queue in self._queues.values():
+            channel_queue.put((title, content))
+
+    def submit(self, title, content, account='', success=False):
+        """提交一条通知：批次进行中时缓存等待合并，否则直接放入发送队列"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._batch_depth:
+                self._pending.append((account, title, content, success))
+                return True
+        self._enqueue(title, content)
+        return True
+
+    @contextmanager
+    def batch(self):
+        """批次内提交的通知在批次结束时合并成摘要发送（可以嵌套，最外层结束时发送）"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                messages = self._pending if not self._batch_depth else []
+                if not self._batch_depth:
+                    self._pending = []
+            for title, content in build_digests(messages, self.digest_size):
+                self._enqueue(title, content)
+
+    def _worker(self, channel, channel_queue):
+        retrier = Retrier(self.policy, self.log)
+
+        def send(title, content):
+            # 每次发送（包括重试）单独计时，按渠道记录到 send_notification 步骤
+            with step_timer('send_notification', channel=channel.name):
+                return channel.send(title, content)
+
+        while True:
+            item = channel_queue.get()
+            try:
+                if item is _STOP:
+                    return
+                title, content = item
+                retrier.start()
+                sent = retrier.call('notify', f"{channel.name} 通知", send, title, content, default=False)
+                REGISTRY.inc('fnclub_notifications_total', {'channel': channel.name, 'outcome': 'ok' if sent else 'failed'})
+                if sent:
+                    self.log.info(f"{channel.name} 通知发送成功: {title}")
+            finally:
+                channel_queue.task_done()
+
+    def close(self, timeout=None):
+        """等待队列中的通知发送完成后停止发送线程，超时后放弃剩余通知"""
+        if self._closed:
+            return
+        self._closed = True
+        timeout = self.flush_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        for channel_queue in self._queues.values():
+            channel_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        unfinished = [channel.name for channel, thread in zip(self.channels, self._threads) if thread.is_alive()]
+        if unfinished:
+            self.log.warning(f"等待通知发送超时（{timeout}秒），放弃以下渠道未发送的通知: {', '.join(unfinished)}")
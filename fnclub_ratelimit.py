@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""按主机的客户端限速与熔断
+
+批量签到时所有账号（线程或协程）共享同一个主机的 HostGuard：
+
+- TokenBucket：令牌桶限速，rate 为每秒请求数，burst 为允许的突发请求数；rate <= 0 表示不限速
+- CircuitBreaker：连续失败（超时、连接错误、HTTP 5xx/429）达到阈值后熔断，熔断期间所有账号
+  暂停向该主机发请求；熔断时间过后进入半开状态，只放行一个探测请求，成功则恢复，失败则继续熔断
+
+同步代码使用 HostGuard.wait()，协程使用 HostGuard.wait_async()，请求结束后调用
+record_status() / record_failure() 反馈结果。本模块不依赖 fnclub_signer 中的配置。
+"""
+
+import time
+import threading
+
+from fnclub_metrics import REGISTRY
+from fnclub_retry import StepFailed, SERVER_ERROR
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 半开状态下等待探测请求结果时，其他请求的轮询间隔（秒）
+PROBE_POLL_INTERVAL = 0.5
+
+
+class TokenBucket:
+    """线程安全的令牌桶：reserve() 预约一个令牌，返回需要等待的秒数（不会阻塞）"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """熔断器：closed -> (连续失败达到阈值) -> open -> (熔断时间过后) -> half_open -> closed / open"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, log=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.log = log
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """返回 0 表示可以发出请求，否则返回建议等待的秒数"""
+        if self.failure_threshold <= 0:
+            return 0.0
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    return remaining
+                self.state = HALF_OPEN
+                self._probing = False
+                if self.log:
+                    self.log.info(f"{self.name} 熔断时间已过，发送探测请求")
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return PROBE_POLL_INTERVAL
+                self._probing = True
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED and self.log:
+                self.log.info(f"{self.name} 探测请求成功，恢复正常请求")
+            self.state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """探测请求获得许可后被取消（等待限速或请求时）、没有结果时释放探测名额，让其他请求接着探测"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def record_failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+                REGISTRY.inc('fnclub_circuit_open_total', {'host': self.name})
+                if self.log:
+                    self.log.warning(f"{self.name} 连续失败 {self._failures} 次，熔断 {self.reset_timeout} 秒（暂停所有账号对该主机的请求）")
+
+
+class HostGuard:
+    """单个主机的限速器 + 熔断器"""
+
+    def __init__(self, host, rate=0, burst=1, failure_threshold=5, reset_timeout=30, log=None):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(host, failure_threshold, reset_timeout, log)
+
+    def _acquire(self, remaining, start_time):
+        """返回 (等待秒数, 是否已获得许可)；熔断等待超出剩余时间预算时抛出 StepFailed"""
+        wait = self.breaker.allow()
+        if wait <= 0:
+            delay = self.bucket.reserve()
+            if delay > 0:
+                REGISTRY.inc('fnclub_rate_limit_wait_seconds_total', {'host': self.host}, delay)
+            return delay, True
+        if remaining is not None and time.monotonic() - start_time + wait >= remaining:
+            raise StepFailed(SERVER_ERROR, f"{self.host} 熔断中，暂停请求", retry_after=wait)
+        return wait, False
+
+    def wait(self, remaining=None):
+        """阻塞等待直到可以发出请求；remaining 为调用方剩余的时间预算（秒）"""
+        start_time = time.monotonic()
+        while True:
+            delay, granted = self._acquire(remaining, start_time)
+            try:
+                if delay > 0:
+                    time.sleep(delay)
+            except BaseException:
+                if granted:
+                    self.breaker.release_probe()
+                raise
+            if granted:
+                return
+
+    async def wait_async(self, remaining=None):
+        """wait 的协程版本"""
+        import asyncio
+
+        start_time = time.monotonic()
+        while True:
+            delay, granted = self._acquire(remaining, start_time)
+            try:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            except BaseException:
+                # 包括 asyncio.CancelledError
+                if granted:
+                    self.breaker.release_probe()
+                raise
+            if granted:
+                return
+
+    def record_status(self, status):
+        """根据响应状态码反馈结果：5xx 和 429 计为失败"""
+        if status == 429 or status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def record_failure(self):
+        """请求超时或连接错误"""
+        self.breaker.record_failure()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""统一的重试策略
+
+签到流程各步骤只实现"单次尝试"，失败时抛出异常，由每个账号的 Retrier 决定是否重试：
+
+- 按错误类型分类：超时、连接错误、HTTP 5xx、HTTP 429、验证码错误、账号密码错误、页面内容异常；
+  账号密码错误等不可重试的错误立即放弃
+- 指数退避加随机抖动，HTTP 429 / 5xx 带有 Retry-After 时优先使用
+- 每个账号有一个总时间预算，剩余时间不够等待下一次重试时直接放弃
+- 嵌套调用（登录 -> 识别验证码 -> 获取 access_token）只在最外层重试，内层失败直接交给
+  外层处理，重试次数不会相乘
+
+本模块不依赖 fnclub_signer 中的配置，也不在导入时加载 requests / asyncio。
+"""
+
+import sys
+import time
+import random
+
+from fnclub_metrics import REGISTRY
+
+# 错误类型
+TIMEOUT = 'timeout'
+CONNECTION = 'connection'
+SERVER_ERROR = 'server_error'
+RATE_LIMITED = 'rate_limited'
+CAPTCHA_WRONG = 'captcha_wrong'
+CREDENTIALS_WRONG = 'credentials_wrong'
+BAD_RESPONSE = 'bad_response'
+UNKNOWN = 'unknown'
+
+ERROR_DESCRIPTIONS = {
+    TIMEOUT: '请求超时',
+    CONNECTION: '网络连接错误',
+    SERVER_ERROR: '服务器错误',
+    RATE_LIMITED: '请求过于频繁',
+    CAPTCHA_WRONG: '验证码错误',
+    CREDENTIALS_WRONG: '账号密码或密钥错误',
+    BAD_RESPONSE: '响应内容异常',
+    UNKNOWN: '未知错误',
+}
+
+# 可以重试的错误类型；账号密码错误重试只会触发论坛的错误次数限制
+RETRYABLE_ERRORS = frozenset({TIMEOUT, CONNECTION, SERVER_ERROR, RATE_LIMITED, CAPTCHA_WRONG, BAD_RESPONSE, UNKNOWN})
+
+
+class StepFailed(Exception):
+    """单次尝试失败：kind 为错误类型，artifact 为保存的响应内容路径（可选）"""
+
+    def __init__(self, kind, message, retry_after=None, artifact=None):
+        super().__init__(message)
+        self.kind = kind
+        self.retry_after = retry_after
+        self.artifact = artifact
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（只支持秒数），无法解析时返回 None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def check_status(status, message, retry_after=None):
+    """状态码为 429 或 5xx 时抛出对应类型的 StepFailed（带上 Retry-After 指定的等待秒数）"""
+    if status == 429:
+        raise StepFailed(RATE_LIMITED, f"{message}，状态码: {status}", parse_retry_after(retry_after))
+    if status >= 500:
+        raise StepFailed(SERVER_ERROR, f"{message}，状态码: {status}", parse_retry_after(retry_after))
+
+
+def classify_error(error):
+    """判断异常对应的错误类型（同时支持 requests 和 aiohttp 的异常）"""
+    if isinstance(error, StepFailed):
+        return error.kind
+    # requests / asyncio 的异常只可能来自已经导入的模块，没有导入时不必为判断类型而加载
+    requests = sys.modules.get('requests')
+    asyncio = sys.modules.get('asyncio')
+    timeouts = (TimeoutError,) + ((requests.exceptions.Timeout,) if requests else ()) + ((asyncio.TimeoutError,) if asyncio else ())
+    if isinstance(error, timeouts):
+        return TIMEOUT
+    if isinstance(error, (ConnectionError,) + ((requests.exceptions.ConnectionError,) if requests else ())):
+        return CONNECTION
+    # aiohttp.ClientConnectionError 及其子类（不直接导入 aiohttp，同步模式不需要安装）
+    if type(error).__module__.startswith('aiohttp') and any('Connection' in cls.__name__ for cls in type(error).__mro__):
+        return CONNECTION
+    return UNKNOWN
+
+
+def describe_error(error):
+    if isinstance(error, StepFailed):
+        return str(error)
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+
+class RetryPolicy:
+    """重试参数：最多尝试次数、退避基数和上限（秒）、单账号时间预算（秒，0 表示不限制）"""
+
+    def __init__(self, max_attempts=3, base_delay=2, max_delay=30, budget=300, jitter=0.5):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.jitter = jitter
+
+    def backoff(self, attempt, error=None):
+        """第 attempt 次失败后的等待时间：base * 2^(attempt-1)，不超过上限，再乘以 [1-jitter, 1] 之间的随机数"""
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(1 - self.jitter, 1)
+
+
+class Retrier:
+    """单个账号的重试执行器：持有账号的时间预算，并记录当前是否处于某个重试步骤内部"""
+
+    def __init__(self, policy, log):
+        self.policy = policy
+        self.log = log
+        self.deadline = None
+        self._depth = 0
+        self.start()
+
+    def start(self):
+        """重新开始计算时间预算（每次运行签到流程时调用）"""
+        self.deadline = time.monotonic() + self.policy.budget if self.policy.budget else None
+
+    def remaining(self):
+        """剩余时间预算（秒），不限制时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def _next_delay(self, step, label, attempt, error):
+        """记录失败原因，返回下一次重试前的等待时间；不再重试时返回 None"""
+        kind = classify_error(error)
+        description = ERROR_DESCRIPTIONS[kind]
+        message = describe_error(error)
+        extra = {'step': step, 'outcome': kind}
+        if getattr(error, 'artifact', None):
+            extra['artifact'] = error.artifact
+
+        if kind not in RETRYABLE_ERRORS:
+            self.log.error(f"{label}失败（{description}，不再重试）: {message}", extra=extra)
+            return None
+        if attempt >= self.policy.max_attempts:
+            self.log.error(f"{label}失败（{description}）: {message}，已达到最大尝试次数({self.policy.max_attempts})", extra=extra)
+            return None
+        delay = self.policy.backoff(attempt, error)
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            self.log.error(f"{label}失败（{description}）: {message}，超出单账号时间预算({self.policy.budget}秒)，不再重试", extra=extra)
+            return None
+        REGISTRY.inc('fnclub_retries_total', {'step': step, 'kind': kind})
+        self.log.warning(f"{label}失败（{description}）: {message}，{delay:.1f}秒后重试({attempt}/{self.policy.max_attempts})", extra=extra)
+        return delay
+
+    def call(self, step, label, func, *args, default=None):
+        """按策略执行 func(*args)；全部失败时返回 default。处于其他重试步骤内部时只执行一次，异常交给外层"""
+        if self._depth:
+            return func(*args)
+        self._depth += 1
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return func(*args)
+                except Exception as e:
+                    delay = self._next_delay(step, label, attempt, e)
+                    if delay is None:
+                        return default
+                time.sleep(delay)
+        finally:
+            self._depth -= 1
+
+    async def call_async(self, step, label, func, *args, default=None):
+        """call 的协程版本，func 为协程函数，等待使用 asyncio.sleep"""
+        import asyncio
+
+        if self._depth:
+            return await func(*args)
+        self._depth += 1
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return await func(*args)
+                except Exception as e:
+                    delay = self._next_delay(step, label, attempt, e)
+                    if delay is None:
+                        return default
+                await asyncio.sleep(delay)
+        finally:
+            self._depth -= 1
@@ -3,29 +3,34 @@
 
 import os
 import re
+import csv
 import json
+import sqlite3
+import threading
 import time
 import logging
-import requests
 import base64
 import urllib.parse
 import random
-from bs4 import BeautifulSoup
-from datetime import datetime
+import argparse
+import atexit
+import queue
+import contextlib
+import logging.handlers
+from concurrent.futures import ThreadPoolExecutor
+from fnclub_extract import get_extractor
+from fnclub_captcha import create_recognizer, normalize_text, preprocess_image, CaptchaCorpus
+from fnclub_metrics import REGISTRY, traced, step_timer, write_textfile, start_http_exporter
+from fnclub_retry import (RetryPolicy, Retrier, StepFailed, check_status, classify_error, BAD_RESPONSE, CAPTCHA_WRONG,
+                          CREDENTIALS_WRONG, RATE_LIMITED, TIMEOUT, CONNECTION)
+from fnclub_ratelimit import HostGuard
+from fnclub_history import SignHistory
+from fnclub_notify import NotificationDispatcher, IyuuChannel, WebhookChannel, SmtpChannel
+from datetime import datetime, timezone, timedelta
 
-# 配置日志
+# 日志目录（日志处理器由各入口调用 setup_logging() 配置，第一次写日志时才创建目录）；
+# 日志按日期写入 sign_YYYYMMDD.log
 log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, f'sign_{datetime.now().strftime("%Y%m%d")}.log')
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 
 logger = logging.getLogger(__name__)
 
@@ -35,37 +40,157 @@ class Config:
     USERNAME = os.environ.get('USERNAME', '')
     PASSWORD = os.environ.get('PASSWORD', '')
     
-    # 网站URL
-    BASE_URL = 'https://club.fnnas.com/'
+    # 网站URL（FORUM_BASE_URL 可以改为本地模拟论坛，见 fnclub_fakeforum.py）
+    BASE_URL = (os.environ.get('FORUM_BASE_URL', '') or 'https://club.fnnas.com').rstrip('/') + '/'
     LOGIN_URL = BASE_URL + 'member.php?mod=logging&action=login'
     SIGN_URL = BASE_URL + 'plugin.php?id=zqlj_sign'
     
-    # Cookie文件路径
+    # Cookie文件路径（旧版单账号Cookie文件，首次运行时会自动导入会话库）
     COOKIE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies.json')
-    
-    # 验证码识别API (百度OCR API)（必须从环境变量读取）
-    CAPTCHA_API_URL = "https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic"
+
+    # 会话库路径（SQLite，按账号保存Cookie和最近验证时间）
+    SESSION_DB = os.environ.get('SESSION_DB', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions.db')
+    # 会话在该时间（小时）内被确认有效过，则跳过首页登录状态检查
+    SESSION_TRUST_HOURS = float(os.environ.get('SESSION_TRUST_HOURS', '48') or 48)
+    # 乐观模式：不请求首页检查登录状态，直接请求签到页面，从签到页面判断会话是否失效（设置为 0 关闭）
+    OPTIMISTIC_LOGIN = os.environ.get('OPTIMISTIC_LOGIN', '1') != '0'
+    # 自适应登录：在会话库中记住每个账号上次登录的方式，上次需要跳转到验证码页面的账号直接打开记住的验证码页面（设置为 0 关闭）
+    ADAPTIVE_LOGIN = os.environ.get('ADAPTIVE_LOGIN', '1') != '0'
+    # 记住的验证码页面地址（包含与登录凭据相关的 auth 参数）的有效时间（小时），过期后删除并走完整登录流程
+    LOGIN_PATH_TTL_HOURS = float(os.environ.get('LOGIN_PATH_TTL_HOURS', '48') or 48)
+    # 会话包（CI 用，需要 cryptography）：设置密钥后 CI / GitHub Actions 中也使用会话库，运行前从加密的会话包恢复
+    # Cookie、最近验证时间、登录方式和 access_token，运行后写回；会话包所在目录由 actions/cache 在两次运行之间保存
+    SESSION_BUNDLE_KEY = os.environ.get('SESSION_BUNDLE_KEY', '')
+    SESSION_BUNDLE_FILE = os.environ.get('SESSION_BUNDLE_FILE', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'session_cache', 'session_bundle.bin')
+
+    # 多账号批量签到配置（可选）
+    # 账号文件支持 JSON / YAML / CSV，每个账号包含 username、password 字段
+    ACCOUNTS_FILE = os.environ.get('ACCOUNTS_FILE', '')
+    # 批量模式下每个账号旧版Cookie文件的目录（首次运行时会自动导入会话库）
+    COOKIE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cookies')
+    # 批量模式并发数
+    BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '5') or 5)
+    # 异步模式共享连接池大小（所有账号共用的最大连接数）
+    ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', '10') or 10)
+
+    # 论坛所在时区，"每天"按该时区计算
+    FORUM_TIMEZONE = os.environ.get('FORUM_TIMEZONE', 'Asia/Shanghai')
+    # 签到台账：按论坛日期记录每个账号的签到结果，当天已签到的账号再次运行时不发任何请求（设置 RUN_LEDGER=0 关闭）
+    RUN_LEDGER = os.environ.get('RUN_LEDGER', '1') != '0'
+    LEDGER_DB = os.environ.get('LEDGER_DB', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ledger.db')
+    # 即使台账中已记录签到成功，也在线确认签到状态（也可以使用命令行参数 --verify）
+    LEDGER_VERIFY = os.environ.get('LEDGER_VERIFY', '0') == '1'
+    # 签到历史：每次运行的结果和签到信息追加到历史库，用 fnclub_history.py 统计（设置 SIGN_HISTORY=0 关闭）
+    SIGN_HISTORY = os.environ.get('SIGN_HISTORY', '1') != '0'
+    HISTORY_DB = os.environ.get('HISTORY_DB', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.db')
+    # 常驻模式（fnclub_daemon.py）：每天的签到时间窗口（论坛时区），各账号在窗口内随机错开
+    DAEMON_WINDOW = os.environ.get('DAEMON_WINDOW', '08:00-22:00')
+    # 常驻模式的签到计划库，重启后按计划继续，不会重复签到
+    DAEMON_SCHEDULE_DB = os.environ.get('DAEMON_SCHEDULE_DB', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule.db')
+    # 常驻模式下失败账号每天最多尝试次数，以及重新签到的退避基数(秒)
+    DAEMON_MAX_ATTEMPTS = int(os.environ.get('DAEMON_MAX_ATTEMPTS', '4') or 4)
+    DAEMON_RETRY_DELAY = float(os.environ.get('DAEMON_RETRY_DELAY', '600') or 600)
+
+    # 验证码识别API (百度OCR API)（必须从环境变量读取）；BAIDU_API_BASE_URL 可以改为本地模拟接口
+    BAIDU_API_BASE_URL = (os.environ.get('BAIDU_API_BASE_URL', '') or 'https://aip.baidubce.com').rstrip('/')
+    CAPTCHA_API_URL = BAIDU_API_BASE_URL + "/rest/2.0/ocr/v1/accurate_basic"
     API_KEY = os.environ.get('API_KEY', '')
     SECRET_KEY = os.environ.get('SECRET_KEY', '')
+    # 百度OCR接口分级：依次调用，识别结果符合验证码长度和字符集时不再调用下一级（默认先用通用文字识别，再用高精度版）
+    OCR_ENDPOINTS = [name.strip() for name in os.environ.get('OCR_ENDPOINTS', '').split(',') if name.strip()] or ['general_basic', 'accurate_basic']
+    # 上传百度OCR前先去掉噪点和干扰线并裁剪到文字区域（需要 NumPy / Pillow，未安装时上传原图；设置为 0 关闭）
+    OCR_PREPROCESS = os.environ.get('OCR_PREPROCESS', '1') != '0'
+
+    # 本地验证码识别（可选）：auto（有模板文件时用模板匹配，否则尝试本机Tesseract）/ template / tesseract / none
+    CAPTCHA_LOCAL_ENGINE = os.environ.get('CAPTCHA_LOCAL_ENGINE', 'auto')
+    # 模板匹配引擎使用的模板文件，由 python fnclub_captcha.py train 生成
+    CAPTCHA_TEMPLATE_FILE = os.environ.get('CAPTCHA_TEMPLATE_FILE', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captcha_templates.npz')
+    # 本地识别置信度低于该值时改用百度OCR
+    CAPTCHA_LOCAL_MIN_CONFIDENCE = float(os.environ.get('CAPTCHA_LOCAL_MIN_CONFIDENCE', '0.85') or 0.85)
+    # 验证码语料目录：记录每次识别的图片、引擎、结果、耗时以及论坛是否接受（设置 CAPTCHA_CORPUS=0 关闭）
+    CAPTCHA_CORPUS = os.environ.get('CAPTCHA_CORPUS', '1') != '0'
+    CAPTCHA_CORPUS_DIR = os.environ.get('CAPTCHA_CORPUS_DIR', '') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captcha_corpus')
+    # 验证码错误时在同一个登录表单内刷新验证码重新提交的最多次数（保留 formhash / auth / seccodehash，
+    # 用完后才按重试策略重新走完整登录流程）
+    CAPTCHA_SUBMIT_ATTEMPTS = max(1, int(os.environ.get('CAPTCHA_SUBMIT_ATTEMPTS', '3') or 3))
     
-    # 重试设置
-    MAX_RETRIES = 3  # 最大重试次数
-    RETRY_DELAY = 2  # 重试间隔(秒)
+    # 重试设置（详见 fnclub_retry）
+    MAX_RETRIES = 3  # 每个步骤最多尝试次数
+    RETRY_DELAY = 2  # 重试退避基数(秒)，每次失败后翻倍并加随机抖动
+    RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '30') or 30)  # 单次重试等待上限(秒)
+    # 单个账号签到流程的总时间预算(秒)，剩余时间不够时不再重试；0 表示不限制
+    ACCOUNT_TIME_BUDGET = float(os.environ.get('ACCOUNT_TIME_BUDGET', '300') or 0)
+
+    # 按主机限速（所有账号共享）：每秒请求数和突发请求数，0 表示不限速
+    FORUM_RATE_LIMIT = float(os.environ.get('FORUM_RATE_LIMIT', '5') or 0)
+    FORUM_RATE_BURST = int(os.environ.get('FORUM_RATE_BURST', '10') or 1)
+    OCR_RATE_LIMIT = float(os.environ.get('OCR_RATE_LIMIT', '2') or 0)
+    OCR_RATE_BURST = int(os.environ.get('OCR_RATE_BURST', '2') or 1)
+    # 熔断：同一主机连续失败（超时、连接错误、5xx/429）达到该次数后暂停所有请求，0 表示关闭熔断
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5') or 0)
+    # 熔断持续时间(秒)，之后放行一个探测请求
+    CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30') or 30)
     
     # 请求超时设置（秒）
     REQUEST_TIMEOUT = 30  # HTTP请求超时时间
+
+    # 日志文件格式：text（默认，与控制台一致）/ json（每行一个JSON对象，包含账号、步骤、状态码、耗时、字节数）
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+    # 步骤失败时保存响应内容的目录，总大小超过上限时删除最旧的文件
+    FAILURE_ARTIFACT_DIR = os.path.join(log_dir, 'failures')
+    FAILURE_ARTIFACT_MAX_MB = float(os.environ.get('FAILURE_ARTIFACT_MAX_MB', '20') or 20)
+    # 步骤耗时指标导出（可选）：运行结束时写出的 Prometheus 文本文件路径，以及 /metrics HTTP 接口端口
+    METRICS_TEXTFILE = os.environ.get('METRICS_TEXTFILE', '')
+    METRICS_PORT = int(os.environ.get('METRICS_PORT', '0') or 0)
+
+    # 页面字段提取后端：auto（正则快速提取，失败时回退bs4）/ regex / lxml / bs4
+    HTML_EXTRACTOR = os.environ.get('HTML_EXTRACTOR', 'auto')
     
     # Token缓存文件
     TOKEN_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'token_cache.json')
+    # 百度OCR access_token 获取地址
+    TOKEN_URL = BAIDU_API_BASE_URL + "/oauth/2.0/token"
     
     # IYUU 通知配置 - 访问：https://iyuu.cn/ 微信扫描后获取Token（可选）
     IYUU_TOKEN = os.environ.get('IYUU_TOKEN', '')
+    IYUU_BASE_URL = (os.environ.get('IYUU_BASE_URL', '') or 'https://iyuu.cn').rstrip('/')
+    # 通用 Webhook 通知：POST JSON {"title", "content"}（可选）
+    NOTIFY_WEBHOOK_URL = os.environ.get('NOTIFY_WEBHOOK_URL', '')
+    # SMTP 邮件通知（可选，通常为本机邮件中继）；收件人多个时用逗号分隔
+    SMTP_HOST = os.environ.get('SMTP_HOST', '')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', '25') or 25)
+    SMTP_FROM = os.environ.get('SMTP_FROM', 'fnclub-signer@localhost')
+    SMTP_TO = os.environ.get('SMTP_TO', '')
+    SMTP_USER = os.environ.get('SMTP_USER', '')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+    SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '0') == '1'
+    # 批量签到时每条汇总通知包含的账号数，0 表示整个批次合并成一条
+    NOTIFY_DIGEST_SIZE = int(os.environ.get('NOTIFY_DIGEST_SIZE', '0') or 0)
+    # 通知发送失败时后台重试的最多尝试次数和退避基数(秒)
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '5') or 5)
+    NOTIFY_RETRY_DELAY = float(os.environ.get('NOTIFY_RETRY_DELAY', '5') or 5)
+    # 进程退出前最多等待通知发送完成的时间(秒)
+    NOTIFY_FLUSH_TIMEOUT = float(os.environ.get('NOTIFY_FLUSH_TIMEOUT', '60') or 0)
     
     @staticmethod
     def get_iyuu_url():
         """获取 IYUU 通知 API URL"""
         token = Config.IYUU_TOKEN
-        return f'https://iyuu.cn/{token}.send'
+        return f'{Config.IYUU_BASE_URL}/{token}.send'
+
+    @staticmethod
+    def set_hosts(forum_base_url=None, baidu_api_base_url=None, iyuu_base_url=None):
+        """运行时替换论坛、百度OCR和IYUU的地址（同时更新由它们拼接的URL），用于本地模拟论坛和压测"""
+        if forum_base_url:
+            Config.BASE_URL = forum_base_url.rstrip('/') + '/'
+            Config.LOGIN_URL = Config.BASE_URL + 'member.php?mod=logging&action=login'
+            Config.SIGN_URL = Config.BASE_URL + 'plugin.php?id=zqlj_sign'
+        if baidu_api_base_url:
+            Config.BAIDU_API_BASE_URL = baidu_api_base_url.rstrip('/')
+            Config.CAPTCHA_API_URL = Config.BAIDU_API_BASE_URL + "/rest/2.0/ocr/v1/accurate_basic"
+            Config.TOKEN_URL = Config.BAIDU_API_BASE_URL + "/oauth/2.0/token"
+        if iyuu_base_url:
+            Config.IYUU_BASE_URL = iyuu_base_url.rstrip('/')
     
     @staticmethod
     def is_actions_env():
@@ -77,20 +202,25 @@ class Config:
         if os.environ.get('CI', '').lower() == 'true':
             return True
         return False
+
+    @staticmethod
+    def use_saved_sessions():
+        """是否读写会话库：本地环境始终使用，CI 环境只在配置了会话包密钥 SESSION_BUNDLE_KEY 时使用"""
+        return not Config.is_actions_env() or bool(Config.SESSION_BUNDLE_KEY)
     
     @staticmethod
-    def check_required_env_vars():
-        """检查必需的环境变量是否已设置"""
+    def check_required_env_vars(require_account=True):
+        """检查必需的环境变量是否已设置（批量模式下账号来自账号文件，不要求 USERNAME/PASSWORD）"""
         missing_vars = []
-        
+
         # 必需的环境变量
-        required_vars = {
-            'USERNAME': Config.USERNAME,
-            'PASSWORD': Config.PASSWORD,
-            'API_KEY': Config.API_KEY,
-            'SECRET_KEY': Config.SECRET_KEY
-        }
-        
+        required_vars = {}
+        if require_account:
+            required_vars['USERNAME'] = Config.USERNAME
+            required_vars['PASSWORD'] = Config.PASSWORD
+        required_vars['API_KEY'] = Config.API_KEY
+        required_vars['SECRET_KEY'] = Config.SECRET_KEY
+
         for var_name, var_value in required_vars.items():
             if not var_value or var_value.strip() == '':
                 missing_vars.append(var_name)
@@ -118,50 +248,1400 @@ class Config:
         
         return True, info_msg, []
 
+# ==================== 日志 ====================
+
+# JSON 日志中输出的结构化字段（通过 extra 传入）
+STRUCTURED_LOG_FIELDS = ('account', 'step', 'outcome', 'status', 'latency_ms', 'bytes', 'artifact')
+
+
+class TextLogFormatter(logging.Formatter):
+    """文本日志格式，批量模式下在消息前加上账号前缀"""
+
+    def formatMessage(self, record):
+        account = getattr(record, 'account', None)
+        if account:
+            values = dict(record.__dict__, message=f"[{account}] {record.message}")
+            return self._fmt % values
+        return super().formatMessage(record)
+
+
+class JsonLogFormatter(logging.Formatter):
+    """JSON Lines 日志格式，结构化字段单独输出，便于检索和统计"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+        for field in STRUCTURED_LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LazyFileHandler(logging.FileHandler):
+    """按日期写入 sign_YYYYMMDD.log：第一次写入日志时才创建日志目录和文件，只导入模块不会在磁盘上留下 logs/；
+    日期变化后（常驻模式跨天运行）关闭旧文件，写入新日期的文件"""
+
+    def __init__(self, directory, encoding=None):
+        self.directory = directory
+        self.day = datetime.now().strftime('%Y%m%d')
+        super().__init__(self._path(self.day), encoding=encoding, delay=True)
+
+    def _path(self, day):
+        return os.path.join(self.directory, f'sign_{day}.log')
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+    def emit(self, record):
+        # handle() 已持有处理器锁
+        day = datetime.fromtimestamp(record.created).strftime('%Y%m%d')
+        if day != self.day:
+            self.day = day
+            self.baseFilename = os.path.abspath(self._path(day))
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+        super().emit(record)
+
+
+_log_listener = None
+
+
+def setup_logging(directory=None):
+    """配置日志：处理器挂在后台线程的 QueueListener 上，请求线程只把日志记录放入队列，不直接写文件
+
+    由命令行入口（本脚本、fnclub_async、fnclub_daemon、fnclub_bench）调用，只导入本模块时不替换根日志处理器，
+    也不启动日志线程；重复调用时不做任何事。directory 为日志目录，默认为 logs/。
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    text_formatter = TextLogFormatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler = LazyFileHandler(directory or log_dir, encoding='utf-8')
+    file_handler.setFormatter(JsonLogFormatter() if Config.LOG_FORMAT == 'json' else text_formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(text_formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    # 退出前把队列中剩余的日志写完
+    atexit.register(listener.stop)
+    _log_listener = listener
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+
+
+def stop_logging():
+    """写完队列中剩余的日志并关闭日志文件（如删除临时日志目录之前），之后可以重新调用 setup_logging()"""
+    global _log_listener
+    if _log_listener is None:
+        return
+    # 已经停止的监听器不能再次 stop()，同时取消 setup_logging() 注册的退出时回调
+    atexit.unregister(_log_listener.stop)
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+    _log_listener = None
+    logging.getLogger().handlers = []
+
+
+def log_http_step(log, step, status, start_time, size):
+    """记录一次HTTP请求的步骤、状态码、耗时和响应字节数"""
+    elapsed = time.perf_counter() - start_time
+    REGISTRY.observe('fnclub_http_request_duration_seconds', {'step': step, 'status': str(status)}, elapsed)
+    latency_ms = round(elapsed * 1000, 1)
+    log.info(f"{step}: HTTP {status}，{latency_ms:.0f}ms，{size}字节",
+             extra={'step': step, 'status': status, 'latency_ms': latency_ms, 'bytes': size})
+
+
+_artifact_lock = threading.Lock()
+
+
+def save_failure_artifact(step, body, account=''):
+    """步骤失败时把响应内容保存到失败现场目录，返回文件路径；目录总大小超过上限时删除最旧的文件"""
+    safe_account = re.sub(r'[^\w.-]', '_', account or 'default')
+    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{safe_account}_{step}.html"
+    path = os.path.join(Config.FAILURE_ARTIFACT_DIR, filename)
+    with _artifact_lock:
+        os.makedirs(Config.FAILURE_ARTIFACT_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(body or '')
+
+        entries = [os.path.join(Config.FAILURE_ARTIFACT_DIR, name) for name in os.listdir(Config.FAILURE_ARTIFACT_DIR)]
+        entries.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(entry) for entry in entries)
+        limit = Config.FAILURE_ARTIFACT_MAX_MB * 1024 * 1024
+        while total > limit and len(entries) > 1:
+            oldest = entries.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+    return path
+
+
+# 模拟浏览器的默认请求头
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
+}
+
+# ==================== 页面解析 ====================
+# 以下函数只负责从页面HTML中提取字段，不发起网络请求，同步和异步签到流程共用
+
+# 登录响应中表示需要跳转到验证码页面的提示
+CAPTCHA_REDIRECT_TEXT = '请输入验证码后继续登录'
+
+# 登录结果类型
+LOGIN_RESULT_SUCCESS = 'success'
+LOGIN_RESULT_CAPTCHA_WRONG = 'captcha_wrong'
+LOGIN_RESULT_CREDENTIALS_WRONG = 'credentials_wrong'
+LOGIN_RESULT_UNKNOWN = 'unknown'
+
+# 登录方式：登录页面内嵌验证码 / 提交账号密码后跳转到验证码页面（带 auth 参数）/ 不需要验证码
+LOGIN_VARIANT_INLINE = 'inline'
+LOGIN_VARIANT_REDIRECT = 'redirect'
+LOGIN_VARIANT_NONE = 'none'
+
+# 未登录时访问签到页面会被重定向到登录页，或在页面中直接显示登录表单
+LOGIN_REDIRECT_MARK = 'mod=logging&action=login'
+LOGIN_FORM_PATTERN = re.compile(r'<form[^>]+id="loginform_|name="loginsubmit"')
+
+
+def absolute_url(url):
+    """将页面中的相对路径补全为完整URL"""
+    if url.startswith('http'):
+        return url
+    if url.startswith('/'):
+        return Config.BASE_URL.rstrip('/') + url
+    return Config.BASE_URL + url
+
+
+def build_captcha_url(seccode_id):
+    """根据 seccode hash 手动构建验证码图片URL"""
+    update_val = random.randint(10000, 99999)
+    return f"{Config.BASE_URL}misc.php?mod=seccode&update={update_val}&idhash={seccode_id}"
+
+
+def resolve_login_post_url(form_action, default_url):
+    """构建登录提交URL - 优先使用表单的action，如果没有则使用默认URL"""
+    if form_action and form_action.startswith('member.php'):
+        return absolute_url(form_action)
+    return default_url
+
+
+def build_login_data(formhash, username, password):
+    """构建登录表单数据"""
+    return {
+        'formhash': formhash,
+        'referer': Config.BASE_URL,
+        'loginfield': 'username',
+        'username': username,
+        'password': password,
+        'questionid': '0',
+        'answer': '',
+        'cookietime': '2592000',  # 保持登录状态30天
+        'loginsubmit': 'true'
+    }
+
+
+def parse_login_status(html, username):
+    """根据页面内容综合判断是否处于登录状态"""
+    # 登录链接存在表示未登录；个人中心链接、退出登录链接（更可靠）表示已登录
+    login_links, user_center_links, logout_links = get_extractor(Config.HTML_EXTRACTOR).link_counts(html)
+
+    # 检查页面内容是否包含用户名
+    username_in_page = username in html
+
+    # 输出详细的登录状态检测信息
+    logger.debug(f"登录状态检测: 登录链接数量={login_links}, 退出链接数量={logout_links}, 用户名在页面中={username_in_page}, 个人中心链接数量={user_center_links}")
+
+    # 如果有退出链接，或者（没有登录链接且（有个人中心链接或用户名在页面中）），则认为已登录
+    return logout_links > 0 or ((login_links == 0 or username_in_page) and user_center_links > 0)
+
+
+def parse_login_page(html):
+    """解析登录页面，返回登录表单信息；未找到任何表单时返回 None"""
+    login_form = get_extractor(Config.HTML_EXTRACTOR).login_form(html)
+    if not login_form:
+        return None
+    if login_form['fallback']:
+        logger.info(f"使用备选表单: ID={login_form['form_id']}, Action={login_form['form_action']}")
+
+    # 检查是否需要验证码
+    seccode_input_id = login_form['seccode_input_id']
+    return {
+        'form_id': login_form['form_id'],
+        'form_action': login_form['form_action'],
+        'formhash': login_form['formhash'],
+        'username_id': login_form['username_id'],
+        'password_id': login_form['password_id'],
+        'need_captcha': seccode_input_id is not None,
+        'seccode_id': seccode_input_id.replace('seccodeverify_', '') if seccode_input_id is not None else None,
+        'captcha_src': login_form['captcha_src']
+    }
+
+
+def parse_captcha_redirect_url(html):
+    """从登录响应的JavaScript代码中提取验证码页面跳转URL"""
+    # 匹配 location.href='...' 或 location.href="..."
+    url_match = re.search(r"location\.href=['\"]([^'\"]+)['\"]", html)
+    if not url_match:
+        return None
+    return absolute_url(url_match.group(1))
+
+
+def parse_auth_param(url):
+    """从验证码页面跳转URL中提取 auth 参数（已解码），没有时返回空字符串"""
+    auth_match = re.search(r'auth=([^&#]+)', url)
+    return urllib.parse.unquote(auth_match.group(1)) if auth_match else ''
+
+
+def parse_captcha_page(html):
+    """解析验证码页面，返回 seccode hash、验证码图片URL、formhash 和表单action"""
+    page = get_extractor(Config.HTML_EXTRACTOR).captcha_page(html)
+    seccode_id = None
+    captcha_url = None
+
+    if page['seccode_input_id'] is not None:
+        # 情况1：找到了输入框 (静态HTML)
+        seccode_id = page['seccode_input_id'].replace('seccodeverify_', '')
+        if page['captcha_src']:
+            captcha_url = absolute_url(page['captcha_src'])
+        else:
+            logger.info("未找到验证码图片元素，尝试手动构建URL")
+            captcha_url = build_captcha_url(seccode_id)
+    else:
+        # 情况2：没找到输入框，尝试查找seccode span或script (处理JS渲染的情况)
+        logger.info("通过输入框未找到验证码，尝试查找seccode span或script...")
+        if page['seccode_span_id']:
+            seccode_id = page['seccode_span_id'].replace('seccode_', '')
+            logger.info(f"通过span找到seccode hash: {seccode_id}")
+
+        # 如果span也没找到，尝试在HTML源码中匹配 updateseccode('xxxxx', ...)
+        if not seccode_id:
+            match = re.search(r"updateseccode\('([^']+)'", html)
+            if match:
+                seccode_id = match.group(1)
+                logger.info(f"通过script找到seccode hash: {seccode_id}")
+
+        if seccode_id:
+            logger.info(f"检测到JS渲染的验证码，Hash: {seccode_id}")
+            captcha_url = build_captcha_url(seccode_id)
+
+    return {
+        'seccode_id': seccode_id,
+        'captcha_url': captcha_url,
+        'formhash': page['formhash'],
+        'form_action': page['form_action']
+    }
+
+
+def classify_login_response(html):
+    """根据登录响应内容判断登录结果"""
+    if '验证码' in html and ('验证码错误' in html or '验证码不正确' in html):
+        return LOGIN_RESULT_CAPTCHA_WRONG
+    if '登录失败' in html or '密码错误' in html or '用户名不存在' in html:
+        return LOGIN_RESULT_CREDENTIALS_WRONG
+    if 'succeedhandle_' in html or '登录成功' in html or '欢迎您回来' in html:
+        return LOGIN_RESULT_SUCCESS
+    return LOGIN_RESULT_UNKNOWN
+
+
+def is_logged_out_page(html, url=''):
+    """判断页面是否表示未登录：被重定向到登录页、页面中有登录表单，或只有登录链接没有退出链接"""
+    if LOGIN_REDIRECT_MARK in urllib.parse.unquote(url or '').replace('&amp;', '&'):
+        return True
+    if LOGIN_FORM_PATTERN.search(html):
+        return True
+    login_links, _, logout_links = get_extractor(Config.HTML_EXTRACTOR).link_counts(html)
+    return login_links > 0 and logout_links == 0
+
+
+class SignPage:
+    """签到页面快照：一次解析同时提取签到按钮文字、sign参数和"我的打卡动态"信息
+
+    未找到签到按钮时 sign_text / sign_param 为 None；未找到签到信息区域时 sign_info 为 None。
+    url 为请求重定向后的最终地址，用于判断是否被跳转到了登录页。
+    """
+
+    def __init__(self, html, url=''):
+        self.sign_text, self.sign_param, self.sign_info = get_extractor(Config.HTML_EXTRACTOR).sign_page(html)
+        # 只有找不到签到按钮时才需要判断是否未登录，正常页面不做额外解析
+        self.logged_out = not self.has_sign_button and is_logged_out_page(html, url)
+
+    @property
+    def has_sign_button(self):
+        return self.sign_text is not None
+
+
+def parse_ocr_words(result):
+    """从百度OCR响应中提取验证码文本；响应中没有识别结果时返回 None
+
+    依次尝试每一条识别结果以及所有结果拼接后的文本（字符间距较大时会被识别成多行），
+    返回第一个符合验证码长度和字符集的；都不符合时返回拼接后清理过的文本。
+    """
+    words = [item.get('words', '') for item in result.get('words_result') or []]
+    if not words:
+        return None
+    for candidate in words + [''.join(words)]:
+        captcha_text = normalize_text(candidate)
+        if captcha_text:
+            return captcha_text
+    # 清理验证码文本，移除空格和特殊字符
+    return re.sub(r'[\s\W]+', '', ''.join(words))
+
+
+# ==================== 会话存储 ====================
+
+class SessionStore:
+    """按账号保存Cookie的SQLite会话库
+
+    每个账号一行，写入在单个事务内完成（不会出现写了一半的Cookie文件）；
+    读取时跳过已过期的Cookie，并记录会话最近一次被确认有效的时间。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.SESSION_DB
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS sessions ('
+                        'account TEXT PRIMARY KEY, '
+                        'cookies TEXT NOT NULL, '
+                        'saved_at REAL NOT NULL, '
+                        'verified_at REAL)'
+                    )
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS login_paths ('
+                        'account TEXT PRIMARY KEY, '
+                        'variant TEXT NOT NULL, '
+                        'captcha_page_url TEXT, '
+                        'updated_at REAL NOT NULL)'
+                    )
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def load(self, account):
+        """读取账号的未过期Cookie，返回 (Cookie列表, 最近验证时间)；没有可用会话时返回 (None, None)"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT cookies, verified_at FROM sessions WHERE account = ?', (account,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None, None
+
+        now = time.time()
+        cookies_list = [c for c in json.loads(row[0]) if not c.get('expires') or c['expires'] > now]
+        if not cookies_list:
+            # Cookie 全部过期：删除会话和记住的登录方式（验证码页面地址中的 auth 参数不再保留）
+            self.clear(account)
+            return None, None
+        return cookies_list, row[1]
+
+    def clear(self, account):
+        """删除账号的会话和记住的登录方式"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM sessions WHERE account = ?', (account,))
+                conn.execute('DELETE FROM login_paths WHERE account = ?', (account,))
+        finally:
+            conn.close()
+
+    def save(self, account, cookies_list, verified=False):
+        """保存账号的Cookie；verified 为 True 时同时更新最近验证时间"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT INTO sessions (account, cookies, saved_at, verified_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(account) DO UPDATE SET cookies = excluded.cookies, saved_at = excluded.saved_at, '
+                    'verified_at = COALESCE(excluded.verified_at, sessions.verified_at)',
+                    (account, json.dumps(cookies_list), now, now if verified else None)
+                )
+        finally:
+            conn.close()
+
+    def mark_verified(self, account):
+        """记录账号会话刚刚被确认有效"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('UPDATE sessions SET verified_at = ? WHERE account = ?', (time.time(), account))
+        finally:
+            conn.close()
+
+    def load_login_path(self, account, max_age=None):
+        """读取账号上次登录的方式，返回 (登录方式, 验证码页面URL)；没有记录时返回 (None, None)
+
+        验证码页面地址中的 auth 参数与登录凭据相关，不长期保存：先删除超过 max_age 秒的记录
+        和会话库中已没有会话的账号的记录。
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                if max_age is not None:
+                    conn.execute('DELETE FROM login_paths WHERE updated_at < ?', (time.time() - max_age,))
+                conn.execute('DELETE FROM login_paths WHERE account NOT IN (SELECT account FROM sessions)')
+            row = conn.execute('SELECT variant, captcha_page_url FROM login_paths WHERE account = ?', (account,)).fetchone()
+        finally:
+            conn.close()
+        return row if row else (None, None)
+
+    def save_login_path(self, account, variant, captcha_page_url=None):
+        """记录账号本次登录的方式；需要跳转到验证码页面时同时记录带 auth 参数的验证码页面URL"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO login_paths (account, variant, captcha_page_url, updated_at) VALUES (?, ?, ?, ?)',
+                    (account, variant, captcha_page_url, time.time())
+                )
+        finally:
+            conn.close()
+
+    def clear_login_path(self, account):
+        """删除账号记住的登录方式"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM login_paths WHERE account = ?', (account,))
+        finally:
+            conn.close()
+
+    def export_rows(self):
+        """导出所有账号的会话和登录方式，返回 {'sessions': [...], 'login_paths': [...]}（用于会话包）"""
+        conn = self._connect()
+        try:
+            sessions = conn.execute('SELECT account, cookies, saved_at, verified_at FROM sessions').fetchall()
+            login_paths = conn.execute('SELECT account, variant, captcha_page_url, updated_at FROM login_paths').fetchall()
+        finally:
+            conn.close()
+        return {'sessions': [list(row) for row in sessions], 'login_paths': [list(row) for row in login_paths]}
+
+    def import_rows(self, rows):
+        """导入 export_rows() 导出的会话和登录方式，覆盖同一账号已有的记录"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO sessions (account, cookies, saved_at, verified_at) VALUES (?, ?, ?, ?)',
+                                 rows.get('sessions', []))
+                conn.executemany('INSERT OR REPLACE INTO login_paths (account, variant, captcha_page_url, updated_at) VALUES (?, ?, ?, ?)',
+                                 rows.get('login_paths', []))
+        finally:
+            conn.close()
+
+
+_session_store = None
+
+
+def get_session_store():
+    """获取进程内共享的会话库"""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore()
+    return _session_store
+
+
+def load_legacy_cookie_file(path):
+    """读取旧版 cookies.json，返回统一格式的未过期Cookie列表；文件不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        cookies_list = json.load(f)
+
+    # 检查是否为新格式的Cookie列表
+    if isinstance(cookies_list, list) and len(cookies_list) > 0 and 'name' in cookies_list[0]:
+        # 新格式：包含完整Cookie属性的列表
+        now = time.time()
+        return [c for c in cookies_list if not c.get('expires') or c['expires'] > now]
+    # 旧格式：简单的名称-值字典
+    return [{'name': name, 'value': value} for name, value in cookies_list.items()]
+
+
+def is_session_fresh(verified_at):
+    """会话是否在信任时间窗口内被确认过有效"""
+    return bool(verified_at) and time.time() - verified_at < Config.SESSION_TRUST_HOURS * 3600
+
+
+def find_login_shortcut(account, log=None):
+    """上次登录需要跳转到验证码页面时，返回记住的验证码页面URL（可以跳过登录页面和第一次提交）；否则返回 None"""
+    if not Config.ADAPTIVE_LOGIN or not Config.use_saved_sessions():
+        return None
+    try:
+        variant, captcha_page_url = get_session_store().load_login_path(account, Config.LOGIN_PATH_TTL_HOURS * 3600)
+    except Exception as e:
+        (log or logger).warning(f"读取登录方式失败: {e}")
+        return None
+    # 论坛地址改变后（如切换到本地模拟论坛）记住的地址不再适用
+    if variant != LOGIN_VARIANT_REDIRECT or not captcha_page_url or not captcha_page_url.startswith(Config.BASE_URL):
+        return None
+    return captcha_page_url
+
+
+def remember_login_path(account, variant, captcha_page_url=None, log=None):
+    """登录成功后记住本次的登录方式（CI 环境未配置会话包时不落盘）"""
+    if not Config.ADAPTIVE_LOGIN or not Config.use_saved_sessions():
+        return
+    try:
+        get_session_store().save_login_path(account, variant, captcha_page_url)
+    except Exception as e:
+        (log or logger).warning(f"保存登录方式失败: {e}")
+
+
+def forget_login_path(account, log=None):
+    """记住的验证码页面失效时删除，下次走完整登录流程"""
+    try:
+        get_session_store().clear_login_path(account)
+    except Exception as e:
+        (log or logger).warning(f"删除登录方式失败: {e}")
+
+
+# ==================== 论坛日期 ====================
+
+def get_forum_timezone():
+    """论坛时区；系统缺少时区数据时按 UTC+8 处理"""
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(Config.FORUM_TIMEZONE)
+    except Exception:
+        return timezone(timedelta(hours=8))
+
+
+def forum_now():
+    """论坛时区的当前时间"""
+    return datetime.now(get_forum_timezone())
+
+
+def forum_today():
+    """论坛时区的当前日期（YYYY-MM-DD）"""
+    return forum_now().date().isoformat()
+
+
+# ==================== 签到台账 ====================
+
+class RunLedger:
+    """按 (论坛日期, 账号) 记录签到成功的SQLite台账，同时保存当时解析到的签到信息"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.LEDGER_DB
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS ledger ('
+                        'day TEXT NOT NULL, '
+                        'account TEXT NOT NULL, '
+                        'status TEXT NOT NULL, '
+                        'sign_info TEXT, '
+                        'signed_at REAL NOT NULL, '
+                        'PRIMARY KEY (day, account))'
+                    )
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def get(self, day, account):
+        """读取账号某天的签到记录，没有记录时返回 None"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT status, sign_info, signed_at FROM ledger WHERE day = ? AND account = ?', (day, account)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {'status': row[0], 'sign_info': json.loads(row[1]) if row[1] else {}, 'signed_at': row[2]}
+
+    def record(self, day, account, status, sign_info=None):
+        """记录账号某天签到成功（同一天重复记录时覆盖）"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO ledger (day, account, status, sign_info, signed_at) VALUES (?, ?, ?, ?, ?)',
+                    (day, account, status, json.dumps(sign_info or {}, ensure_ascii=False), time.time())
+                )
+        finally:
+            conn.close()
+
+
+_run_ledger = None
+
+
+def get_run_ledger():
+    """获取进程内共享的签到台账，未开启时返回 None"""
+    global _run_ledger
+    if not Config.RUN_LEDGER:
+        return None
+    if _run_ledger is None:
+        _run_ledger = RunLedger()
+    return _run_ledger
+
+
+def find_ledger_entry(account, log=None):
+    """台账中今天已签到成功时返回记录；开启了在线确认或没有记录时返回 None"""
+    ledger = get_run_ledger()
+    if ledger is None or Config.LEDGER_VERIFY:
+        return None
+    try:
+        return ledger.get(forum_today(), account)
+    except Exception as e:
+        (log or logger).warning(f"读取签到台账失败: {e}")
+        return None
+
+
+def record_ledger_entry(account, status, sign_info, log=None):
+    """在台账中记录今天签到成功"""
+    ledger = get_run_ledger()
+    if ledger is None:
+        return
+    try:
+        ledger.record(forum_today(), account, status, sign_info)
+    except Exception as e:
+        (log or logger).warning(f"写入签到台账失败: {e}")
+
+
+# ==================== 通知 ====================
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def build_notify_channels():
+    """按配置创建通知渠道"""
+    channels = []
+    if Config.IYUU_TOKEN.strip():
+        channels.append(IyuuChannel(Config.get_iyuu_url()))
+    if Config.NOTIFY_WEBHOOK_URL:
+        channels.append(WebhookChannel(Config.NOTIFY_WEBHOOK_URL))
+    if Config.SMTP_HOST and Config.SMTP_TO:
+        recipients = [address.strip() for address in Config.SMTP_TO.split(',') if address.strip()]
+        channels.append(SmtpChannel(Config.SMTP_HOST, Config.SMTP_PORT, Config.SMTP_FROM, recipients,
+                                    Config.SMTP_USER, Config.SMTP_PASSWORD, Config.SMTP_STARTTLS))
+    return channels
+
+
+def get_notifier():
+    """获取进程内共享的通知分发器（首次调用时启动发送线程，并在进程退出前等待发送完成）"""
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                policy = RetryPolicy(
+                    max_attempts=Config.NOTIFY_MAX_ATTEMPTS,
+                    base_delay=Config.NOTIFY_RETRY_DELAY,
+                    max_delay=Config.NOTIFY_RETRY_DELAY * 16,
+                    budget=0
+                )
+                notifier = NotificationDispatcher(build_notify_channels(), policy, logger,
+                                                  Config.NOTIFY_DIGEST_SIZE, Config.NOTIFY_FLUSH_TIMEOUT)
+                if not notifier.enabled:
+                    logger.warning("未配置通知渠道（IYUU_TOKEN / NOTIFY_WEBHOOK_URL / SMTP_HOST），不发送通知")
+                atexit.register(notifier.close)
+                _notifier = notifier
+    return _notifier
+
+
+# ==================== 签到历史 ====================
+
+_sign_history = None
+
+
+def get_sign_history():
+    """获取进程内共享的签到历史库，未开启时返回 None"""
+    global _sign_history
+    if not Config.SIGN_HISTORY:
+        return None
+    if _sign_history is None:
+        _sign_history = SignHistory(Config.HISTORY_DB)
+    return _sign_history
+
+
+def record_history_entry(account, success, status, sign_info, log=None):
+    """把一次运行的结果追加到签到历史"""
+    history = get_sign_history()
+    if history is None:
+        return
+    try:
+        history.record(forum_today(), account, success, status, sign_info)
+    except Exception as e:
+        (log or logger).warning(f"写入签到历史失败: {e}")
+
+
+# ==================== 百度OCR access_token 缓存 ====================
+
+# 百度API返回这些错误码时表示 access_token 无效或已过期
+TOKEN_INVALID_ERROR_CODES = (110, 111)
+# 百度API返回该错误码时表示超过QPS限制
+OCR_RATE_LIMIT_ERROR_CODES = (18,)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """跨进程文件锁（Linux/Mac 使用 fcntl，Windows 使用 msvcrt）"""
+    with open(path, 'a+') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class AccessTokenCache:
+    """进程内共享的 access_token 缓存：内存缓存在前，token_cache.json 在后
+
+    内存中的token有效时不读文件；过期后同一时间只有一个线程去刷新（single-flight），
+    刷新期间持有文件锁，其他进程会等待并直接读取刷新结果，不会重复请求或同时写文件。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.TOKEN_CACHE_FILE
+        self.refresh_lock = threading.Lock()
+        self._token = None
+        self._expires_time = 0
+
+    def peek(self):
+        """返回内存中未过期的token，没有时返回 None（不读文件）"""
+        if self._token and self._expires_time > time.time():
+            return self._token
+        return None
+
+    def load_file(self):
+        """从缓存文件读取未过期的token并更新内存缓存，没有时返回 None"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            token_data = json.load(f)
+        # 检查token是否过期（百度token有效期为30天）
+        if token_data.get('expires_time', 0) > time.time():
+            self._token = token_data.get('access_token')
+            self._expires_time = token_data['expires_time']
+            return self._token
+        return None
+
+    def store(self, access_token, expires_in):
+        """更新内存缓存，并原子地写入缓存文件"""
+        self._token = access_token
+        self._expires_time = time.time() + expires_in - 86400  # 提前一天过期
+        self._write_file()
+
+    def _write_file(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'access_token': self._token, 'expires_time': self._expires_time}, f)
+        os.replace(tmp_path, self.path)
+
+    def snapshot(self):
+        """返回未过期的token {'access_token', 'expires_time'}（用于会话包），没有时返回 None"""
+        if not (self.peek() or self.load_file()):
+            return None
+        return {'access_token': self._token, 'expires_time': self._expires_time}
+
+    def restore(self, snapshot):
+        """恢复会话包中的token：已过期或当前已有未过期的token时忽略"""
+        if not snapshot or snapshot.get('expires_time', 0) <= time.time() or self.peek():
+            return False
+        with self.refreshing():
+            self._token = snapshot['access_token']
+            self._expires_time = snapshot['expires_time']
+            self._write_file()
+        return True
+
+    def invalidate(self, access_token):
+        """百度API报告token无效时丢弃缓存，下次调用重新获取"""
+        if self._token != access_token:
+            return
+        self._token = None
+        self._expires_time = 0
+        try:
+            with file_lock(self.path + '.lock'):
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+        except OSError:
+            pass
+
+    @contextlib.contextmanager
+    def refreshing(self):
+        """刷新token的临界区：进程内互斥 + 跨进程文件锁"""
+        with self.refresh_lock, file_lock(self.path + '.lock'):
+            yield
+
+
+_token_cache = None
+_api_session = None
+_api_session_lock = threading.Lock()
+
+
+def get_token_cache():
+    """获取进程内共享的 access_token 缓存"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = AccessTokenCache()
+    return _token_cache
+
+
+# ==================== 会话包 ====================
+
+SESSION_BUNDLE_MAGIC = b'FNSB1'
+SESSION_BUNDLE_SALT_SIZE = 16
+SESSION_BUNDLE_KDF_ROUNDS = 200000
+
+
+def session_bundle_enabled():
+    """本次运行是否恢复和保存会话包（只在 CI 环境且配置了 SESSION_BUNDLE_KEY 时使用，本地直接使用会话库）"""
+    return Config.is_actions_env() and bool(Config.SESSION_BUNDLE_KEY)
+
+
+def _session_bundle_cipher(salt):
+    """由 SESSION_BUNDLE_KEY 和随机盐派生 Fernet 密钥（PBKDF2-SHA256）"""
+    import hashlib
+    from cryptography.fernet import Fernet
+
+    key = hashlib.pbkdf2_hmac('sha256', Config.SESSION_BUNDLE_KEY.encode('utf-8'), salt, SESSION_BUNDLE_KDF_ROUNDS)
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def encrypt_session_bundle(payload):
+    """加密会话包内容，返回 文件标识 + 随机盐 + Fernet 密文（AES-CBC + HMAC）"""
+    salt = os.urandom(SESSION_BUNDLE_SALT_SIZE)
+    return SESSION_BUNDLE_MAGIC + salt + _session_bundle_cipher(salt).encrypt(json.dumps(payload).encode('utf-8'))
+
+
+def decrypt_session_bundle(data):
+    """解密会话包；不是会话包文件、密钥不正确或内容被篡改时抛出 ValueError"""
+    from cryptography.fernet import InvalidToken
+
+    if not data.startswith(SESSION_BUNDLE_MAGIC):
+        raise ValueError("不是会话包文件")
+    offset = len(SESSION_BUNDLE_MAGIC) + SESSION_BUNDLE_SALT_SIZE
+    try:
+        plaintext = _session_bundle_cipher(data[len(SESSION_BUNDLE_MAGIC):offset]).decrypt(data[offset:])
+    except InvalidToken:
+        raise ValueError("会话包解密失败（SESSION_BUNDLE_KEY 不正确或文件已损坏）") from None
+    return json.loads(plaintext)
+
+
+def restore_session_bundle(log=None):
+    """CI 运行开始时从会话包恢复会话库和 access_token 缓存，返回是否恢复成功
+
+    没有会话包（第一次运行或缓存已过期）或恢复失败时各账号使用账号密码登录，运行结束后保存新的会话包；
+    未安装 cryptography 时关闭会话包，行为与未配置 SESSION_BUNDLE_KEY 相同。
+    """
+    if not session_bundle_enabled():
+        return False
+    log = log or logger
+    try:
+        import cryptography  # noqa: F401
+    except ImportError:
+        log.warning("未安装 cryptography（pip install cryptography），不使用会话包，每次使用账号密码登录")
+        Config.SESSION_BUNDLE_KEY = ''
+        return False
+    if not os.path.exists(Config.SESSION_BUNDLE_FILE):
+        log.info("没有找到会话包，本次使用账号密码登录，运行结束后保存会话包")
+        return False
+    try:
+        with open(Config.SESSION_BUNDLE_FILE, 'rb') as f:
+            payload = decrypt_session_bundle(f.read())
+        get_session_store().import_rows(payload)
+        get_token_cache().restore(payload.get('token'))
+    except Exception as e:
+        log.warning(f"恢复会话包失败，本次使用账号密码登录: {e}")
+        return False
+    age_hours = (time.time() - payload.get('created_at', 0)) / 3600
+    log.info(f"已从会话包恢复 {len(payload.get('sessions', []))} 个账号的会话（{age_hours:.1f} 小时前保存）")
+    return True
+
+
+def save_session_bundle(log=None):
+    """CI 运行结束时把会话库和 access_token 缓存加密写入会话包，返回是否保存成功"""
+    if not session_bundle_enabled():
+        return False
+    log = log or logger
+    try:
+        payload = get_session_store().export_rows()
+        payload.update(version=1, created_at=time.time(), token=get_token_cache().snapshot())
+        data = encrypt_session_bundle(payload)
+        os.makedirs(os.path.dirname(Config.SESSION_BUNDLE_FILE) or '.', exist_ok=True)
+        tmp_path = f"{Config.SESSION_BUNDLE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, Config.SESSION_BUNDLE_FILE)
+    except Exception as e:
+        log.warning(f"保存会话包失败: {e}")
+        return False
+    log.info(f"会话包已保存: {Config.SESSION_BUNDLE_FILE}（{len(payload['sessions'])} 个账号）")
+    return True
+
+
+def new_http_session(pool_maxsize=None):
+    """创建 requests 会话；requests 在第一次需要发送请求时才导入，只导入本模块或台账跳过时不加载"""
+    import requests
+
+    session = requests.Session()
+    if pool_maxsize:
+        from requests.adapters import HTTPAdapter
+
+        adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    return session
+
+
+def get_api_session():
+    """获取百度OCR等第三方接口共用的连接池会话（不同账号共享，不携带论坛Cookie）"""
+    global _api_session
+    if _api_session is None:
+        with _api_session_lock:
+            if _api_session is None:
+                _api_session = new_http_session(max(Config.BATCH_CONCURRENCY, 10))
+    return _api_session
+
+
+_host_guards = {}
+_host_guards_lock = threading.Lock()
+
+
+def get_host_guard(url):
+    """获取论坛或百度OCR主机共享的限速器和熔断器，其他主机返回 None"""
+    host = urllib.parse.urlsplit(url).netloc
+    guard = _host_guards.get(host)
+    if guard is not None:
+        return guard
+    if host == urllib.parse.urlsplit(Config.BASE_URL).netloc:
+        rate, burst = Config.FORUM_RATE_LIMIT, Config.FORUM_RATE_BURST
+    elif host in (urllib.parse.urlsplit(Config.CAPTCHA_API_URL).netloc, urllib.parse.urlsplit(Config.TOKEN_URL).netloc):
+        rate, burst = Config.OCR_RATE_LIMIT, Config.OCR_RATE_BURST
+    else:
+        return None
+    with _host_guards_lock:
+        if host not in _host_guards:
+            _host_guards[host] = HostGuard(host, rate, burst, Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS, logger)
+        return _host_guards[host]
+
+
+def guarded_request(session, method, url, remaining=None, **kwargs):
+    """经过主机限速器和熔断器发送请求；remaining 为调用方剩余的时间预算（秒）"""
+    guard = get_host_guard(url)
+    if guard is None:
+        return session.request(method, url, **kwargs)
+    guard.wait(remaining)
+    try:
+        response = session.request(method, url, **kwargs)
+    except Exception:
+        guard.record_failure()
+        raise
+    except BaseException:
+        # KeyboardInterrupt 等不是主机故障，只释放半开状态下的探测名额，否则探测名额一直被占用
+        guard.breaker.release_probe()
+        raise
+    guard.record_status(response.status_code)
+    return response
+
+
+def get_baidu_access_token(log=None):
+    """获取百度API的access_token：内存缓存 -> 文件缓存 -> 请求新token
+
+    多个账号同时需要刷新时只会发出一个请求，其余调用等待并复用刷新结果。
+    只尝试一次，请求失败时抛出异常，由调用方的重试策略决定是否重试。
+    """
+    log = log or logger
+    cache = get_token_cache()
+    access_token = cache.peek()
+    if access_token:
+        return access_token
+
+    with cache.refreshing():
+        # 等待锁期间可能已被其他线程或进程刷新
+        access_token = cache.peek()
+        if access_token:
+            return access_token
+        try:
+            access_token = cache.load_file()
+            if access_token:
+                log.info("使用缓存的access_token")
+                return access_token
+            log.info("没有可用的缓存access_token，重新获取")
+        except Exception as e:
+            log.warning(f"读取token缓存文件失败: {e}")
+
+        params = {
+            "grant_type": "client_credentials",
+            "client_id": Config.API_KEY,
+            "client_secret": Config.SECRET_KEY
+        }
+        response = guarded_request(get_api_session(), 'POST', Config.TOKEN_URL, params=params, timeout=Config.REQUEST_TIMEOUT)
+        check_status(response.status_code, "获取access_token失败", response.headers.get('Retry-After'))
+        result = response.json() if response.status_code == 200 else {}
+        access_token = result.get("access_token")
+        if not access_token:
+            if result.get("error") in ('invalid_client', 'unauthorized_client'):
+                raise StepFailed(CREDENTIALS_WRONG, f"获取access_token失败: {result.get('error_description') or result.get('error')}")
+            raise StepFailed(BAD_RESPONSE, f"获取access_token失败，状态码: {response.status_code}")
+        expires_in = result.get("expires_in", 2592000)  # 默认30天
+        try:
+            cache.store(access_token, expires_in)
+            log.info("access_token已缓存")
+        except Exception as e:
+            log.warning(f"缓存access_token失败: {e}")
+        return access_token
+
+
+_prefetch_executor = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def should_prefetch_access_token():
+    """是否需要提前获取 access_token：内存中没有、配置了百度API密钥，并且没有本地识别引擎
+    （有本地引擎时大多不需要调用百度OCR，等本地识别置信度不足后再获取）"""
+    if get_token_cache().peek() or not (Config.API_KEY and Config.SECRET_KEY):
+        return False
+    return get_local_recognizer() is None
+
+
+def prefetch_access_token(log=None):
+    """需要提前获取 access_token 时（见 should_prefetch_access_token），在后台线程中获取（与下载验证码图片同时进行），
+    返回 Future；不需要提前获取时返回 None"""
+    global _prefetch_executor
+    if not should_prefetch_access_token():
+        return None
+    if _prefetch_executor is None:
+        with _prefetch_executor_lock:
+            if _prefetch_executor is None:
+                _prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-prefetch')
+    return _prefetch_executor.submit(get_baidu_access_token, log)
+
+
+# ==================== 本地验证码识别 ====================
+
+_local_recognizer = None
+_local_recognizer_loaded = False
+_local_recognizer_lock = threading.Lock()
+
+
+def get_local_recognizer():
+    """获取进程内共享的本地验证码识别引擎，未配置或不可用时返回 None"""
+    global _local_recognizer, _local_recognizer_loaded
+    if not _local_recognizer_loaded:
+        with _local_recognizer_lock:
+            if not _local_recognizer_loaded:
+                try:
+                    _local_recognizer = create_recognizer(Config.CAPTCHA_LOCAL_ENGINE, Config.CAPTCHA_TEMPLATE_FILE)
+                    if _local_recognizer:
+                        logger.info(f"本地验证码识别引擎: {_local_recognizer.name}")
+                except Exception as e:
+                    logger.warning(f"本地验证码识别引擎不可用，将只使用百度OCR: {type(e).__name__}: {e}")
+                _local_recognizer_loaded = True
+    return _local_recognizer
+
+
+def recognize_captcha_locally(image_bytes, log=None):
+    """使用本地引擎识别验证码，返回 (识别结果, 置信度)；置信度低于 CAPTCHA_LOCAL_MIN_CONFIDENCE 时识别结果为 None"""
+    log = log or logger
+    recognizer = get_local_recognizer()
+    if recognizer is None:
+        return None, 0.0
+    with step_timer('ocr_local', log) as span:
+        try:
+            captcha_text, confidence = recognizer.recognize(image_bytes)
+        except Exception as e:
+            span.outcome = 'error'
+            log.warning(f"本地验证码识别出错: {type(e).__name__}: {e}")
+            return None, 0.0
+        if not (captcha_text and confidence >= Config.CAPTCHA_LOCAL_MIN_CONFIDENCE):
+            span.outcome = 'low_confidence'
+    elapsed_ms = span.elapsed * 1000
+    if span.outcome == 'ok':
+        log.info(f"本地验证码识别成功({recognizer.name}): {captcha_text}，置信度 {confidence:.2f}，耗时 {elapsed_ms:.1f}ms")
+        return captcha_text, confidence
+    log.info(f"本地验证码识别置信度不足({recognizer.name}): {captcha_text}，置信度 {confidence:.2f}，改用百度OCR")
+    return None, confidence
+
+
+def build_ocr_payload(image_bytes):
+    """构建百度OCR请求体（bytes）：图片Base64后只转义 + / = 三个字符，不再先解码成字符串再整体URL编码；
+    detect_direction / paragraph / probability 都使用接口默认值 false，不再发送"""
+    captcha_base64 = base64.b64encode(image_bytes)
+    return b'image=' + captcha_base64.replace(b'+', b'%2B').replace(b'/', b'%2F').replace(b'=', b'%3D')
+
+
+def prepare_ocr_image(image_bytes, log=None):
+    """上传百度OCR前预处理验证码图片（见 fnclub_captcha.preprocess_image），关闭或处理失败时返回原图"""
+    if not Config.OCR_PREPROCESS:
+        return image_bytes
+    try:
+        return preprocess_image(image_bytes) or image_bytes
+    except ImportError:
+        return image_bytes
+    except Exception as e:
+        (log or logger).warning(f"验证码图片预处理失败，上传原图: {type(e).__name__}: {e}")
+        return image_bytes
+
+
+def ocr_endpoint_url(endpoint):
+    """百度OCR接口地址（与 CAPTCHA_API_URL 在同一路径下，只替换最后的接口名）"""
+    return Config.CAPTCHA_API_URL.rsplit('/', 1)[0] + '/' + endpoint
+
+
+def request_baidu_ocr(image_bytes, access_token, endpoint='accurate_basic'):
+    """调用百度OCR识别验证码图片，返回响应对象"""
+    url = f"{ocr_endpoint_url(endpoint)}?access_token={access_token}"
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Accept': 'application/json'
+    }
+    with step_timer('ocr_baidu') as span:
+        response = guarded_request(get_api_session(), 'POST', url, headers=headers, data=build_ocr_payload(image_bytes), timeout=Config.REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            span.outcome = 'fail'
+    return response
+
+
+def accept_ocr_result(endpoint, result, access_token, last, log=None):
+    """检查一级百度OCR的响应，返回识别结果；不符合验证码长度和字符集、且还有下一级接口时返回 None
+
+    接口返回错误时：access_token 无效或触发频率限制直接抛出（换接口也没用），
+    其他错误（如应用未开通该接口）在还有下一级时换下一级，最后一级时抛出。
+    """
+    captcha_text = parse_ocr_words(result)
+    if captcha_text is None:
+        error_code = result.get('error_code')
+        if last or error_code in TOKEN_INVALID_ERROR_CODES or error_code in OCR_RATE_LIMIT_ERROR_CODES:
+            raise_for_ocr_error(result, access_token)
+        (log or logger).info(f"百度OCR {endpoint} 未返回识别结果（{error_code}, {result.get('error_msg')}），改用下一级接口")
+        return None
+    if normalize_text(captcha_text) or last:
+        return captcha_text
+    (log or logger).info(f"百度OCR {endpoint} 的识别结果 {captcha_text} 不符合验证码规则，改用下一级接口")
+    return None
+
+
+def raise_for_ocr_error(result, access_token):
+    """百度OCR未返回识别结果时抛出 StepFailed；access_token 无效时同时丢弃缓存"""
+    if 'error_code' in result:
+        error_code = result.get('error_code')
+        if error_code in TOKEN_INVALID_ERROR_CODES:
+            get_token_cache().invalidate(access_token)
+        kind = RATE_LIMITED if error_code in OCR_RATE_LIMIT_ERROR_CODES else BAD_RESPONSE
+        raise StepFailed(kind, f"验证码识别API返回错误: {error_code}, {result.get('error_msg')}")
+    raise StepFailed(BAD_RESPONSE, f"验证码识别API返回格式异常: {result}")
+
+
+class BaiduRecognizer:
+    """百度OCR识别，接口与 fnclub_captcha 中的本地引擎一致（用于语料回放基准）"""
+
+    name = 'baidu'
+    # 最近一次识别调用百度OCR接口的次数（分级调用时可能大于 1）
+    last_calls = 0
+
+    def recognize(self, image_bytes):
+        self.last_calls = 0
+        try:
+            access_token = get_baidu_access_token()
+        except Exception:
+            return None, 0.0
+        image_bytes = prepare_ocr_image(image_bytes)
+        for index, endpoint in enumerate(Config.OCR_ENDPOINTS):
+            last = index == len(Config.OCR_ENDPOINTS) - 1
+            self.last_calls += 1
+            response = request_baidu_ocr(image_bytes, access_token, endpoint)
+            if response.status_code != 200:
+                return None, 0.0
+            try:
+                captcha_text = accept_ocr_result(endpoint, response.json(), access_token, last)
+            except StepFailed:
+                return None, 0.0
+            if captcha_text is not None:
+                return captcha_text, 1.0 if normalize_text(captcha_text) else 0.0
+        return None, 0.0
+
+
+# ==================== 验证码语料 ====================
+
+_captcha_corpus = None
+
+
+def get_captcha_corpus():
+    """获取验证码语料库，未开启时返回 None"""
+    global _captcha_corpus
+    if not Config.CAPTCHA_CORPUS:
+        return None
+    if _captcha_corpus is None:
+        _captcha_corpus = CaptchaCorpus(Config.CAPTCHA_CORPUS_DIR)
+    return _captcha_corpus
+
+
+def captcha_accepted(login_result):
+    """根据登录结果判断验证码是否被论坛接受，无法判断时返回 None
+
+    Discuz 先校验验证码再校验密码，提示密码错误说明验证码已经通过。
+    """
+    if login_result in (LOGIN_RESULT_SUCCESS, LOGIN_RESULT_CREDENTIALS_WRONG):
+        return True
+    if login_result == LOGIN_RESULT_CAPTCHA_WRONG:
+        return False
+    return None
+
+
+def record_captcha_attempt(attempt, login_result, account='', log=None):
+    """把一次验证码识别及其登录结果写入语料库"""
+    corpus = get_captcha_corpus()
+    if corpus is None or attempt is None:
+        return
+    try:
+        corpus.add(attempt['image'], attempt['engine'], attempt['text'], attempt['latency_ms'],
+                   captcha_accepted(login_result), attempt.get('confidence'), account)
+    except Exception as e:
+        (log or logger).warning(f"记录验证码语料失败: {type(e).__name__}: {e}")
+
+
+# ==================== 重试策略 ====================
+
+def get_retry_policy():
+    """按当前配置构造重试策略"""
+    return RetryPolicy(
+        max_attempts=Config.MAX_RETRIES,
+        base_delay=Config.RETRY_DELAY,
+        max_delay=Config.RETRY_MAX_DELAY,
+        budget=Config.ACCOUNT_TIME_BUDGET
+    )
+
+
+class AccountLoggerAdapter(logging.LoggerAdapter):
+    """为日志记录带上账号标识（文本日志显示为前缀，JSON 日志为 account 字段），便于区分批量模式下并发账号的日志"""
+    def process(self, msg, kwargs):
+        kwargs['extra'] = dict(self.extra, **kwargs.get('extra', {}))
+        return msg, kwargs
+
+
 class FNSignIn:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8'
-        })
-        
-        # 本地环境默认优先使用 Cookie；Actions/CI 环境下不加载本地 Cookie，强制走账号密码登录
-        if not Config.is_actions_env():
-            self.load_cookies()
+    def __init__(self, username=None, password=None, cookie_file=None):
+        # 账号信息：未指定时使用环境变量中的单账号配置
+        self.username = username if username is not None else Config.USERNAME
+        self.password = password if password is not None else Config.PASSWORD
+        self.cookie_file = cookie_file or Config.COOKIE_FILE
+        # 最近一次 run() 的结果描述，供批量模式汇总
+        self.status = ''
+        # 最近一次解析的签到页面快照
+        self.sign_page = None
+        # 最近一次请求签到页面时是否发现未登录
+        self.sign_page_logged_out = False
+        # 最近一次提交的验证码识别记录，登录结果确定后写入验证码语料
+        self.captcha_attempt = None
+        # 会话最近一次被确认有效的时间（来自会话库）
+        self.session_verified_at = None
+
+        # 批量模式下为每个账号加上日志前缀；单账号模式保持原有日志格式
+        if username is not None:
+            self.logger = AccountLoggerAdapter(logger, {'account': self.username})
         else:
-            logger.info("检测到 CI / GitHub Actions 环境：跳过本地 Cookie 加载，每次使用环境变量重新登录")
-    
+            self.logger = logger
+
+        # 各步骤的重试和单账号时间预算
+        self.retrier = Retrier(get_retry_policy(), self.logger)
+
+        # 论坛会话在第一次在线请求前才创建（台账显示已签到时不需要导入 requests）
+        self._session = None
+
+    @property
+    def session(self):
+        """论坛会话：第一次访问时创建并加载Cookie"""
+        return self.open_session()
+
+    def open_session(self):
+        """创建论坛会话并加载Cookie（同时读出会话最近一次被确认有效的时间），已创建时直接返回"""
+        if self._session is None:
+            self._session = new_http_session()
+            self._session.headers.update(BROWSER_HEADERS)
+
+            # 本地环境默认优先使用 Cookie；Actions/CI 环境下未配置会话包时不加载本地 Cookie，强制走账号密码登录
+            if Config.use_saved_sessions():
+                self.load_cookies()
+            else:
+                self.logger.info("检测到 CI / GitHub Actions 环境且未配置 SESSION_BUNDLE_KEY：跳过本地 Cookie 加载，每次使用环境变量重新登录")
+        return self._session
+
+    def _request(self, step, method, url, **kwargs):
+        """发送论坛请求，并记录步骤、状态码、耗时和响应字节数"""
+        kwargs.setdefault('timeout', Config.REQUEST_TIMEOUT)
+        start_time = time.perf_counter()
+        response = guarded_request(self.session, method, url, self.retrier.remaining(), **kwargs)
+        log_http_step(self.logger, step, response.status_code, start_time, len(response.content))
+        check_status(response.status_code, f"{step} 请求失败", response.headers.get('Retry-After'))
+        return response
+
+    def step_failed(self, step, body, message, kind=BAD_RESPONSE):
+        """保存响应内容到失败现场目录，返回交给重试策略处理的 StepFailed"""
+        try:
+            path = save_failure_artifact(step, body, self.username)
+        except Exception as e:
+            return StepFailed(kind, f"{message}（保存响应内容失败: {e}）")
+        return StepFailed(kind, f"{message}，响应内容已保存: {path}", artifact=path)
+
     def load_cookies(self):
-        """从文件加载Cookie"""
-        if os.path.exists(Config.COOKIE_FILE):
-            try:
-                with open(Config.COOKIE_FILE, 'r') as f:
-                    cookies_list = json.load(f)
-                    
-                    # 检查是否为新格式的Cookie列表
-                    if isinstance(cookies_list, list) and len(cookies_list) > 0 and 'name' in cookies_list[0]:
-                        # 新格式：包含完整Cookie属性的列表
-                        for cookie_dict in cookies_list:
-                            self.session.cookies.set(
-                                cookie_dict['name'],
-                                cookie_dict['value'],
-                                domain=cookie_dict.get('domain'),
-                                path=cookie_dict.get('path')
-                            )
-                    else:
-                        # 旧格式：简单的名称-值字典
-                        self.session.cookies.update(cookies_list)
-                        
-                logger.info("已从文件加载Cookie")
-                return True
-            except Exception as e:
-                logger.error(f"加载Cookie失败: {e}")
+        """从会话库加载未过期的Cookie，会话库中没有时尝试导入旧版Cookie文件"""
+        try:
+            cookies_list, self.session_verified_at = get_session_store().load(self.username)
+            if cookies_list is None:
+                cookies_list = load_legacy_cookie_file(self.cookie_file)
+                if cookies_list is None:
+                    return False
+                self.logger.info("已导入旧版Cookie文件，下次保存时将写入会话库")
+
+            for cookie_dict in cookies_list:
+                self.session.cookies.set(
+                    cookie_dict['name'],
+                    cookie_dict['value'],
+                    domain=cookie_dict.get('domain'),
+                    path=cookie_dict.get('path')
+                )
+            self.logger.info("已从会话库加载Cookie")
+            return True
+        except Exception as e:
+            self.logger.error(f"加载Cookie失败: {e}")
         return False
-    
+
     def save_cookies(self):
-        """保存Cookie到文件"""
+        """保存Cookie到会话库（登录成功后调用，同时记录会话验证时间）"""
         try:
             # 保存完整的Cookie信息，包括域名、路径等属性
             cookies_list = []
@@ -175,855 +1655,646 @@ class FNSignIn:
                     'secure': cookie.secure
                 }
                 cookies_list.append(cookie_dict)
-            
-            with open(Config.COOKIE_FILE, 'w') as f:
-                json.dump(cookies_list, f)
-            logger.info("Cookie已保存到文件")
+
+            get_session_store().save(self.username, cookies_list, verified=True)
+            self.session_verified_at = time.time()
+            self.logger.info("Cookie已保存到会话库")
             return True
         except Exception as e:
-            logger.error(f"保存Cookie失败: {e}")
+            self.logger.error(f"保存Cookie失败: {e}")
             return False
-    
+
+    def mark_session_verified(self):
+        """记录当前会话已被确认有效（CI 环境未配置会话包时不落盘）"""
+        if not Config.use_saved_sessions():
+            return
+        try:
+            get_session_store().mark_verified(self.username)
+            self.session_verified_at = time.time()
+        except Exception as e:
+            self.logger.warning(f"更新会话验证时间失败: {e}")
+
+    @traced('check_login_status')
     def check_login_status(self):
         """检查登录状态"""
         try:
-            response = self.session.get(Config.BASE_URL, timeout=Config.REQUEST_TIMEOUT)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 检查是否存在登录链接，如果存在则表示未登录
-            login_links = soup.select('a[href*="member.php?mod=logging&action=login"]')
-            
-            # 检查页面内容是否包含用户名
-            username_in_page = Config.USERNAME in response.text
-            
-            # 检查是否有个人中心链接
-            user_center_links = soup.select('a[href*="home.php?mod=space"]')
-            
-            # 检查是否有退出登录链接（更可靠的已登录标识）
-            logout_links = soup.select('a[href*="member.php?mod=logging&action=logout"]')
-            
-            # 输出详细的登录状态检测信息
-            logger.debug(f"登录状态检测: 登录链接数量={len(login_links)}, 退出链接数量={len(logout_links)}, 用户名在页面中={username_in_page}, 个人中心链接数量={len(user_center_links)}")
-            
-            # 如果有退出链接，或者（没有登录链接且（有个人中心链接或用户名在页面中）），则认为已登录
-            if len(logout_links) > 0 or ((len(login_links) == 0 or username_in_page) and len(user_center_links) > 0):
-                logger.info("Cookie有效，已登录状态")
+            response = self._request('check_login', 'GET', Config.BASE_URL)
+            if parse_login_status(response.text, self.username):
+                self.logger.info("Cookie有效，已登录状态")
                 return True
             else:
-                logger.info("Cookie无效或已过期，需要重新登录")
+                self.logger.info("Cookie无效或已过期，需要重新登录")
                 return False
-        except requests.exceptions.Timeout:
-            logger.error(f"检查登录状态失败: 请求超时（超过{Config.REQUEST_TIMEOUT}秒）")
-            return False
-        except requests.exceptions.ConnectionError:
-            logger.error(f"检查登录状态失败: 网络连接错误，请检查网络连接")
-            return False
         except Exception as e:
-            logger.error(f"检查登录状态失败: {type(e).__name__}: {e}")
+            kind = classify_error(e)
+            if kind == TIMEOUT:
+                self.logger.error(f"检查登录状态失败: 请求超时（超过{Config.REQUEST_TIMEOUT}秒）")
+            elif kind == CONNECTION:
+                self.logger.error("检查登录状态失败: 网络连接错误，请检查网络连接")
+            else:
+                self.logger.error(f"检查登录状态失败: {type(e).__name__}: {e}")
             return False
     
-    def get_access_token(self):
-        """获取百度API的access_token，带缓存功能"""
-        try:
-            # 检查是否有缓存的token
-            if os.path.exists(Config.TOKEN_CACHE_FILE):
-                try:
-                    with open(Config.TOKEN_CACHE_FILE, 'r') as f:
-                        token_data = json.load(f)
-                        # 检查token是否过期（百度token有效期为30天）
-                        if token_data.get('expires_time', 0) > time.time():
-                            logger.info("使用缓存的access_token")
-                            return token_data.get('access_token')
-                        else:
-                            logger.info("缓存的access_token已过期，重新获取")
-                except Exception as e:
-                    logger.warning(f"读取token缓存文件失败: {e}")
-            
-            # 获取新token
-            url = "https://aip.baidubce.com/oauth/2.0/token"
-            params = {
-                "grant_type": "client_credentials", 
-                "client_id": Config.API_KEY, 
-                "client_secret": Config.SECRET_KEY
-            }
-            
-            # 添加重试机制
-            for retry in range(Config.MAX_RETRIES):
-                try:
-                    response = requests.post(url, params=params)
-                    if response.status_code == 200:
-                        result = response.json()
-                        access_token = str(result.get("access_token"))
-                        expires_in = result.get("expires_in", 2592000)  # 默认30天
-                        
-                        # 缓存token
-                        token_cache = {
-                            'access_token': access_token,
-                            'expires_time': time.time() + expires_in - 86400  # 提前一天过期
-                        }
-                        try:
-                            with open(Config.TOKEN_CACHE_FILE, 'w') as f:
-                                json.dump(token_cache, f)
-                            logger.info("access_token已缓存")
-                        except Exception as e:
-                            logger.warning(f"缓存access_token失败: {e}")
-                        
-                        return access_token
-                    else:
-                        logger.error(f"获取access_token失败，状态码: {response.status_code}，重试({retry+1}/{Config.MAX_RETRIES})")
-                        if retry < Config.MAX_RETRIES - 1:
-                            time.sleep(Config.RETRY_DELAY)
-                except Exception as e:
-                    logger.error(f"获取access_token请求异常: {e}，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-            
-            logger.error(f"获取access_token失败，已达到最大重试次数({Config.MAX_RETRIES})")
-            return None
-        except Exception as e:
-            logger.error(f"获取access_token过程发生错误: {e}")
-            return None
-    
-    def recognize_captcha(self, captcha_url):
-        """识别验证码，带重试机制"""
-        for retry in range(Config.MAX_RETRIES):
+    @traced('get_access_token')
+    def get_access_token(self, prefetched=None):
+        """获取百度API的access_token（进程内共享缓存，详见 get_baidu_access_token）
+
+        prefetched 为 prefetch_access_token() 返回的 Future，提前获取失败时再按重试策略获取。
+        """
+        if prefetched is not None:
             try:
-                # 下载验证码图片
-                captcha_response = self.session.get(captcha_url, timeout=Config.REQUEST_TIMEOUT)
-                if captcha_response.status_code != 200:
-                    logger.error(f"下载验证码图片失败，状态码: {captcha_response.status_code}，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return None
-                
-                # 将图片转换为Base64编码
-                captcha_base64 = base64.b64encode(captcha_response.content).decode('utf-8')
-                
-                # 获取access_token
-                access_token = self.get_access_token()
-                if not access_token:
-                    logger.error(f"获取百度API access_token失败，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return None
-                    
-                # 构建API请求URL
-                url = f"{Config.CAPTCHA_API_URL}?access_token={access_token}"
-                
-                # 构建请求参数
-                payload = f'image={urllib.parse.quote_plus(captcha_base64)}&detect_direction=false&paragraph=false&probability=false'
-                
-                # 设置请求头
-                headers = {
-                    'Content-Type': 'application/x-www-form-urlencoded',
-                    'Accept': 'application/json'
-                }
-                
-                # 发送请求
-                api_response = requests.request("POST", url, headers=headers, data=payload.encode("utf-8"))
-                
-                if api_response.status_code != 200:
-                    logger.error(f"验证码识别API请求失败，状态码: {api_response.status_code}，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return None
-                
-                # 解析API响应
-                result = api_response.json()
-                if 'words_result' in result and len(result['words_result']) > 0:
-                    captcha_text = result['words_result'][0]['words']
-                    # 清理验证码文本，移除空格和特殊字符
-                    captcha_text = re.sub(r'[\s\W]+', '', captcha_text)
-                    logger.info(f"验证码识别成功: {captcha_text}")
-                    return captcha_text
-                elif 'error_code' in result:
-                    logger.error(f"验证码识别API返回错误: {result.get('error_code')}, {result.get('error_msg')}，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return None
-                else:
-                    logger.error(f"验证码识别API返回格式异常: {result}，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return None
+                return prefetched.result(timeout=self.retrier.remaining())
             except Exception as e:
-                logger.error(f"验证码识别过程发生错误: {e}，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return None
-        
-        logger.error(f"验证码识别失败，已达到最大重试次数({Config.MAX_RETRIES})")
-        return None
-    
+                self.logger.info(f"提前获取access_token失败，重新获取: {type(e).__name__}: {e}")
+        return self.retrier.call('get_access_token', '获取access_token', get_baidu_access_token, self.logger)
+
+    @traced('recognize_captcha')
+    def recognize_captcha(self, captcha_url):
+        """识别验证码，失败时按重试策略重试（在登录流程中由登录步骤统一重试）"""
+        return self.retrier.call('recognize_captcha', '验证码识别', self._recognize_captcha_once, captcha_url)
+
+    def _recognize_captcha_once(self, captcha_url):
+        """下载并识别一次验证码，失败时抛出异常"""
+        # 需要刷新 access_token 且没有本地识别引擎时，与下载验证码图片同时进行
+        token_future = prefetch_access_token(self.logger)
+
+        # 下载验证码图片
+        captcha_response = self._request('captcha_image', 'GET', captcha_url)
+        if captcha_response.status_code != 200:
+            raise StepFailed(BAD_RESPONSE, f"下载验证码图片失败，状态码: {captcha_response.status_code}")
+
+        # 优先本地识别，置信度不足时再调用百度OCR
+        start_time = time.perf_counter()
+        captcha_text, confidence = recognize_captcha_locally(captcha_response.content, self.logger)
+        if captcha_text:
+            self.captcha_attempt = {
+                'image': captcha_response.content,
+                'engine': get_local_recognizer().name,
+                'text': captcha_text,
+                'confidence': confidence,
+                'latency_ms': (time.perf_counter() - start_time) * 1000
+            }
+            return captcha_text
+
+        # 获取access_token
+        access_token = self.get_access_token(token_future)
+        if not access_token:
+            raise StepFailed(BAD_RESPONSE, "获取百度API access_token失败")
+
+        # 按 OCR_ENDPOINTS 分级调用，结果符合验证码规则时不再调用下一级
+        image_bytes = prepare_ocr_image(captcha_response.content, self.logger)
+        for index, endpoint in enumerate(Config.OCR_ENDPOINTS):
+            api_response = request_baidu_ocr(image_bytes, access_token, endpoint)
+            check_status(api_response.status_code, "验证码识别API请求失败", api_response.headers.get('Retry-After'))
+            if api_response.status_code != 200:
+                raise StepFailed(BAD_RESPONSE, f"验证码识别API请求失败，状态码: {api_response.status_code}")
+
+            # 解析API响应
+            last = index == len(Config.OCR_ENDPOINTS) - 1
+            captcha_text = accept_ocr_result(endpoint, api_response.json(), access_token, last, self.logger)
+            if captcha_text is not None:
+                break
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        self.logger.info(f"验证码识别成功({endpoint}): {captcha_text}，耗时 {latency_ms:.0f}ms")
+        self.captcha_attempt = {
+            'image': captcha_response.content,
+            'engine': f"{BaiduRecognizer.name}/{endpoint}",
+            'text': captcha_text,
+            'confidence': None,
+            'latency_ms': latency_ms
+        }
+        return captcha_text
+
+    @traced('login')
     def login(self):
-        """使用账号密码登录，带重试机制"""
-        for retry in range(Config.MAX_RETRIES):
-            try:
-                # 获取登录页面
-                response = self.session.get(Config.LOGIN_URL, timeout=Config.REQUEST_TIMEOUT)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # 获取登录表单信息
-                login_form = None
-                for form in soup.find_all('form'):
-                    form_id = form.get('id', '')
-                    if form_id and ('loginform' in form_id or 'lsform' in form_id):
-                        login_form = form
-                        break
-                    elif form.get('name') == 'login':
-                        login_form = form
-                        break
-                    elif form.get('action') and 'logging' in form.get('action'):
-                        login_form = form
-                        break
-                
-                if not login_form:
-                    # 尝试查找任何表单，可能是登录表单
-                    all_forms = soup.find_all('form')
-                    if all_forms:
-                        login_form = all_forms[0]  # 使用第一个表单
-                        logger.info(f"使用备选表单: ID={login_form.get('id')}, Action={login_form.get('action')}")
-                
-                if not login_form:
-                    logger.error(f"未找到登录表单，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return False
-                    
-                # 获取登录表单的action属性
-                form_action = login_form.get('action', '')
-                logger.info(f"找到登录表单: ID={form_id}, Action={form_action}")
-                
-                # 获取表单字段
-                formhash = soup.find('input', {'name': 'formhash'})
-                if not formhash:
-                    logger.error(f"未找到登录表单的formhash字段，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return False
-                
-                # 获取表单字段
-                formhash = formhash['value']
-                
-                # 获取用户名输入框ID
-                username_input = soup.find('input', {'name': 'username'})
-                username_id = username_input.get('id', '') if username_input else ''
-                
-                # 获取密码输入框ID
-                password_input = soup.find('input', {'name': 'password'})
-                password_id = password_input.get('id', '') if password_input else ''
-                
-                logger.info(f"找到用户名输入框ID: {username_id}")
-                logger.info(f"找到密码输入框ID: {password_id}")
-                
-                # 构建登录数据
-                login_data = {
-                    'formhash': formhash,
-                    'referer': Config.BASE_URL,
-                    'loginfield': 'username',
-                    'username': Config.USERNAME,
-                    'password': Config.PASSWORD,
-                    'questionid': '0',
-                    'answer': '',
-                    'cookietime': '2592000',  # 保持登录状态30天
-                    'loginsubmit': 'true'
-                }
-                
-                # 添加特定的表单字段
-                if username_id:
-                    login_data[username_id] = Config.USERNAME
-                if password_id:
-                    login_data[password_id] = Config.PASSWORD
-                
-                # 检查是否需要验证码
-                seccodeverify = soup.find('input', {'name': 'seccodeverify'})
-                
-                # 如果通过name没找到，尝试通过ID前缀查找
-                if not seccodeverify:
-                    inputs = soup.find_all('input')
-                    for inp in inputs:
-                        if inp.get('id', '').startswith('seccodeverify_'):
-                            seccodeverify = inp
-                            break
-                
-                if seccodeverify:
-                    logger.info("检测到需要验证码，尝试自动识别验证码")
-                    
-                    # 获取验证码ID
-                    seccode_id = seccodeverify.get('id', '').replace('seccodeverify_', '')
-                    
-                    # 获取验证码图片URL
-                    captcha_img = soup.find('img', {'src': re.compile(r'misc\.php\?mod=seccode')})
-                    if not captcha_img:
-                        logger.error(f"未找到验证码图片，重试({retry+1}/{Config.MAX_RETRIES})")
-                        if retry < Config.MAX_RETRIES - 1:
-                            time.sleep(Config.RETRY_DELAY)
-                            continue
-                        return False
-                    
-                    captcha_url = Config.BASE_URL + captcha_img['src']
-                    logger.info(f"验证码图片URL: {captcha_url}")
-                    
-                    # 识别验证码
-                    captcha_text = self.recognize_captcha(captcha_url)
-                    if not captcha_text:
-                        logger.error(f"验证码识别失败，重试({retry+1}/{Config.MAX_RETRIES})")
-                        if retry < Config.MAX_RETRIES - 1:
-                            time.sleep(Config.RETRY_DELAY)
-                            continue
-                        return False
-                    
-                    # 添加验证码到登录数据
-                    login_data['seccodeverify'] = captcha_text
-                    login_data['seccodehash'] = seccode_id
-            
-                # 更新请求头，模拟真实浏览器
-                self.session.headers.update({
-                    'Origin': Config.BASE_URL.rstrip('/'),
-                    'Referer': Config.LOGIN_URL,
-                    'Content-Type': 'application/x-www-form-urlencoded',
-                    'Upgrade-Insecure-Requests': '1'
-                })
-                
-                # 构建登录URL - 优先使用表单的action，如果没有则使用默认URL
-                if form_action and form_action.startswith('member.php'):
-                    # 如果action是相对路径，补全为完整URL
-                    if not form_action.startswith('http'):
-                        login_url = Config.BASE_URL + form_action
-                    else:
-                        login_url = form_action
-                else:
-                    # 使用默认登录URL
-                    login_url = f"{Config.LOGIN_URL}&loginsubmit=yes&inajax=1"
-                
-                # 发送登录请求
-                login_response = self.session.post(login_url, data=login_data, allow_redirects=True, timeout=Config.REQUEST_TIMEOUT)
-                
-                # 添加更多调试信息
-                logger.info(f"登录请求URL: {login_url}")
-                logger.debug(f"登录请求数据: {login_data}")
-                logger.info(f"登录响应状态码: {login_response.status_code}")
-                logger.info("=" * 80)
-                logger.info("【登录响应完整内容 - 开始】")
-                logger.info("=" * 80)
-                logger.info(login_response.text)
-                logger.info("=" * 80)
-                logger.info("【登录响应完整内容 - 结束】")
-                logger.info("=" * 80)
+        """使用账号密码登录，按重试策略重试（账号或密码错误时不重试）"""
+        return self.retrier.call('login', '登录', self._login_once, default=False)
 
-                
-                # 检查是否需要跳转到验证码页面
-                if '请输入验证码后继续登录' in login_response.text:
-                    logger.info("检测到需要跳转到验证码页面，正在提取跳转URL...")
-                    
-                    # 从JavaScript代码中提取跳转URL
-                    # 匹配 location.href='...' 或 location.href="..."
-                    url_match = re.search(r"location\.href=['\"]([^'\"]+)['\"]", login_response.text)
-                    if url_match:
-                        redirect_url = url_match.group(1)
-                        # 如果是相对路径，补全为完整URL
-                        if not redirect_url.startswith('http'):
-                            if redirect_url.startswith('/'):
-                                redirect_url = Config.BASE_URL.rstrip('/') + redirect_url
-                            else:
-                                redirect_url = Config.BASE_URL + redirect_url
-                        
-                        logger.info(f"提取到验证码页面URL: {redirect_url}")
-                        
-                        # 访问验证码页面
-                        captcha_page_response = self.session.get(redirect_url, timeout=Config.REQUEST_TIMEOUT)
-                        captcha_page_soup = BeautifulSoup(captcha_page_response.text, 'html.parser')
-                        
-                        # 查找验证码输入框
-                        seccodeverify = captcha_page_soup.find('input', {'name': 'seccodeverify'})
-                        seccode_id = None
-                        captcha_url = None
-                        
-                        # 如果通过name没找到，尝试通过ID前缀查找
-                        if not seccodeverify:
-                            logger.info("通过name未找到验证码输入框，尝试通过ID前缀查找...")
-                            inputs = captcha_page_soup.find_all('input')
-                            for inp in inputs:
-                                if inp.get('id', '').startswith('seccodeverify_'):
-                                    seccodeverify = inp
-                                    logger.info(f"通过ID前缀找到验证码输入框: {inp.get('id')}")
-                                    break
-                        
-                        # 如果还找不到输入框，尝试查找seccode span或script (处理JS渲染的情况)
-                        if not seccodeverify:
-                            logger.info("通过输入框未找到验证码，尝试查找seccode span或script...")
-                            # 尝试查找 <span id="seccode_xxxxx">
-                            span_tags = captcha_page_soup.find_all('span')
-                            for span in span_tags:
-                                span_id = span.get('id', '')
-                                if span_id.startswith('seccode_'):
-                                    seccode_id = span_id.replace('seccode_', '')
-                                    logger.info(f"通过span找到seccode hash: {seccode_id}")
-                                    break
-                            
-                            # 如果span也没找到，尝试查找 script updateseccode('xxxxx', ...)
-                            if not seccode_id:
-                                scripts = captcha_page_soup.find_all('script')
-                                for script in scripts:
-                                    # 兼容不同BeautifulSoup版本的文本获取方式
-                                    script_content = script.text if script.text else script.string
-                                    if script_content and 'updateseccode' in script_content:
-                                        match = re.search(r"updateseccode\('([^']+)'", script_content)
-                                        if match:
-                                            seccode_id = match.group(1)
-                                            logger.info(f"通过script找到seccode hash: {seccode_id}")
-                                            break
-                            
-                            # 如果还未找到，尝试直接在HTML源码中正则匹配
-                            if not seccode_id:
-                                match = re.search(r"updateseccode\('([^']+)'", captcha_page_response.text)
-                                if match:
-                                    seccode_id = match.group(1)
-                                    logger.info(f"通过HTML源码正则匹配找到seccode hash: {seccode_id}")
-                        
-                        # 准备验证码URL
-                        if seccodeverify:
-                            # 情况1：找到了输入框 (静态HTML)
-                            seccode_id = seccodeverify.get('id', '').replace('seccodeverify_', '')
-                            
-                            # 获取验证码图片URL
-                            captcha_img = captcha_page_soup.find('img', {'src': re.compile(r'misc\.php\?mod=seccode')})
-                            if captcha_img:
-                                captcha_url = Config.BASE_URL + captcha_img['src'] if not captcha_img['src'].startswith('http') else captcha_img['src']
-                            else:
-                                logger.info("未找到验证码图片元素，尝试手动构建URL")
-                                update_val = random.randint(10000, 99999)
-                                captcha_url = f"{Config.BASE_URL}misc.php?mod=seccode&update={update_val}&idhash={seccode_id}"
-                                
-                        elif seccode_id:
-                            # 情况2：没找到输入框，但找到了hash (JS渲染)
-                            logger.info(f"检测到JS渲染的验证码，Hash: {seccode_id}")
-                            update_val = random.randint(10000, 99999)
-                            captcha_url = f"{Config.BASE_URL}misc.php?mod=seccode&update={update_val}&idhash={seccode_id}"
-
-                        if seccode_id and captcha_url:
-                            logger.info(f"验证码图片URL: {captcha_url}")
-                            
-                            # 识别验证码
-                            captcha_text = self.recognize_captcha(captcha_url)
-                            if not captcha_text:
-                                logger.error(f"验证码识别失败，重试({retry+1}/{Config.MAX_RETRIES})")
-                                if retry < Config.MAX_RETRIES - 1:
-                                    time.sleep(Config.RETRY_DELAY)
-                                    continue
-                                return False
-                            
-                            # 获取新的formhash
-                            formhash_input = captcha_page_soup.find('input', {'name': 'formhash'})
-                            if not formhash_input:
-                                logger.error(f"在验证码页面未找到formhash，重试({retry+1}/{Config.MAX_RETRIES})")
-                                if retry < Config.MAX_RETRIES - 1:
-                                    time.sleep(Config.RETRY_DELAY)
-                                    continue
-                                return False
-                            
-                            new_formhash = formhash_input.get('value', '')
-                            
-                            # 从跳转URL中提取auth参数
-                            auth_match = re.search(r'auth=([^&]+)', redirect_url)
-                            auth_param = auth_match.group(1) if auth_match else ''
-                            
-                            # 构建新的登录数据（包含验证码和auth参数）
-                            login_data = {
-                                'formhash': new_formhash,
-                                'referer': Config.BASE_URL,
-                                'loginfield': 'username',
-                                'username': Config.USERNAME,
-                                'password': Config.PASSWORD,
-                                'questionid': '0',
-                                'answer': '',
-                                'cookietime': '2592000',
-                                'loginsubmit': 'true',
-                                'seccodeverify': captcha_text,
-                                'seccodehash': seccode_id
-                            }
-                            
-                            # 如果有auth参数，添加到登录数据中
-                            if auth_param:
-                                login_data['auth'] = urllib.parse.unquote(auth_param)
-                            
-                            # 获取登录表单的action（可能不同）
-                            login_form = captcha_page_soup.find('form')
-                            form_action = login_form.get('action', '') if login_form else ''
-                            
-                            # 构建登录URL
-                            if form_action and form_action.startswith('member.php'):
-                                if not form_action.startswith('http'):
-                                    login_url = Config.BASE_URL + form_action
-                                else:
-                                    login_url = form_action
-                            else:
-                                # 使用跳转URL作为登录URL（去掉可能的锚点等）
-                                login_url = redirect_url.split('#')[0]
-                            
-                            logger.info(f"使用验证码重新登录，URL: {login_url}")
-                            
-                            # 重新发送登录请求
-                            login_response = self.session.post(login_url, data=login_data, allow_redirects=True, timeout=Config.REQUEST_TIMEOUT)
-                            logger.info(f"重新登录响应状态码: {login_response.status_code}")
-                            logger.info("=" * 80)
-                            logger.info("【重新登录响应内容 - 开始】")
-                            logger.info("=" * 80)
-                            logger.info(login_response.text)
-                            logger.info("=" * 80)
-                            logger.info("【重新登录响应内容 - 结束】")
-                            logger.info("=" * 80)
-                        else:
-                            logger.error(f"在验证码页面未找到验证码输入框或Hash，重试({retry+1}/{Config.MAX_RETRIES})")
-                            logger.error("=" * 80)
-                            logger.error("【验证码页面HTML内容 - 开始】")
-                            logger.error("=" * 80)
-                            logger.error(captcha_page_soup.prettify())
-                            logger.error("=" * 80)
-                            logger.error("【验证码页面HTML内容 - 结束】")
-                            logger.error("=" * 80)
-                            if retry < Config.MAX_RETRIES - 1:
-                                time.sleep(Config.RETRY_DELAY)
-                                continue
-                            return False
-                    else:
-                        logger.error(f"无法从响应中提取跳转URL，重试({retry+1}/{Config.MAX_RETRIES})")
-                        logger.error("=" * 80)
-                        logger.error("【登录响应内容（无法提取跳转URL） - 开始】")
-                        logger.error("=" * 80)
-                        logger.error(login_response.text)
-                        logger.error("=" * 80)
-                        logger.error("【登录响应内容（无法提取跳转URL） - 结束】")
-                        logger.error("=" * 80)
-                        if retry < Config.MAX_RETRIES - 1:
-                            time.sleep(Config.RETRY_DELAY)
-                            continue
-                        return False
-                
-                # 检查登录结果
-                if '验证码' in login_response.text and ('验证码错误' in login_response.text or '验证码不正确' in login_response.text):
-                    logger.error(f"验证码错误，登录失败，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return False
-                
-                # 检查登录响应中的错误信息
-                if '登录失败' in login_response.text or '密码错误' in login_response.text or '用户名不存在' in login_response.text:
-                    logger.error(f"登录失败（账号或密码错误）")
-                    logger.error("=" * 80)
-                    logger.error("【登录失败响应内容 - 开始】")
-                    logger.error("=" * 80)
-                    logger.error(login_response.text)
-                    logger.error("=" * 80)
-                    logger.error("【登录失败响应内容 - 结束】")
-                    logger.error("=" * 80)
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return False
-                
-                # 检查登录是否成功 - 先检查响应文本，再检查登录状态
-                login_success = False
-                if 'succeedhandle_' in login_response.text or '登录成功' in login_response.text or '欢迎您回来' in login_response.text:
-                    login_success = True
-                    logger.info("从登录响应中检测到成功标识")
-                else:
-                    # 登录后等待一下，让Cookie生效
-                    time.sleep(1)
-                    if self.check_login_status():
-                        login_success = True
-                        logger.info("通过状态检查确认登录成功")
-                
-                if login_success:
-                    logger.info(f"账号 {Config.USERNAME} 登录成功")
-                    # 本地环境保存 Cookie，Actions / CI 环境只在当前会话中使用，不落盘
-                    if not Config.is_actions_env():
-                        self.save_cookies()
-                    return True
-                else:
-                    logger.error(f"登录失败，请检查账号密码，重试({retry+1}/{Config.MAX_RETRIES})")
-                    logger.error("=" * 80)
-                    logger.error("【登录失败响应内容 - 开始】")
-                    logger.error("=" * 80)
-                    logger.error(login_response.text)
-                    logger.error("=" * 80)
-                    logger.error("【登录失败响应内容 - 结束】")
-                    logger.error("=" * 80)
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return False
-            except requests.exceptions.Timeout:
-                logger.error(f"登录过程发生错误: 请求超时（超过{Config.REQUEST_TIMEOUT}秒），重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return False
-            except requests.exceptions.ConnectionError as e:
-                logger.error(f"登录过程发生错误: 网络连接错误，请检查网络连接，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return False
-            except Exception as e:
-                logger.error(f"登录过程发生错误: {type(e).__name__}: {e}，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return False
-        
-        logger.error(f"登录失败，已达到最大重试次数({Config.MAX_RETRIES})")
-        return False
-    
+    def _login_once(self):
+        """尝试登录一次，成功返回 True，失败时抛出异常"""
+        # 上次登录需要跳转到验证码页面：直接打开记住的验证码页面，页面不匹配时再走完整流程
+        captcha_page_url = find_login_shortcut(self.username, self.logger)
+        if captcha_page_url:
+            self.logger.info("上次登录需要跳转到验证码页面，直接打开记住的验证码页面")
+            login_text = self._submit_captcha_page(captcha_page_url, remembered=True)
+            if login_text is not None and classify_login_response(login_text) == LOGIN_RESULT_CREDENTIALS_WRONG:
+                # auth 参数中带有上次提交的密码，修改密码后会失效
+                record_captcha_attempt(self.captcha_attempt, LOGIN_RESULT_CREDENTIALS_WRONG, self.username, self.logger)
+                self.captcha_attempt = None
+                self.logger.info("记住的验证码页面已失效（论坛提示账号或密码错误），改走完整登录流程")
+                forget_login_path(self.username, self.logger)
+                login_text = None
+            if login_text is not None:
+                return self._finish_login(login_text, LOGIN_VARIANT_REDIRECT, captcha_page_url, remembered=True)
+
+        # 获取登录页面
+        response = self._request('login_page', 'GET', Config.LOGIN_URL)
+        login_page = parse_login_page(response.text)
+
+        if not login_page:
+            raise self.step_failed('login_page', response.text, "未找到登录表单")
+
+        # 获取登录表单的action属性
+        form_action = login_page['form_action']
+        self.logger.info(f"找到登录表单: ID={login_page['form_id']}, Action={form_action}")
+
+        # 获取表单字段
+        if not login_page['formhash']:
+            raise self.step_failed('login_page', response.text, "未找到登录表单的formhash字段")
+
+        # 获取用户名、密码输入框ID
+        username_id = login_page['username_id']
+        password_id = login_page['password_id']
+        self.logger.info(f"找到用户名输入框ID: {username_id}")
+        self.logger.info(f"找到密码输入框ID: {password_id}")
+
+        # 构建登录数据
+        login_data = build_login_data(login_page['formhash'], self.username, self.password)
+
+        # 添加特定的表单字段
+        if username_id:
+            login_data[username_id] = self.username
+        if password_id:
+            login_data[password_id] = self.password
+
+        # 检查是否需要验证码
+        variant = LOGIN_VARIANT_NONE
+        if login_page['need_captcha']:
+            self.logger.info("检测到需要验证码，尝试自动识别验证码")
+            variant = LOGIN_VARIANT_INLINE
+
+            # 获取验证码图片URL
+            if not login_page['captcha_src']:
+                raise self.step_failed('login_page', response.text, "未找到验证码图片")
+
+            captcha_url = absolute_url(login_page['captcha_src'])
+            self.logger.info(f"验证码图片URL: {captcha_url}")
+            login_data['seccodehash'] = login_page['seccode_id']
+
+        # 更新请求头，模拟真实浏览器
+        self.set_login_headers()
+
+        # 构建登录URL - 优先使用表单的action，如果没有则使用默认URL
+        login_url = resolve_login_post_url(form_action, f"{Config.LOGIN_URL}&loginsubmit=yes&inajax=1")
+
+        # 发送登录请求（登录页面带有验证码时识别后提交，验证码错误时刷新验证码重新提交）
+        if variant == LOGIN_VARIANT_INLINE:
+            login_text = self._submit_with_captcha('login_submit', login_url, login_data, login_page['seccode_id'], captcha_url)
+        else:
+            login_text = self._request('login_submit', 'POST', login_url, data=login_data).text
+
+        # 添加更多调试信息
+        self.logger.info(f"登录请求URL: {login_url}")
+        self.logger.debug(f"登录请求数据: {login_data}")
+        self.logger.debug(f"登录响应内容: {login_text}")
+
+        # 检查是否需要跳转到验证码页面
+        captcha_page_url = None
+        if CAPTCHA_REDIRECT_TEXT in login_text:
+            self.logger.info("检测到需要跳转到验证码页面，正在提取跳转URL...")
+            variant = LOGIN_VARIANT_REDIRECT
+
+            # 从JavaScript代码中提取跳转URL
+            captcha_page_url = parse_captcha_redirect_url(login_text)
+            if not captcha_page_url:
+                raise self.step_failed('captcha_redirect', login_text, "无法从响应中提取跳转URL")
+            self.logger.info(f"提取到验证码页面URL: {captcha_page_url}")
+
+            login_text = self._submit_captcha_page(captcha_page_url)
+
+        return self._finish_login(login_text, variant, captcha_page_url)
+
+    def set_login_headers(self):
+        """更新登录请求头，模拟真实浏览器"""
+        self.session.headers.update({
+            'Origin': Config.BASE_URL.rstrip('/'),
+            'Referer': Config.LOGIN_URL,
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Upgrade-Insecure-Requests': '1'
+        })
+
+    def _submit_captcha_page(self, captcha_page_url, remembered=False):
+        """打开验证码页面，识别验证码后提交登录，返回登录响应文本
+
+        remembered 为 True 时打开的是上次记住的验证码页面，页面中没有验证码表单时返回 None（改走完整登录流程），
+        否则抛出异常。
+        """
+        # 访问验证码页面
+        captcha_page_response = self._request('captcha_page', 'GET', captcha_page_url)
+        captcha_page = parse_captcha_page(captcha_page_response.text)
+        seccode_id = captcha_page['seccode_id']
+        captcha_url = captcha_page['captcha_url']
+        if not (seccode_id and captcha_url and captcha_page['formhash']):
+            if remembered:
+                self.logger.info("记住的验证码页面中没有验证码表单，改走完整登录流程")
+                forget_login_path(self.username, self.logger)
+                return None
+            if not (seccode_id and captcha_url):
+                raise self.step_failed('captcha_page', captcha_page_response.text, "在验证码页面未找到验证码输入框或Hash")
+            raise self.step_failed('captcha_page', captcha_page_response.text, "在验证码页面未找到formhash")
+        self.logger.info(f"验证码图片URL: {captcha_url}")
+
+        # 构建新的登录数据（包含验证码和auth参数）
+        login_data = build_login_data(captcha_page['formhash'], self.username, self.password)
+        login_data['seccodehash'] = seccode_id
+
+        # 如果有auth参数，添加到登录数据中
+        auth_param = parse_auth_param(captcha_page_url)
+        if auth_param:
+            login_data['auth'] = auth_param
+
+        # 构建登录URL，表单action不可用时使用跳转URL（去掉可能的锚点等）
+        login_url = resolve_login_post_url(captcha_page['form_action'], captcha_page_url.split('#')[0])
+
+        self.logger.info(f"使用验证码重新登录，URL: {login_url}")
+
+        # 识别验证码并重新发送登录请求
+        self.set_login_headers()
+        login_text = self._submit_with_captcha('captcha_submit', login_url, login_data, seccode_id, captcha_url)
+        self.logger.debug(f"重新登录响应内容: {login_text}")
+        return login_text
+
+    def _submit_with_captcha(self, step, login_url, login_data, seccode_id, captcha_url):
+        """识别验证码并提交登录表单，返回登录响应文本
+
+        验证码错误时保留表单中的 formhash / auth / seccodehash，刷新验证码图片（新的 update 参数）后重新识别提交，
+        最多 CAPTCHA_SUBMIT_ATTEMPTS 次；仍然错误时返回最后一次的响应，由登录步骤按重试策略重新登录。
+        """
+        for attempt in range(1, Config.CAPTCHA_SUBMIT_ATTEMPTS + 1):
+            # 识别验证码（失败时抛出异常，由登录步骤重试）
+            login_data['seccodeverify'] = self.recognize_captcha(captcha_url)
+            login_text = self._request(step, 'POST', login_url, data=login_data).text
+            if attempt == Config.CAPTCHA_SUBMIT_ATTEMPTS or classify_login_response(login_text) != LOGIN_RESULT_CAPTCHA_WRONG:
+                return login_text
+
+            record_captcha_attempt(self.captcha_attempt, LOGIN_RESULT_CAPTCHA_WRONG, self.username, self.logger)
+            self.captcha_attempt = None
+            self.logger.info(f"验证码错误，刷新验证码后重新提交（第 {attempt}/{Config.CAPTCHA_SUBMIT_ATTEMPTS} 次）")
+            captcha_url = build_captcha_url(seccode_id)
+
+    def _finish_login(self, login_text, variant, captcha_page_url=None, remembered=False):
+        """根据登录响应判断登录结果：成功时保存Cookie并记住登录方式，失败时抛出异常"""
+        login_result = classify_login_response(login_text)
+        record_captcha_attempt(self.captcha_attempt, login_result, self.username, self.logger)
+        self.captcha_attempt = None
+        if login_result == LOGIN_RESULT_CAPTCHA_WRONG:
+            raise StepFailed(CAPTCHA_WRONG, "验证码错误，登录失败")
+
+        # 账号或密码错误：重试只会触发论坛的错误次数限制，直接放弃
+        if login_result == LOGIN_RESULT_CREDENTIALS_WRONG:
+            raise self.step_failed('login_submit', login_text, "论坛提示账号或密码错误", CREDENTIALS_WRONG)
+
+        # 检查登录是否成功 - 先检查响应文本，再检查登录状态
+        if login_result == LOGIN_RESULT_SUCCESS:
+            self.logger.info("从登录响应中检测到成功标识")
+        else:
+            # 登录后等待一下，让Cookie生效
+            time.sleep(1)
+            if not self.check_login_status():
+                if remembered:
+                    # 下次重试走完整登录流程
+                    forget_login_path(self.username, self.logger)
+                raise self.step_failed('login_submit', login_text, "登录失败，请检查账号密码")
+            self.logger.info("通过状态检查确认登录成功")
+
+        self.logger.info(f"账号 {self.username} 登录成功")
+        # 本地环境保存 Cookie，Actions / CI 环境未配置会话包时只在当前会话中使用，不落盘
+        if Config.use_saved_sessions():
+            self.save_cookies()
+        remember_login_path(self.username, variant, captcha_page_url, self.logger)
+        return True
+
+    @traced('check_sign_status')
     def check_sign_status(self):
-        """检查签到状态，带重试机制"""
-        for retry in range(Config.MAX_RETRIES):
-            try:
-                response = self.session.get(Config.SIGN_URL, timeout=Config.REQUEST_TIMEOUT)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # 查找签到按钮
-                sign_btn = soup.select_one('.signbtn .btna')
-                if not sign_btn:
-                    logger.error(f"未找到签到按钮，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return None, None
-                
-                # 获取签到链接和状态
-                sign_text = sign_btn.text.strip()
-                sign_link = sign_btn.get('href')
-                
-                # 提取sign参数
-                sign_param = None
-                if sign_link:
-                    match = re.search(r'sign=([^&]+)', sign_link)
-                    if match:
-                        sign_param = match.group(1)
-                
-                return sign_text, sign_param
-            except requests.exceptions.Timeout:
-                logger.error(f"检查签到状态失败: 请求超时（超过{Config.REQUEST_TIMEOUT}秒），重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return None, None
-            except requests.exceptions.ConnectionError:
-                logger.error(f"检查签到状态失败: 网络连接错误，请检查网络连接，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return None, None
-            except Exception as e:
-                logger.error(f"检查签到状态失败: {type(e).__name__}: {e}，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return None, None
-    
+        """检查签到状态，按重试策略重试；签到页面显示未登录时直接返回 (None, None)"""
+        self.sign_page_logged_out = False
+        return self.retrier.call('check_sign_status', '检查签到状态', self._check_sign_status_once, default=(None, None))
+
+    def _check_sign_status_once(self):
+        response = self._request('sign_page', 'GET', Config.SIGN_URL)
+        sign_page = SignPage(response.text, response.url)
+        if sign_page.logged_out:
+            # 会话已失效，重试没有意义，交给调用方重新登录
+            self.logger.info("签到页面显示未登录，会话已失效")
+            self.sign_page_logged_out = True
+            return None, None
+        if not sign_page.has_sign_button:
+            raise self.step_failed('sign_page', response.text, "未找到签到按钮")
+
+        # 保存页面快照，后续获取签到信息时直接复用，无需再次请求
+        self.sign_page = sign_page
+        return sign_page.sign_text, sign_page.sign_param
+
+    @traced('do_sign')
     def do_sign(self, sign_param):
-        """执行签到，带重试机制"""
-        for retry in range(Config.MAX_RETRIES):
-            try:
-                sign_url = f"{Config.SIGN_URL}&sign={sign_param}"
-                response = self.session.get(sign_url, timeout=Config.REQUEST_TIMEOUT)
-                
-                # 检查签到结果
-                if response.status_code == 200:
-                    # 再次检查签到状态
-                    sign_text, _ = self.check_sign_status()
-                    if sign_text == "今日已打卡":
-                        logger.info("签到成功")
-                        return True
-                    else:
-                        logger.error(f"签到请求已发送，但状态未更新，重试({retry+1}/{Config.MAX_RETRIES})")
-                        if retry < Config.MAX_RETRIES - 1:
-                            time.sleep(Config.RETRY_DELAY)
-                            continue
-                        return False
-                else:
-                    logger.error(f"签到请求失败，状态码: {response.status_code}，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return False
-            except Exception as e:
-                logger.error(f"签到过程发生错误: {e}，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return False
-    
+        """执行签到，按重试策略重试"""
+        return self.retrier.call('do_sign', '签到', self._do_sign_once, sign_param, default=False)
+
+    def _do_sign_once(self, sign_param):
+        sign_url = f"{Config.SIGN_URL}&sign={sign_param}"
+        response = self._request('sign', 'GET', sign_url)
+
+        # 检查签到结果
+        if response.status_code != 200:
+            raise StepFailed(BAD_RESPONSE, f"签到请求失败，状态码: {response.status_code}")
+
+        # 论坛通常直接返回更新后的签到页面，优先从签到响应中确认状态
+        sign_page = SignPage(response.text)
+        if sign_page.has_sign_button:
+            self.sign_page = sign_page
+            sign_text = sign_page.sign_text
+        else:
+            # 签到响应不是签到页面时，再次检查签到状态
+            sign_text, _ = self.check_sign_status()
+        if sign_text != "今日已打卡":
+            raise StepFailed(BAD_RESPONSE, "签到请求已发送，但状态未更新")
+        self.logger.info("签到成功")
+        return True
+
+    @traced('get_sign_info')
     def get_sign_info(self):
-        """获取签到信息，带重试机制"""
-        for retry in range(Config.MAX_RETRIES):
-            try:
-                response = self.session.get(Config.SIGN_URL, timeout=Config.REQUEST_TIMEOUT)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # 查找签到信息区域
-                sign_info_divs = soup.find_all('div', class_='bm')
-                sign_info_div = None
-                for div in sign_info_divs:
-                    header = div.find('div', class_='bm_h')
-                    if header and '我的打卡动态' in header.get_text():
-                        sign_info_div = div
-                        break
-                
-                if not sign_info_div:
-                    logger.error(f"未找到签到信息区域，重试({retry+1}/{Config.MAX_RETRIES})")
-                    if retry < Config.MAX_RETRIES - 1:
-                        time.sleep(Config.RETRY_DELAY)
-                        continue
-                    return {}
-                
-                # 查找签到信息列表
-                info_list = sign_info_div.find('div', class_='bm_c').find_all('li')
-                
-                # 解析签到信息
-                sign_info = {}
-                for item in info_list:
-                    text = item.get_text(strip=True)
-                    if '：' in text:
-                        key, value = text.split('：', 1)
-                        sign_info[key] = value
-                
-                return sign_info
-            except Exception as e:
-                logger.error(f"获取签到信息失败: {e}，重试({retry+1}/{Config.MAX_RETRIES})")
-                if retry < Config.MAX_RETRIES - 1:
-                    time.sleep(Config.RETRY_DELAY)
-                    continue
-                return {}
-        
-        logger.error(f"获取签到信息失败，已达到最大重试次数({Config.MAX_RETRIES})")
-        return {}
-    
-    def send_notification(self, title, content):
-        """发送 IYUU 通知"""
-        try:
-            token = Config.IYUU_TOKEN
-            if not token or token.strip() == '':
-                logger.warning("IYUU Token 未配置，跳过通知发送")
-                return False
-            
-            url = Config.get_iyuu_url()
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'
-            }
-            data = {
-                'text': title,
-                'desp': content
-            }
-            
-            response = requests.post(url, headers=headers, data=data, timeout=10)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('errcode') == 0:
-                    logger.info("通知发送成功")
-                    return True
-                else:
-                    logger.error(f"通知发送失败: {result.get('errmsg', '未知错误')}")
-                    return False
-            else:
-                logger.error(f"通知发送失败，状态码: {response.status_code}")
-                return False
-        except Exception as e:
-            logger.error(f"发送通知时发生错误: {e}")
-            return False
-    
+        """获取签到信息，优先使用最近一次签到页面快照，按重试策略重试"""
+        if self.sign_page is not None and self.sign_page.sign_info is not None:
+            return self.sign_page.sign_info
+        return self.retrier.call('get_sign_info', '获取签到信息', self._get_sign_info_once, default={})
+
+    def _get_sign_info_once(self):
+        response = self._request('sign_info', 'GET', Config.SIGN_URL)
+        sign_page = SignPage(response.text)
+        if sign_page.sign_info is None:
+            raise self.step_failed('sign_info', response.text, "未找到签到信息区域")
+        self.sign_page = sign_page
+        return sign_page.sign_info
+
+    def send_notification(self, title, content, success=False):
+        """把通知交给后台分发器发送（批量签到时合并成汇总通知），不等待发送结果"""
+        return get_notifier().submit(title, content, self.username, success)
+
+    @traced('run')
     def run(self):
-        """运行签到流程，带重试机制"""
-        logger.info("===== 开始运行签到脚本 =====")
-        
-        # 在 CI / GitHub Actions 环境下，不使用本地 Cookie，每次强制账号密码登录
-        if Config.is_actions_env():
-            logger.info("CI / GitHub Actions 环境：跳过 Cookie 登录检测，直接使用环境变量登录")
+        """运行签到流程，带重试机制；在线运行的结果追加到签到历史"""
+        self.logger.info("===== 开始运行签到脚本 =====")
+        self.retrier.start()
+        # 常驻模式下同一个实例每天运行一次，不复用上一次的签到页面快照
+        self.sign_page = None
+
+        # 台账中已记录今天签到成功：不发任何请求（包括通知），直接返回
+        entry = find_ledger_entry(self.username, self.logger)
+        if entry:
+            self.logger.info(f"签到台账显示今日已签到（{entry['status']}），跳过在线检查；需要在线确认时使用 --verify")
+            self.status = "今日已签到（台账）"
+            return True
+
+        success = self._run_online()
+        sign_info = self.sign_page.sign_info if self.sign_page is not None else None
+        record_history_entry(self.username, success, self.status, sign_info, self.logger)
+        return success
+
+    def _run_online(self):
+        """登录、检查签到状态、签到并发送通知，返回是否成功"""
+        skipped_login_check = False
+        self.open_session()
+
+        # 在 CI / GitHub Actions 环境下未配置会话包时，不使用本地 Cookie，每次强制账号密码登录
+        if not Config.use_saved_sessions():
+            self.logger.info("CI / GitHub Actions 环境：跳过 Cookie 登录检测，直接使用环境变量登录")
             if not self.login():
-                logger.error("登录失败，签到流程终止")
+                self.logger.error("登录失败，签到流程终止")
+                self.status = "登录失败"
                 self.send_notification("FN论坛签到失败", "登录失败，请检查账号密码或网络连接")
                 return False
+        elif Config.OPTIMISTIC_LOGIN:
+            # 乐观模式：跳过首页登录状态检查，直接从签到页面判断会话是否有效
+            self.logger.info("乐观模式：跳过登录状态检查，直接获取签到状态")
+            skipped_login_check = True
+        elif is_session_fresh(self.session_verified_at):
+            # 会话最近被确认有效过，跳过首页登录状态检查，直接获取签到状态
+            self.logger.info("会话最近已验证有效，跳过登录状态检查")
+            skipped_login_check = True
         else:
             # 本地环境优先尝试使用已有 Cookie，减少登录次数
             if not self.check_login_status():
                 # 如果未登录，尝试登录
                 if not self.login():
-                    logger.error("登录失败，签到流程终止")
+                    self.logger.error("登录失败，签到流程终止")
+                    self.status = "登录失败"
                     self.send_notification("FN论坛签到失败", "登录失败，请检查账号密码或网络连接")
                     return False
-        
+
         # 检查签到状态
         sign_text, sign_param = self.check_sign_status()
+        if (sign_text is None or sign_param is None) and skipped_login_check:
+            # 跳过了登录检查但未能获取签到状态：签到页面已表明未登录时直接登录，否则先确认登录状态
+            if self.sign_page_logged_out:
+                self.logger.info("会话已失效，使用账号密码重新登录")
+                logged_in = self.login()
+            else:
+                self.logger.info("未能获取签到状态，重新检查登录状态")
+                logged_in = self.check_login_status() or self.login()
+            if not logged_in:
+                self.logger.error("登录失败，签到流程终止")
+                self.status = "登录失败"
+                self.send_notification("FN论坛签到失败", "登录失败，请检查账号密码或网络连接")
+                return False
+            sign_text, sign_param = self.check_sign_status()
         if sign_text is None or sign_param is None:
-            logger.error("获取签到状态失败，签到流程终止")
+            self.logger.error("获取签到状态失败，签到流程终止")
+            self.status = "获取签到状态失败"
             self.send_notification("FN论坛签到失败", "获取签到状态失败，请检查网络连接")
             return False
-        
-        logger.info(f"当前签到状态: {sign_text}")
+
+        # 能看到签到按钮说明会话有效
+        self.mark_session_verified()
+        self.logger.info(f"当前签到状态: {sign_text}")
         
         # 如果未签到，执行签到
         if sign_text == "点击打卡":
-            logger.info("开始执行签到...")
+            self.logger.info("开始执行签到...")
             if self.do_sign(sign_param):
                 # 获取并记录签到信息
                 sign_info = self.get_sign_info()
                 info_text = ""
                 if sign_info:
-                    logger.info("===== 签到信息 =====")
+                    self.logger.info("===== 签到信息 =====")
                     for key, value in sign_info.items():
-                        logger.info(f"{key}: {value}")
+                        self.logger.info(f"{key}: {value}")
                         info_text += f"{key}: {value}\n"
                 
                 # 发送成功通知
                 notification_content = f"签到成功！\n\n签到信息：\n{info_text.strip() if info_text else '暂无详细信息'}"
-                self.send_notification("FN论坛签到成功", notification_content)
+                self.status = "签到成功"
+                record_ledger_entry(self.username, self.status, sign_info, self.logger)
+                self.send_notification("FN论坛签到成功", notification_content, success=True)
                 return True
             else:
-                logger.error("签到失败")
+                self.logger.error("签到失败")
+                self.status = "签到失败"
                 self.send_notification("FN论坛签到失败", "签到操作失败，请检查网络连接或稍后重试")
                 return False
         elif sign_text == "今日已打卡":
-            logger.info("今日已签到，无需重复签到")
+            self.logger.info("今日已签到，无需重复签到")
             # 获取并记录签到信息
             sign_info = self.get_sign_info()
             info_text = ""
             if sign_info:
-                logger.info("===== 签到信息 =====")
+                self.logger.info("===== 签到信息 =====")
                 for key, value in sign_info.items():
-                    logger.info(f"{key}: {value}")
+                    self.logger.info(f"{key}: {value}")
                     info_text += f"{key}: {value}\n"
             
             # 发送已签到通知
             notification_content = f"今日已签到，无需重复签到。\n\n签到信息：\n{info_text.strip() if info_text else '暂无详细信息'}"
-            self.send_notification("FN论坛签到提醒", notification_content)
+            self.status = "今日已签到"
+            record_ledger_entry(self.username, self.status, sign_info, self.logger)
+            self.send_notification("FN论坛签到提醒", notification_content, success=True)
             return True
         else:
-            logger.warning(f"未知的签到状态: {sign_text}，签到流程终止")
+            self.logger.warning(f"未知的签到状态: {sign_text}，签到流程终止")
+            self.status = f"未知状态: {sign_text}"
             self.send_notification("FN论坛签到异常", f"遇到未知的签到状态: {sign_text}，请手动检查")
             return False
 
 
+def load_accounts(path):
+    """从账号文件加载账号列表，支持 JSON / YAML / CSV 格式
+
+    返回 [{'username': ..., 'password': ...}, ...]
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8') as f:
+        if ext in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("读取 YAML 账号文件需要安装 PyYAML：pip install pyyaml")
+            data = yaml.safe_load(f)
+        elif ext == '.csv':
+            data = list(csv.DictReader(f))
+        else:
+            data = json.load(f)
+
+    # 兼容 {"accounts": [...]} 的写法
+    if isinstance(data, dict):
+        data = data.get('accounts', [])
+
+    accounts = []
+    for item in data or []:
+        username = str(item.get('username', '') or '').strip()
+        password = str(item.get('password', '') or '')
+        if not username or not password:
+            logger.warning(f"账号文件中存在缺少用户名或密码的条目，已跳过: {username or '(空)'}")
+            continue
+        accounts.append({'username': username, 'password': password})
+    return accounts
+
+
+def get_account_cookie_file(username):
+    """获取批量模式下账号独立的Cookie文件路径"""
+    safe_name = re.sub(r'[^\w.-]', '_', username)
+    return os.path.join(Config.COOKIE_DIR, f'{safe_name}.json')
+
+
+def run_account(account):
+    """在独立的会话中为单个账号执行签到，返回结果字典"""
+    start_time = time.time()
+    username = account['username']
+    try:
+        sign = FNSignIn(username, account['password'], get_account_cookie_file(username))
+        success = sign.run()
+        status = sign.status
+    except Exception as e:
+        logger.error(f"[{username}] 签到过程发生未处理的错误: {type(e).__name__}: {e}")
+        success = False
+        status = f"异常: {type(e).__name__}"
+    return {
+        'username': username,
+        'success': success,
+        'status': status,
+        'elapsed': time.time() - start_time
+    }
+
+
+def run_batch(accounts, concurrency=None):
+    """使用有界线程池并发执行多个账号的签到，返回按账号文件顺序排列的结果列表"""
+    concurrency = max(1, concurrency or Config.BATCH_CONCURRENCY)
+    os.makedirs(Config.COOKIE_DIR, exist_ok=True)
+    logger.info(f"===== 批量签到开始：共 {len(accounts)} 个账号，并发数 {concurrency} =====")
+
+    with get_notifier().batch(), ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run_account, accounts))
+
+    log_batch_summary(results)
+    return results
+
+
+def log_step_summary():
+    """输出各步骤的次数、成功率和耗时分位数，便于定位慢在哪一步"""
+    rows = REGISTRY.step_summary()
+    if not rows:
+        return
+    logger.info("===== 步骤耗时汇总 =====")
+    logger.info(f"{'步骤':<20}{'次数':>6}{'成功率':>8}{'p50(秒)':>10}{'p95(秒)':>10}{'最大(秒)':>10}")
+    for step, count, ok, p50, p95, maximum in rows:
+        logger.info(f"{step:<20}{count:>6}{ok / count * 100:>7.1f}%{p50:>10.2f}{p95:>10.2f}{maximum:>10.2f}")
+
+
+def export_metrics():
+    """按配置写出 Prometheus 文本格式的指标文件"""
+    if not Config.METRICS_TEXTFILE:
+        return
+    try:
+        write_textfile(Config.METRICS_TEXTFILE)
+        logger.info(f"指标已写入: {Config.METRICS_TEXTFILE}")
+    except Exception as e:
+        logger.warning(f"写入指标文件失败: {e}")
+
+
+def log_batch_summary(results):
+    """输出批量签到的汇总结果表"""
+    name_width = max([len('账号')] + [len(r['username']) for r in results])
+    logger.info("===== 批量签到结果汇总 =====")
+    logger.info(f"{'账号'.ljust(name_width)}  结果  耗时(秒)  状态")
+    for r in results:
+        mark = '成功' if r['success'] else '失败'
+        logger.info(f"{r['username'].ljust(name_width)}  {mark}  {r['elapsed']:8.2f}  {r['status']}")
+    success_count = sum(1 for r in results if r['success'])
+    total_elapsed = sum(r['elapsed'] for r in results)
+    logger.info(f"合计: {len(results)} 个账号，成功 {success_count} 个，失败 {len(results) - success_count} 个，累计耗时 {total_elapsed:.2f} 秒")
+    log_step_summary()
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='FN论坛自动签到脚本')
+    parser.add_argument('--accounts', default=Config.ACCOUNTS_FILE,
+                        help='多账号文件路径（JSON/YAML/CSV），指定后进入批量签到模式')
+    parser.add_argument('--concurrency', type=int, default=Config.BATCH_CONCURRENCY,
+                        help=f'批量模式并发数（默认 {Config.BATCH_CONCURRENCY}）')
+    parser.add_argument('--verify', action='store_true',
+                        help='签到台账中今天已签到的账号也在线确认签到状态')
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    setup_logging()
     try:
         # 设置更详细的日志级别，便于调试
         if os.environ.get('DEBUG') == '1':
             logger.setLevel(logging.DEBUG)
             logger.debug("调试模式已启用")
         
+        args = parse_args()
+        batch_mode = bool(args.accounts)
+        if args.verify:
+            Config.LEDGER_VERIFY = True
+
+        if Config.METRICS_PORT:
+            start_http_exporter(Config.METRICS_PORT)
+            logger.info(f"指标接口已启动: http://0.0.0.0:{Config.METRICS_PORT}/metrics")
+
         # 检查必需的环境变量
         logger.info("===== 环境变量检查 =====")
-        env_valid, env_msg, missing_vars = Config.check_required_env_vars()
+        env_valid, env_msg, missing_vars = Config.check_required_env_vars(require_account=not batch_mode)
         if not env_valid:
             logger.error(env_msg)
             print(f"\n{env_msg}")
@@ -1033,11 +2304,26 @@ if __name__ == "__main__":
             if env_msg:
                 logger.info(env_msg)
             logger.info("===== 环境变量检查完成 =====\n")
-        
-        # 创建签到实例并运行
-        sign = FNSignIn()
-        result = sign.run()
-        
+
+        # CI 环境配置了 SESSION_BUNDLE_KEY 时从会话包恢复 Cookie 和 access_token
+        restore_session_bundle()
+
+        if batch_mode:
+            # 批量模式：从账号文件读取多个账号并发签到
+            accounts = load_accounts(args.accounts)
+            if not accounts:
+                logger.error(f"账号文件中没有可用的账号: {args.accounts}")
+                exit(1)
+            results = run_batch(accounts, args.concurrency)
+            result = all(r['success'] for r in results)
+        else:
+            # 创建签到实例并运行
+            sign = FNSignIn()
+            result = sign.run()
+            log_step_summary()
+        save_session_bundle()
+        export_metrics()
+
         # 输出最终结果
         if result:
             logger.info("===== 签到脚本执行成功 =====")
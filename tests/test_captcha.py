@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+import fnclub_captcha  # noqa: E402
+
+
+def _uniform_gif(value=200, size=(60, 20)):
+    buffer = io.BytesIO()
+    Image.new('L', size, value).save(buffer, format='GIF')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('value', [0, 200, 255])
+def test_uniform_image_has_no_text(value):
+    image_bytes = _uniform_gif(value)
+    mask = fnclub_captcha.binarize(fnclub_captcha.load_gray(image_bytes))
+    assert mask.shape == (20, 60)
+    assert not mask.any()
+    assert fnclub_captcha.preprocess_image(image_bytes) is None
+    assert fnclub_captcha.glyph_vectors(image_bytes) is None